@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+VessAPI Liste Serileştirme Ölçümü
+
+Liste endpoint'lerinin yanıt gövdesini iki yoldan üretip öğe başına süreyi karşılaştırır:
+FastAPI'nin response_model yolu (her öğeyi yeniden doğrular) ve vessapi.responses'daki
+doğrudan pydantic-core yolu. İki yolun ürettiği JSON'un birebir aynı olduğunu da kontrol eder.
+Veritabanı gerekmez.
+
+Kullanım: python benchmark_serialization.py [öğe_sayısı]
+"""
+
+import asyncio
+import sys
+import time
+from datetime import datetime
+from typing import List
+from uuid import uuid4
+
+from bson import ObjectId
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from vessapi.projections import AlbumListing, MusicListing
+from vessapi.responses import dump_list
+from vessapi.schemas import AlbumResponse, MusicResponse
+
+ROUNDS = 20
+
+
+def music_items(count):
+    now = datetime.utcnow()
+    return [MusicListing.model_validate({
+        "_id": ObjectId(), "music_id": uuid4(), "title": f"Şarkı {i}",
+        "artist_ids": [uuid4(), uuid4()], "artist_names": ["Sanatçı 1", "Sanatçı 2"],
+        "album_title": "Albüm", "duration": 180, "file_path": f"music/{i}.mp3",
+        "publish_date": now, "created_at": now, "updated_at": now,
+    }) for i in range(count)]
+
+
+def album_items(count):
+    now = datetime.utcnow()
+    return [AlbumListing.model_validate({
+        "_id": ObjectId(), "album_id": uuid4(), "title": f"Albüm {i}",
+        "artist_id": uuid4(), "artist_name": "Sanatçı", "release_date": now.date(),
+        "cover_image_url": f"albums/{i}.png", "music_ids": [uuid4() for _ in range(10)],
+        "num_tracks": 10, "created_at": now, "updated_at": now,
+    }) for i in range(count)]
+
+
+def per_item_us(func, count):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func()
+    return (time.perf_counter() - start) / ROUNDS / count * 1e6
+
+
+def measure(name, items, schema):
+    field = create_model_field(name="Response", type_=List[schema], mode="serialization")
+    response_model = lambda: asyncio.run(serialize_response(field=field, response_content=items, dump_json=True))
+    direct = lambda: dump_list(items, schema)
+
+    same = response_model() == direct()
+    before = per_item_us(response_model, len(items))
+    after = per_item_us(direct, len(items))
+    print(f"📊 {name} ({len(items)} öğe)")
+    print(f"   response_model : {before:6.2f} µs/öğe")
+    print(f"   dump_list      : {after:6.2f} µs/öğe ({before / after:.1f}x)")
+    print(f"   {'✅ Çıktılar aynı' if same else '❌ Çıktılar farklı'}")
+    return same
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    results = [
+        measure("Şarkılar", music_items(count), MusicResponse),
+        measure("Albümler", album_items(count), AlbumResponse),
+    ]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
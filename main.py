@@ -1,15 +1,22 @@
 import os
 from fastapi import FastAPI, Depends, HTTPException, status, Request, Form
+from fastapi.responses import JSONResponse, PlainTextResponse
 from datetime import timedelta
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordRequestForm
 
-from vessapi import crud, schemas, models
+from vessapi import crud, metrics, query_budget, schemas, models
 from vessapi.database import init_db
+from vessapi.events import event_bus
+from vessapi.jobs import ingest_worker
+from vessapi.services import shutdown_tag_parser_pool
+from vessapi.passwords import PasswordHashingBusy, password_hasher
 from vessapi.auth import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, Token
 from vessapi.config import settings
-from vessapi.routers import music, albums, users, playlists, artists, web
+from vessapi.pagination import NEXT_CURSOR_HEADER
+from vessapi.http_cache import ResponseCacheMiddleware
+from vessapi.routers import music, albums, users, playlists, artists, search, jobs, sync, events, web
 
 app = FastAPI(
     title="VessAPI",
@@ -21,10 +28,33 @@ app = FastAPI(
 async def startup_event():
     await init_db()
     settings.create_directories()
+    ingest_worker.start()
+    await event_bus.start()
+    if settings.server.metrics_enabled:
+        metrics.loop_lag_monitor.start()
     print(f"VessAPI is running on {settings.server.host}:{settings.server.port}")
     print(f"Database: {settings.database.url}/{settings.database.name}")
     print(f"Debug mode: {settings.server.debug}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ingest_worker.stop()
+    await event_bus.stop()
+    await metrics.loop_lag_monitor.stop()
+    shutdown_tag_parser_pool()
+    password_hasher.shutdown()
+
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusy):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+# Catalog response cache (inside CORS so cached responses get CORS headers too)
+app.add_middleware(
+    ResponseCacheMiddleware,
+    maxsize=settings.server.response_cache_size,
+    ttl=settings.server.response_cache_ttl,
+)
+
 # CORS Middleware
 app.add_middleware(
     CORSMiddleware,
@@ -32,15 +62,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", *query_budget.HEADERS],
 )
 
+# Query count headers and N+1 warnings
+if settings.server.debug:
+    app.add_middleware(query_budget.QueryBudgetMiddleware)
+
+# Request metrics (added last, so it is outermost and cache hits and CORS preflights are timed too)
+if settings.server.metrics_enabled:
+    app.add_middleware(metrics.MetricsMiddleware, openapi=app.openapi)
+
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.mount("/library", StaticFiles(directory="library"), name="library")
 
 @app.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = await crud.get_user_by_username(username=form_data.username)
-    if not user or not crud.verify_password(form_data.password, user.hashed_password):
+    user = await crud.authenticate_user(form_data.username, form_data.password)
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -61,6 +100,13 @@ async def health_check():
         db_status = "disconnected"
     return {"status": "ok", "database": db_status}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus metrics (see vessapi.metrics)"""
+    if not settings.server.metrics_enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled")
+    return PlainTextResponse(await metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 
 
 # Include routers
@@ -70,8 +116,12 @@ app.include_router(albums.router, prefix="/v1")
 app.include_router(users.router, prefix="/v1")
 app.include_router(playlists.router, prefix="/v1")
 app.include_router(artists.router, prefix="/v1")
+app.include_router(search.router, prefix="/v1")
+app.include_router(jobs.router, prefix="/v1")
+app.include_router(sync.router, prefix="/v1")
+app.include_router(events.router, prefix="/v1")
 
 @app.post("/admin/reset-users", summary="Delete all users from the database (admin only)")
 async def reset_users():
-    deleted = await models.User.delete_all({})
-    return {"message": f"All users deleted. Count: {deleted.deleted_count}"}
+    deleted_count = await crud.delete_all_users()
+    return {"message": f"All users deleted. Count: {deleted_count}"}
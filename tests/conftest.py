@@ -1,5 +1,6 @@
 import pytest
 import asyncio
+from contextlib import contextmanager
 from typing import AsyncGenerator
 
 from fastapi import FastAPI, Depends
@@ -10,6 +11,7 @@ from beanie import init_beanie
 # Import the main app instance
 from main import app as main_app
 from vessapi.models import __beanie_models__
+from vessapi.query_budget import QueryBudgetListener, capture_call_sites, track_queries
 import os
 
 @pytest.fixture(scope="session")
@@ -26,7 +28,8 @@ async def client() -> AsyncGenerator[AsyncClient, None]:
     """
     from vessapi.config import settings
     db_url = settings.get_database_url(test_mode=True)
-    db_client = AsyncIOMotorClient(db_url)
+    db_client = AsyncIOMotorClient(db_url, event_listeners=[QueryBudgetListener()])
+    capture_call_sites()
     
     await init_beanie(
         database=db_client.get_default_database(),
@@ -51,4 +54,37 @@ async def client() -> AsyncGenerator[AsyncClient, None]:
         yield test_client
 
     # Clean up the database after each test
-    await db_client.drop_database(db_client.get_default_database())
\ No newline at end of file
+    await db_client.drop_database(db_client.get_default_database())
+
+@pytest.fixture
+def max_queries():
+    """
+    Fails the test when the block issues more than limit MongoDB commands:
+
+        with max_queries(3):
+            response = await client.get("/v1/songs/")
+    """
+    @contextmanager
+    def check(limit: int):
+        with track_queries() as budget:
+            yield budget
+        assert budget.count <= limit, f"{budget.count} MongoDB commands, expected at most {limit}:\n{budget.report()}"
+    return check
+
+@pytest.fixture
+def login(client):
+    """
+    Creates a user and returns the Authorization header of a token for it:
+
+        headers = await login("alice")
+        admin_headers = await login("root", role="admin")
+    """
+    async def create_and_login(username: str, role: str = "user") -> dict:
+        from vessapi import crud, schemas
+        from vessapi.models import User
+        await crud.create_user(schemas.UserCreate(username=username, password="secret"))
+        if role != "user":
+            await User.find_one(User.username == username).update({"$set": {"role": role}})
+        response = await client.post("/token", data={"username": username, "password": "secret"})
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return create_and_login
@@ -0,0 +1,142 @@
+import asyncio
+import json
+from uuid import uuid4
+
+import pytest
+from pydantic import ValidationError
+
+from vessapi.bulk import ARTIST_TARGET, MUSIC_TARGET, _InvalidLine, _ndjson_items
+
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _collect(items):
+    return [item async for item in items]
+
+
+def test_ndjson_lines_may_span_chunks():
+    """Lines are split on newlines regardless of how the body arrives; bad lines become errors, not failures."""
+    items = asyncio.run(_collect(_ndjson_items(_chunks(b'{"op": "del', b'ete", "id": 1}\n\nnot json\n{"op"', b': "create"}'))))
+    assert items[0] == {"op": "delete", "id": 1}
+    assert isinstance(items[1], _InvalidLine)
+    assert items[2] == {"op": "create"}
+
+def test_operations_are_validated_against_the_collection_schemas():
+    op, id, payload = ARTIST_TARGET.parse({"op": "update", "id": "59f0fddd-3b67-4599-8ac1-df0a3bc8081d", "data": {"name": "New"}})
+    assert (op, str(id), payload) == ("update", "59f0fddd-3b67-4599-8ac1-df0a3bc8081d", {"name": "New"})
+    with pytest.raises(ValidationError):
+        ARTIST_TARGET.parse({"op": "delete"})
+    with pytest.raises(ValidationError):
+        MUSIC_TARGET.parse({"op": "create", "data": {"title": "no duration"}})
+    with pytest.raises(ValueError):
+        MUSIC_TARGET.parse(_InvalidLine("Invalid JSON"))
+
+
+# Endpoints (need the test database)
+
+async def post_bulk(client, path, operations, headers, ordered=True):
+    response = await client.post(f"/v1/{path}/bulk", params={"ordered": str(ordered).lower()}, json=operations, headers=headers)
+    assert response.status_code == 200
+    *results, summary = [json.loads(line) for line in response.text.splitlines()]
+    return results, summary["summary"]
+
+def track(title):
+    return {"op": "create", "data": {
+        "title": title, "artist_ids": [str(uuid4())], "duration": 60,
+        "file_path": f"music/{title}.mp3", "publish_date": "2024-01-01T00:00:00",
+    }}
+
+async def test_ordered_bulk_skips_everything_after_the_first_failure(client, login):
+    headers = await login("bulk-admin", role="admin")
+    operations = [track("First"), {"op": "update", "id": str(uuid4()), "data": {"title": "Nope"}}, track("Second")]
+
+    results, summary = await post_bulk(client, "songs", operations, headers)
+    assert [result["status"] for result in results] == ["created", "not_found", "skipped"]
+    assert summary == {"total": 3, "created": 1, "not_found": 1, "skipped": 1}
+    assert [song["title"] for song in (await client.get("/v1/songs/")).json()] == ["First"]
+
+    results, _ = await post_bulk(client, "songs", operations, headers, ordered=False)
+    assert [result["status"] for result in results] == ["created", "not_found", "created"]
+
+async def test_write_errors_are_reported_per_operation(client, login):
+    headers = await login("bulk-admin", role="admin")
+    await client.post("/v1/artists/", json={"name": "Taken"}, headers=headers)
+    operations = [{"op": "create", "data": {"name": "Taken"}}, {"op": "create", "data": {"name": "Free"}}]
+
+    results, summary = await post_bulk(client, "artists", operations, headers, ordered=False)
+    assert [result["status"] for result in results] == ["error", "created"]
+    assert "error" in results[0] and results[1]["id"]
+    assert summary == {"total": 2, "error": 1, "created": 1}
+
+    results, _ = await post_bulk(client, "artists", [operations[0], {"op": "create", "data": {"name": "Later"}}], headers)
+    assert [result["status"] for result in results] == ["error", "skipped"]
+    assert sorted(artist["name"] for artist in (await client.get("/v1/artists/")).json()) == ["Free", "Taken"]
+
+async def test_renames_reach_the_copies_of_the_name(client, login):
+    from vessapi import crud, schemas
+    headers = await login("bulk-admin", role="admin")
+    artist = await crud.create_artist(schemas.ArtistCreate(name="Old Name"))
+    album = await crud.create_album(schemas.AlbumCreate(
+        title="Old Title", artist_id=artist.artist_id, release_date="2024-01-01", cover_image_url="/x.png",
+    ), uuid4())
+    music = await crud.create_music(schemas.MusicCreate(
+        title="Song", artist_ids=[artist.artist_id], album_id=album.album_id, duration=60,
+        file_path="music/song.mp3", publish_date="2024-01-01T00:00:00",
+    ), uuid4())
+
+    await post_bulk(client, "artists", [{"op": "update", "id": str(artist.artist_id), "data": {"name": "New Name"}}], headers)
+    await post_bulk(client, "albums", [{"op": "update", "id": str(album.album_id), "data": {"title": "New Title"}}], headers)
+    song = (await client.get(f"/v1/songs/{music.music_id}")).json()
+    assert (song["artist_names"], song["album_title"]) == (["New Name"], "New Title")
+    assert (await client.get(f"/v1/albums/{album.album_id}")).json()["artist_name"] == "New Name"
+
+async def test_ndjson_sent_in_many_messages_is_applied_in_full(client, login):
+    """The response streams while the body may still arrive; no operation may be lost to the disconnect listener."""
+    from main import app
+    headers = await login("bulk-admin", role="admin")
+    lines = [json.dumps({"op": "create", "data": {"name": f"Artist {index}"}}).encode() + b"\n" for index in range(50)]
+    messages = [{"type": "http.request", "body": line, "more_body": index < len(lines) - 1} for index, line in enumerate(lines)]
+
+    async def receive():
+        if messages:
+            await asyncio.sleep(0)
+            return messages.pop(0)
+        await asyncio.Event().wait() # Like a server: nothing more until the client disconnects
+
+    sent = []
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": "/v1/artists/bulk", "raw_path": b"/v1/artists/bulk",
+        "query_string": b"", "root_path": "", "server": ("test", 80), "client": ("test", 1234),
+        "headers": [(b"content-type", b"application/x-ndjson"), (b"authorization", headers["Authorization"].encode())],
+    }
+    await app(scope, receive, send)
+    body = b"".join(message.get("body", b"") for message in sent if message["type"] == "http.response.body")
+    summary = json.loads(body.splitlines()[-1])["summary"]
+    assert summary == {"total": 50, "created": 50}
+    assert len((await client.get("/v1/artists/", params={"limit": 100})).json()) == 50
+
+async def test_updates_of_one_document_in_a_chunk_are_combined(client, login):
+    from vessapi import crud, schemas
+    headers = await login("bulk-admin", role="admin")
+    artist = await crud.create_artist(schemas.ArtistCreate(name="Before"))
+    music = await crud.create_music(schemas.MusicCreate(
+        title="Song", artist_ids=[artist.artist_id], duration=60,
+        file_path="music/song.mp3", publish_date="2024-01-01T00:00:00",
+    ), uuid4())
+
+    results, _ = await post_bulk(client, "artists", [
+        {"op": "update", "id": str(artist.artist_id), "data": {"name": "After"}},
+        {"op": "update", "id": str(artist.artist_id), "data": {"bio": "Renamed"}},
+    ], headers)
+    assert [result["status"] for result in results] == ["updated", "updated"]
+    stored = (await client.get(f"/v1/artists/{artist.artist_id}")).json()
+    assert (stored["name"], stored["bio"]) == ("After", "Renamed")
+    # The rename still reaches the tracks although a later update did not touch the name
+    assert (await client.get(f"/v1/songs/{music.music_id}")).json()["artist_names"] == ["After"]
@@ -0,0 +1,78 @@
+import time
+
+from vessapi.cache import TTLCache
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    """An entry is served until its TTL, or the shorter per-entry TTL, runs out."""
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("token", "alice")
+    cache.set("short", "bob", ttl=5)
+    now[0] += 10
+    assert cache.get("token") == "alice"
+    assert cache.get("short") is None
+    now[0] += 60
+    assert cache.get("token") is None
+
+def test_least_recently_used_entry_is_evicted():
+    """The cache stays bounded and evicts the entry used longest ago."""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+def test_discard_values_drops_every_token_of_a_user():
+    """Invalidating a user removes all of their cached tokens."""
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("t1", "alice")
+    cache.set("t2", "alice")
+    cache.set("t3", "bob")
+    cache.discard_values("alice")
+    assert len(cache) == 1 and cache.get("t3") == "bob"
+
+def test_zero_ttl_disables_caching():
+    cache = TTLCache(maxsize=10, ttl=0)
+    cache.set("token", "alice")
+    assert cache.get("token") is None
+
+def test_deleting_all_users_drops_cached_tokens(monkeypatch):
+    """Tokens of deleted users stop authenticating at once instead of after the TTL."""
+    import asyncio
+    from types import SimpleNamespace
+    from vessapi import crud
+    from vessapi.cache import token_cache, user_cache
+
+    async def delete_all(query):
+        return SimpleNamespace(deleted_count=2)
+
+    monkeypatch.setattr(crud, "User", SimpleNamespace(delete_all=delete_all))
+    token_cache.set("token-a", "alice")
+    user_cache.set("alice", object())
+    assert asyncio.run(crud.delete_all_users()) == 2
+    assert token_cache.get("token-a") is None and user_cache.get("alice") is None
+
+def test_cached_tokens_expire_with_the_token(monkeypatch):
+    """A verified token is cached only until its exp, whatever the host's time zone."""
+    import asyncio
+    from jose import jwt
+    from vessapi import auth
+    from vessapi.cache import token_cache, user_cache
+
+    exp = int(time.time()) + 3600
+    token = jwt.encode({"sub": "alice", "exp": exp}, auth.SECRET_KEY, algorithm=auth.ALGORITHM)
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(time, "time", lambda: exp - 5)
+    user_cache.set("alice", "alice's document")
+    token_cache.pop(token)
+
+    assert asyncio.run(auth.get_current_user(token)) == "alice's document"
+    now[0] += 4
+    assert token_cache.get(token) == "alice"
+    now[0] += 2
+    assert token_cache.get(token) is None
@@ -0,0 +1,52 @@
+import asyncio
+from types import SimpleNamespace
+
+from vessapi import database
+from vessapi.models import Music
+
+
+class FakeCollection:
+    name = "music"
+
+    def __init__(self, existing):
+        self.existing = existing
+        self.dropped = []
+        self.created = []
+
+    async def index_information(self):
+        return dict(self.existing)
+
+    async def drop_index(self, name):
+        self.dropped.append(name)
+
+    async def create_indexes(self, indexes):
+        self.created.extend(index.document["name"] for index in indexes)
+
+
+def sync_with(monkeypatch, existing, drop_stale=False):
+    collection = FakeCollection(existing)
+    indexes = [SimpleNamespace(name=index.document["name"], index=index) for index in Music.Settings.indexes]
+    model = SimpleNamespace(get_motor_collection=lambda: collection, get_settings=lambda: SimpleNamespace(indexes=indexes))
+    monkeypatch.setattr("vessapi.models.__beanie_models__", [model])
+    report = asyncio.run(database.sync_indexes(drop_stale=drop_stale))
+    return collection, report["music"]
+
+def declared_info(name):
+    """index_information() entry of an index as declared"""
+    document = next(index.document for index in Music.Settings.indexes if index.document["name"] == name)
+    key = [("_fts", "text"), ("_ftsx", 1)] if name == "search_text" else list(document["key"].items())
+    return {"key": key, **{option: document[option] for option in database.INDEX_OPTIONS if option in document}}
+
+def test_changed_text_index_is_rebuilt_without_drop_stale(monkeypatch):
+    existing = {name: declared_info(name) for name in (index.document["name"] for index in Music.Settings.indexes)}
+    existing["search_text"] = {**existing["search_text"], "weights": {"title": 10, "genre": 2, "lyrics": 1}}
+    collection, report = sync_with(monkeypatch, existing)
+    assert collection.dropped == ["search_text"] and collection.created == ["search_text"]
+    assert report == ["search_text: dropped (definition changed)", "search_text: created"]
+
+def test_unchanged_and_other_changed_indexes_are_left_alone(monkeypatch):
+    existing = {name: declared_info(name) for name in (index.document["name"] for index in Music.Settings.indexes)}
+    existing["album_id"] = {**existing["album_id"], "unique": True}
+    collection, report = sync_with(monkeypatch, existing)
+    assert collection.dropped == [] and collection.created == []
+    assert report == ["album_id: drift (definition changed)"]
@@ -0,0 +1,31 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from uuid import uuid4
+
+from vessapi import events
+from vessapi.events import Subscriber, format_event
+from vessapi.models import ChangeOp
+
+
+def change(seq, collection="playlists", public=False, owner_id=None):
+    return SimpleNamespace(seq=seq, collection=collection, entity_id=uuid4(), op=ChangeOp.UPDATED, public=public, owner_id=owner_id)
+
+
+def test_events_are_named_after_collection_and_op():
+    event = change(7)
+    lines = format_event(event).split("\n")
+    assert lines[:2] == ["id: 7", "event: playlists.updated"]
+    assert json.loads(lines[2][len("data: "):]) == {"seq": 7, "collection": "playlists", "id": str(event.entity_id), "op": "updated"}
+
+def test_a_subscriber_that_falls_behind_is_closed(monkeypatch):
+    """Its queue is replaced by the end-of-stream marker; the client catches up with Last-Event-ID."""
+    monkeypatch.setattr(events, "QUEUE_SIZE", 2)
+
+    async def run():
+        subscriber = Subscriber(None)
+        assert subscriber.push(change(1)) and subscriber.push(change(2))
+        assert not subscriber.push(change(3))
+        return subscriber.queue.get_nowait(), subscriber.queue.empty()
+
+    assert asyncio.run(run()) == (None, True)
@@ -0,0 +1,52 @@
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from vessapi.http_cache import ARTISTS, MUSIC, ResponseCacheMiddleware, bump_generation
+
+calls = {"artists": 0, "stream": 0}
+
+app = FastAPI()
+app.add_middleware(ResponseCacheMiddleware, maxsize=100, ttl=60)
+
+@app.get("/v1/artists/")
+async def list_artists(response: Response, limit: int = 10):
+    calls["artists"] += 1
+    response.headers["X-Next-Cursor"] = "abc"
+    return [{"name": "Artist", "limit": limit, "call": calls["artists"]}]
+
+@app.get("/v1/songs/{music_id}/stream")
+async def stream(music_id: str):
+    calls["stream"] += 1
+    return {"call": calls["stream"]}
+
+client = TestClient(app)
+
+
+def test_repeated_reads_are_served_from_cache_with_etag():
+    """The second identical request (query order aside) does not reach the endpoint."""
+    first = client.get("/v1/artists/?limit=5&skip=0")
+    second = client.get("/v1/artists/?skip=0&limit=5")
+    assert first.json() == second.json()
+    assert first.headers["etag"] == second.headers["etag"]
+    assert second.headers["x-next-cursor"] == "abc"
+    assert first.json()[0]["call"] == second.json()[0]["call"]
+
+def test_if_none_match_gets_304():
+    etag = client.get("/v1/artists/?limit=6").headers["etag"]
+    response = client.get("/v1/artists/?limit=6", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+def test_writes_invalidate_only_dependent_routes():
+    """Bumping an unrelated collection keeps the entry; bumping a dependency drops it."""
+    before = client.get("/v1/artists/?limit=7").json()[0]["call"]
+    bump_generation(MUSIC)
+    assert client.get("/v1/artists/?limit=7").json()[0]["call"] == before
+    bump_generation(ARTISTS)
+    assert client.get("/v1/artists/?limit=7").json()[0]["call"] > before
+
+def test_uncached_routes_pass_through():
+    first = client.get("/v1/songs/x/stream").json()["call"]
+    assert client.get("/v1/songs/x/stream").json()["call"] == first + 1
+    assert "etag" not in client.get("/v1/songs/x/stream").headers
@@ -0,0 +1,104 @@
+import hashlib
+import shutil
+
+from vessapi.importer import iter_audio_files, scan_audio_file
+from vessapi.uploads import content_addressed_path
+
+SAMPLE = "library/music/Grogi ft. Anıl Piyancı - Balerin.opus"
+
+
+def test_iter_audio_files_filters_by_format(tmp_path):
+    """Only supported audio formats are picked up, recursively."""
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "song.opus").write_bytes(b"")
+    (tmp_path / "cover.jpg").write_bytes(b"")
+    assert [p.rsplit("/", 1)[1] for p in iter_audio_files(str(tmp_path), ["opus", "mp3"])] == ["song.opus"]
+
+def test_scan_audio_file_hashes_parses_and_copies(tmp_path):
+    """A scan returns the file hash and its tags, and --copy stores it content-addressed."""
+    source = tmp_path / "song.opus"
+    shutil.copy(SAMPLE, source)
+    sha256 = hashlib.sha256(source.read_bytes()).hexdigest()
+    store = tmp_path / "store"
+
+    scan = scan_audio_file(str(source), str(store))
+    assert scan["sha256"] == sha256
+    assert scan["metadata"]["codec"] == "opus"
+    assert scan["stored_path"] == content_addressed_path(str(store), sha256, "opus")
+    assert open(scan["stored_path"], "rb").read() == source.read_bytes()
+
+def test_scan_audio_file_reports_unreadable_files(tmp_path):
+    """A file mutagen cannot read is reported instead of stopping the import."""
+    broken = tmp_path / "broken.mp3"
+    broken.write_bytes(b"not audio")
+    assert "error" in scan_audio_file(str(broken), None)
+
+
+# Needs the test database
+async def test_cached_artist_ids_are_checked_against_the_database(client):
+    from vessapi import crud
+    from vessapi.models import Artist
+
+    artist_id = await crud.get_or_create_artist_id("Cached Artist")
+    assert await crud.get_or_create_artist_id("Cached Artist") == artist_id
+    # Renamed by another process: this process still has the old name cached
+    await Artist.find_one(Artist.artist_id == artist_id).update({"$set": {"name": "Renamed Artist"}})
+    new_id = await crud.get_or_create_artist_id("Cached Artist")
+    assert new_id != artist_id
+    assert (await crud.get_artist(new_id)).name == "Cached Artist"
+
+async def test_covers_of_albums_created_elsewhere_are_removed(client, tmp_path, monkeypatch):
+    from datetime import datetime
+    from uuid import uuid4
+    from vessapi import crud, schemas, services
+    from vessapi.importer import LibraryImporter
+
+    monkeypatch.setattr(services, "ALBUM_IMAGE_DIRECTORY", str(tmp_path))
+    artist = await crud.create_artist(schemas.ArtistCreate(name="Cover Artist"))
+    # Created by another writer after this importer loaded the existing albums
+    await crud.create_album(schemas.AlbumCreate(
+        title="Taken", artist_id=artist.artist_id, release_date="2024-01-01", cover_image_url="/theirs.png",
+    ), uuid4())
+    importer = LibraryImporter(owner_id=uuid4())
+    importer.artists["Cover Artist"] = artist.artist_id
+
+    def scan(title):
+        return {"metadata": {"album_title": title, "album_artist_name": "Cover Artist", "album_image_data": b"png",
+                             "publish_date": datetime(2024, 1, 1), "genre": None}}
+
+    await importer._resolve_albums([scan("Taken"), scan("Fresh")])
+    assert importer.albums[("Taken", artist.artist_id)][1] == "/theirs.png"
+    fresh_cover = importer.albums[("Fresh", artist.artist_id)][1]
+    assert [path.name for path in tmp_path.iterdir()] == [fresh_cover.rsplit("/", 1)[1]]
+
+async def test_cached_album_ids_are_checked_against_the_database(client):
+    from uuid import uuid4
+    from vessapi import crud, schemas
+    from vessapi.models import Album
+
+    artist_id = await crud.get_or_create_artist_id("Album Artist")
+    new_album = schemas.AlbumCreate(title="Cached Album", artist_id=artist_id, release_date="2024-01-01", cover_image_url="")
+    album, created = await crud.get_or_create_album(new_album, uuid4())
+    assert created and (await crud.get_or_create_album(new_album, uuid4()))[0].album_id == album.album_id
+    # Renamed by another process: the cached id no longer has this title
+    await Album.find_one(Album.album_id == album.album_id).update({"$set": {"title": "Renamed Album"}})
+    other, created = await crud.get_or_create_album(new_album, uuid4())
+    assert created and other.album_id != album.album_id
+
+async def test_tracks_of_one_album_share_it_and_its_cover(client, tmp_path, monkeypatch):
+    from datetime import datetime
+    from vessapi import services
+    from vessapi.models import Album
+
+    monkeypatch.setattr(services, "ALBUM_IMAGE_DIRECTORY", str(tmp_path))
+    def metadata(title):
+        return {"title": title, "artist_names": ["Shared Artist"], "album_title": "Shared Album", "album_artist_name": "Shared Artist",
+                "album_image_data": b"png", "duration": 60, "codec": "mp3", "genre": None, "lyrics": None,
+                "publish_date": datetime(2024, 1, 1)}
+
+    first = await services.register_music(metadata("One"), "music/one.mp3", None, None)
+    second = await services.register_music(metadata("Two"), "music/two.mp3", None, None)
+    assert first.album_id == second.album_id
+    assert await Album.find_all().count() == 1
+    # The second track's copy of the cover was removed again
+    assert len(list(tmp_path.iterdir())) == 1
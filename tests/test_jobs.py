@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+from uuid import uuid4
+
+from pymongo.errors import AutoReconnect
+
+from vessapi import jobs, services
+
+
+class FakeLease:
+    """Stands in for _leased(...): answers renewals from a script of results and errors"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.renewals = 0
+
+    def __call__(self, job, worker_id):
+        return self
+
+    async def update(self, change):
+        self.renewals += 1
+        result = self.results.pop(0) if self.results else SimpleNamespace(matched_count=1)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def worker():
+    return jobs.IngestWorker(concurrency=1, lease_seconds=0.03, poll_interval=0.01, retry_backoff=0.01)
+
+def job():
+    return SimpleNamespace(job_id=uuid4(), file_path="x.mp3", cover_image_url=None, owner_id=uuid4(),
+                           content_hash=None, original_filename=None, attempts=1, max_attempts=3)
+
+
+def test_heartbeat_survives_transient_errors(monkeypatch):
+    lease = FakeLease(AutoReconnect("primary stepped down"), SimpleNamespace(matched_count=1), SimpleNamespace(matched_count=0))
+    monkeypatch.setattr(jobs, "_leased", lease)
+    asyncio.run(asyncio.wait_for(worker()._heartbeat(job()), timeout=1))
+    assert lease.renewals == 3
+
+def test_processing_stops_when_the_lease_is_lost(monkeypatch):
+    cancelled = []
+
+    async def process(*args, **kwargs):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    lease = FakeLease(SimpleNamespace(matched_count=0))
+    monkeypatch.setattr(jobs, "_leased", lease)
+    monkeypatch.setattr(services, "process_music_upload_task", process)
+    asyncio.run(asyncio.wait_for(worker()._process(job()), timeout=1))
+    # Only the renewal ran: the outcome of a job someone else owns is not written
+    assert cancelled == [True] and lease.renewals == 1
+
+def test_last_failed_attempt_removes_the_upload(monkeypatch):
+    removed = []
+
+    async def process(*args, **kwargs):
+        raise ValueError("unreadable tags")
+
+    async def remove_unused_upload(job):
+        removed.append(job.file_path)
+
+    monkeypatch.setattr(jobs, "_leased", FakeLease())
+    monkeypatch.setattr(services, "process_music_upload_task", process)
+    monkeypatch.setattr(jobs, "remove_unused_upload", remove_unused_upload)
+    retried, last = job(), job()
+    last.attempts = last.max_attempts
+    asyncio.run(worker()._process(retried))
+    asyncio.run(worker()._process(last))
+    # A job that will be retried still needs its file
+    assert removed == ["x.mp3"]
+
+
+# Needs the test database
+async def test_abandoned_jobs_lose_their_unshared_uploads(client, tmp_path):
+    from datetime import datetime, timedelta
+    from vessapi.models import IngestJob, JobStatus
+
+    async def abandoned(name):
+        path = tmp_path / name
+        path.write_bytes(b"audio")
+        await IngestJob(file_path=str(path), owner_id=uuid4(), status=JobStatus.RUNNING, attempts=3, max_attempts=3,
+                        lease_expires_at=datetime.utcnow() - timedelta(minutes=1)).insert()
+        return path
+
+    lonely, shared = await abandoned("lonely.mp3"), await abandoned("shared.mp3")
+    # A re-upload of the same bytes is queued again
+    await IngestJob(file_path=str(shared), owner_id=uuid4()).insert()
+    await jobs.fail_abandoned_jobs()
+    assert await IngestJob.find(IngestJob.status == JobStatus.FAILED).count() == 2
+    assert not lonely.exists() and shared.exists()
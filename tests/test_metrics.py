@@ -0,0 +1,84 @@
+import asyncio
+from types import SimpleNamespace
+
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from vessapi import metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("test_seconds", "Test", ("route",), buckets=(0.1, 1.0))
+    metrics._metrics.remove(histogram)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, ("/a",))
+    assert histogram.samples() == [
+        'test_seconds_bucket{route="/a",le="0.1"} 2',
+        'test_seconds_bucket{route="/a",le="1.0"} 3',
+        'test_seconds_bucket{route="/a",le="+Inf"} 4',
+        'test_seconds_sum{route="/a"} 3.65',
+        'test_seconds_count{route="/a"} 4',
+    ]
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("test_total", "Test", ("path",))
+    metrics._metrics.remove(counter)
+    counter.inc(('a"b\\c',))
+    assert counter.samples() == ['test_total{path="a\\"b\\\\c"} 1']
+
+
+def test_requests_are_labelled_with_route_templates():
+    app = FastAPI()
+    router = APIRouter(prefix="/items")
+
+    @router.get("/{item_id}")
+    async def read_item(item_id: int):
+        return {"id": item_id}
+
+    app.include_router(router, prefix="/v1")
+    app.add_middleware(metrics.MetricsMiddleware, openapi=app.openapi)
+    client = TestClient(app)
+    client.get("/v1/items/1")
+    client.get("/v1/items/2")
+    client.get("/nowhere")
+
+    assert metrics.HTTP_REQUESTS.values[("GET", "/v1/items/{item_id}", "200")] >= 2
+    assert ("GET", "unmatched", "404") in metrics.HTTP_REQUESTS.values
+    assert not any("/v1/items/1" in labels[1] for labels in metrics.HTTP_REQUEST_SECONDS.values)
+    assert metrics.HTTP_IN_PROGRESS.values[("GET",)] == 0
+
+def test_unknown_methods_share_one_label():
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware, openapi=app.openapi)
+    client = TestClient(app)
+    for method in ("FOO", "BAR"):
+        client.request(method, "/nowhere")
+
+    assert metrics.HTTP_REQUESTS.values[("other", "unmatched", "404")] >= 2
+    assert not any(labels[0] in ("FOO", "BAR") for labels in metrics.HTTP_REQUESTS.values)
+
+
+def test_command_listener_times_commands_per_collection():
+    listener = metrics.MongoCommandMetrics()
+    started = SimpleNamespace(connection_id=("db", 27017), request_id=7, command_name="find", command={"find": "music", "filter": {}})
+    listener.started(started)
+    listener.succeeded(SimpleNamespace(connection_id=("db", 27017), request_id=7, command_name="find", duration_micros=1500))
+    assert metrics.MONGO_COMMAND_SECONDS.values[("find", "music")][1] >= 0.0015
+
+    listener.started(SimpleNamespace(connection_id=("db", 27017), request_id=8, command_name="getMore", command={"getMore": 12345, "collection": "albums"}))
+    listener.failed(SimpleNamespace(connection_id=("db", 27017), request_id=8, command_name="getMore", duration_micros=10))
+    assert metrics.MONGO_COMMAND_FAILURES.values[("getMore", "albums")] >= 1
+    assert listener._collections == {}
+
+
+def test_render_survives_failing_collectors():
+    async def broken():
+        raise RuntimeError("database down")
+
+    metrics.collectors.append(broken)
+    try:
+        text = asyncio.run(metrics.render())
+    finally:
+        metrics.collectors.remove(broken)
+    assert "# TYPE vessapi_http_request_duration_seconds histogram" in text
+    assert "# TYPE vessapi_ingest_jobs_pending gauge" in text
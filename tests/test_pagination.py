@@ -0,0 +1,54 @@
+import pytest
+from datetime import datetime
+from bson import ObjectId
+
+from vessapi.pagination import (encode_cursor, decode_cursor, keyset_filter, next_cursor,
+                                encode_position_cursor, decode_position_cursor, position_filter)
+
+
+class Item:
+    def __init__(self, created_at, id):
+        self.created_at = created_at
+        self.id = id
+
+
+def test_cursor_round_trip():
+    """A cursor decodes back to the (created_at, _id) key it was built from."""
+    created_at = datetime(2024, 5, 1, 10, 30, 15, 123000)
+    object_id = ObjectId()
+    assert decode_cursor(encode_cursor(created_at, object_id)) == (created_at, object_id)
+
+@pytest.mark.parametrize("token", ["", "not-a-cursor", "MjAyNC0wNS0wMQ"])
+def test_invalid_cursor_is_rejected(token):
+    """Tokens that were not produced by encode_cursor raise ValueError."""
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+def test_keyset_filter_starts_after_cursor():
+    """The next page starts strictly after the cursor's (created_at, _id)."""
+    created_at, object_id = datetime(2024, 1, 1), ObjectId()
+    assert keyset_filter((created_at, object_id)) == {
+        "$or": [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "_id": {"$gt": object_id}},
+        ]
+    }
+
+def test_next_cursor_only_for_full_pages():
+    """A short page is the last one, a full page points at its last item."""
+    items = [Item(datetime(2024, 1, 1, 0, 0, i), ObjectId()) for i in range(3)]
+    assert next_cursor(items, limit=5) is None
+    assert decode_cursor(next_cursor(items, limit=3)) == (items[-1].created_at, items[-1].id)
+
+def test_position_cursor_round_trip():
+    """Playlist entry cursors keep the exact float position, including midpoints."""
+    position, object_id = 1024.0 + 1 / 3, ObjectId()
+    assert decode_position_cursor(encode_position_cursor(position, object_id)) == (position, object_id)
+    assert position_filter((position, object_id)) == {
+        "$or": [
+            {"position": {"$gt": position}},
+            {"position": position, "_id": {"$gt": object_id}},
+        ]
+    }
+    with pytest.raises(ValueError):
+        decode_position_cursor(encode_cursor(datetime(2024, 1, 1), object_id))
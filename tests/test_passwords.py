@@ -0,0 +1,41 @@
+import asyncio
+import pytest
+
+from vessapi.passwords import PasswordHasher, PasswordHashingBusy
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_run_in_the_pool():
+    """Hashing and verification work and are counted by the pool."""
+    hasher = PasswordHasher(rounds=4, workers=2, max_queue=8)
+    hashed = await hasher.hash("secret")
+    assert await hasher.verify("secret", hashed)
+    assert not await hasher.verify("wrong", hashed)
+    assert hasher.stats()["completed"] == 3
+    hasher.shutdown()
+
+@pytest.mark.asyncio
+async def test_outdated_cost_is_rehashed_on_login():
+    """A hash created with fewer rounds than configured gets a replacement on a successful verify."""
+    old_hash = await PasswordHasher(rounds=4, workers=1, max_queue=1).hash("secret")
+    hasher = PasswordHasher(rounds=5, workers=1, max_queue=1)
+    valid, new_hash = await hasher.verify_and_update("secret", old_hash)
+    assert valid and new_hash and "$05$" in new_hash
+    valid, new_hash = await hasher.verify_and_update("secret", new_hash)
+    assert valid and new_hash is None
+    assert await hasher.verify_and_update("wrong", old_hash) == (False, None)
+
+@pytest.mark.asyncio
+async def test_requests_beyond_the_queue_are_rejected():
+    """With every slot busy and the queue full, further calls fail fast instead of waiting."""
+    hasher = PasswordHasher(rounds=10, workers=1, max_queue=1)
+    running = asyncio.create_task(hasher.hash("a"))
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(hasher.hash("b"))
+    await asyncio.sleep(0)
+    with pytest.raises(PasswordHashingBusy):
+        await hasher.hash("c")
+    await asyncio.gather(running, queued)
+    assert hasher.stats()["rejected"] == 1
+    assert hasher.stats()["queue_seconds_max"] > 0
+    hasher.shutdown()
@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+
+import pytest
+from pydantic import ValidationError
+
+from vessapi.crud import POSITION_GAP, _spread_positions
+from vessapi.schemas import PlaylistOperation
+
+
+def entry(entry_id, position=0.0):
+    return SimpleNamespace(entry_id=entry_id, position=position)
+
+
+def test_new_entries_are_spread_between_fixed_neighbours():
+    """Fixed entries keep their positions; runs of new ones fill the gaps evenly."""
+    order = [entry("x"), entry("a", 1024.0), entry("y"), entry("z"), entry("b", 2048.0), entry("w")]
+    positions = _spread_positions(order, fixed={"a", "b"})
+    assert positions == [1024.0 - POSITION_GAP, 1024.0, 1024.0 + 1024 / 3, 1024.0 + 2048 / 3, 2048.0, 2048.0 + POSITION_GAP]
+
+def test_no_room_between_neighbours_asks_for_renumbering():
+    order = [entry("a", 1.0), entry("new"), entry("b", 1.0)]
+    assert _spread_positions(order, fixed={"a", "b"}) is None
+
+def test_operations_are_checked():
+    with pytest.raises(ValidationError):
+        PlaylistOperation(op="move", index=2)
+    with pytest.raises(ValidationError):
+        PlaylistOperation(op="add")
+    assert PlaylistOperation(op="add", music_ids=["59f0fddd-3b67-4599-8ac1-df0a3bc8081d"]).index is None
+
+
+# Batch endpoint (needs the test database)
+
+async def create_tracks(count: int) -> list:
+    from uuid import uuid4
+    from vessapi import crud, schemas
+    artist = await crud.create_artist(schemas.ArtistCreate(name="Batch Artist"))
+    return [str((await crud.create_music(schemas.MusicCreate(
+        title=f"Track {index}", artist_ids=[artist.artist_id], duration=60,
+        file_path=f"music/{index}.mp3", publish_date="2024-01-01T00:00:00",
+    ), uuid4())).music_id) for index in range(count)]
+
+async def playlist_order(client, playlist_id, headers) -> list:
+    response = await client.get(f"/v1/playlists/{playlist_id}/entries/", headers=headers)
+    assert response.status_code == 200
+    return [(entry["music_id"], entry["entry_id"]) for entry in response.json()]
+
+async def test_batch_applies_operations_in_order(client, login):
+    headers = await login("batcher")
+    a, b, c, d = await create_tracks(4)
+    playlist_id = (await client.post("/v1/playlists/", json={"name": "Batch"}, headers=headers)).json()["playlist_id"]
+
+    response = await client.post(f"/v1/playlists/{playlist_id}/entries/batch", json={"operations": [
+        {"op": "add", "music_ids": [a, b, c]},
+    ]}, headers=headers)
+    assert response.status_code == 200 and response.json()["track_count"] == 3
+    entry_of = {music_id: entry_id for music_id, entry_id in await playlist_order(client, playlist_id, headers)}
+
+    response = await client.post(f"/v1/playlists/{playlist_id}/entries/batch", json={"operations": [
+        {"op": "add", "music_ids": [d], "index": 0},       # d a b c
+        {"op": "move", "entry_id": entry_of[c], "index": 1}, # d c a b
+        {"op": "remove", "music_ids": [b]},                  # d c a
+    ]}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["track_count"] == 3
+    order = await playlist_order(client, playlist_id, headers)
+    assert [music_id for music_id, _ in order] == [d, c, a]
+    # Moved and untouched entries keep their ids
+    assert order[1][1] == entry_of[c] and order[2][1] == entry_of[a]
+
+async def test_batch_with_unknown_ids_changes_nothing(client, login):
+    from uuid import uuid4
+    headers = await login("careful")
+    a, b = await create_tracks(2)
+    playlist_id = (await client.post("/v1/playlists/", json={"name": "Batch"}, headers=headers)).json()["playlist_id"]
+    await client.post(f"/v1/playlists/{playlist_id}/entries/batch", json={"operations": [{"op": "add", "music_ids": [a]}]}, headers=headers)
+
+    for operation in ({"op": "add", "music_ids": [str(uuid4())]}, {"op": "move", "entry_id": str(uuid4()), "index": 0}):
+        response = await client.post(f"/v1/playlists/{playlist_id}/entries/batch", json={"operations": [
+            {"op": "add", "music_ids": [b]}, {"op": "remove", "music_ids": [a]}, operation,
+        ]}, headers=headers)
+        assert response.status_code == 400
+    assert [music_id for music_id, _ in await playlist_order(client, playlist_id, headers)] == [a]
+    assert (await client.get(f"/v1/playlists/{playlist_id}", headers=headers)).json()["track_count"] == 1
+
+async def test_adding_a_track_twice_keeps_one_entry(client, login):
+    headers = await login("repeater")
+    [a] = await create_tracks(1)
+    playlist_id = (await client.post("/v1/playlists/", json={"name": "Once"}, headers=headers)).json()["playlist_id"]
+    for _ in range(2):
+        response = await client.post(f"/v1/playlists/{playlist_id}/music/{a}", headers=headers)
+        assert response.status_code == 200
+    assert response.json()["track_count"] == 1
+    assert [music_id for music_id, _ in await playlist_order(client, playlist_id, headers)] == [a]
+
+async def test_legacy_playlists_are_migrated_by_maintenance_not_by_reads(client, login):
+    from uuid import UUID
+    from beanie.odm.utils.encoder import Encoder
+    from vessapi import crud
+    from vessapi.models import Playlist
+    headers = await login("legacy")
+    a, b = await create_tracks(2)
+    playlist_id = (await client.post("/v1/playlists/", json={"name": "Old"}, headers=headers)).json()["playlist_id"]
+    await Playlist.get_motor_collection().update_one({"name": "Old"}, {"$set": Encoder().encode({"music_ids": [UUID(a), UUID(b)]})})
+
+    assert (await client.get("/v1/playlists/", headers=headers)).json()[0]["track_count"] == 0
+    assert (await client.get(f"/v1/playlists/{playlist_id}", headers=headers)).json()["track_count"] == 0
+    assert await crud.migrate_legacy_playlists() == 1
+    assert await crud.migrate_legacy_playlists() == 0
+    assert (await client.get(f"/v1/playlists/{playlist_id}", headers=headers)).json()["track_count"] == 2
+    assert [music_id for music_id, _ in await playlist_order(client, playlist_id, headers)] == [a, b]
@@ -0,0 +1,32 @@
+from vessapi.maintenance import ALBUM_RESYNC_PIPELINE, MUSIC_RESYNC_PIPELINE
+from vessapi.models import Album, Music
+from vessapi.projections import AlbumListing, MusicListing
+from vessapi.schemas import AlbumResponse, MusicResponse
+
+
+def test_projections_produce_every_response_field():
+    """The pipeline $project covers exactly the response shape plus _id for the cursor."""
+    assert set(MusicListing.Settings.projection) == set(MusicResponse.model_fields) | {"_id"}
+    assert set(AlbumListing.Settings.projection) == set(AlbumResponse.model_fields) | {"_id"}
+
+def test_response_names_are_stored_on_the_documents():
+    """Listings read the denormalized names; the repair job writes only those fields."""
+    assert {"artist_names", "album_title"} <= set(Music.model_fields)
+    assert "artist_name" in Album.model_fields
+    assert set(MUSIC_RESYNC_PIPELINE[-1]["$project"]) == {"artist_names", "album_title", "_stored"}
+    assert set(ALBUM_RESYNC_PIPELINE[-1]["$project"]) == {"artist_name", "_stored"}
+
+def test_cursor_id_is_not_serialized():
+    listing = MusicListing.model_validate({
+        "_id": "6ad3c73c361764e9a8282190",
+        "music_id": "59f0fddd-3b67-4599-8ac1-df0a3bc8081d",
+        "title": "t",
+        "artist_ids": [],
+        "duration": 1,
+        "file_path": "x",
+        "publish_date": "2024-01-01T00:00:00",
+        "created_at": "2024-01-01T00:00:00",
+        "updated_at": "2024-01-01T00:00:00",
+    })
+    assert str(listing.id) == "6ad3c73c361764e9a8282190"
+    assert "id" not in listing.model_dump() and "_id" not in listing.model_dump(by_alias=True)
@@ -0,0 +1,117 @@
+import asyncio
+from types import SimpleNamespace
+from uuid import uuid4
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from motor.frameworks import asyncio as motor_framework
+
+from vessapi import query_budget
+from vessapi.query_budget import QueryBudgetListener, capture_call_sites, query_shape, track_queries
+
+
+def test_query_shape_ignores_values():
+    first = query_shape("find", {"find": "artists", "filter": {"artist_id": uuid4()}, "limit": 1})
+    second = query_shape("find", {"find": "artists", "filter": {"artist_id": uuid4()}, "limit": 1})
+    assert first == second
+    assert query_shape("find", {"find": "music", "filter": {"artist_ids": {"$in": [uuid4()]}}}) == \
+        query_shape("find", {"find": "music", "filter": {"artist_ids": {"$in": [uuid4(), uuid4()]}}})
+    assert first != query_shape("find", {"find": "artists", "filter": {"name": "A"}})
+    assert first != query_shape("find", {"find": "albums", "filter": {"artist_id": uuid4()}})
+
+
+listener = QueryBudgetListener()
+request_ids = iter(range(1, 1_000_000))
+
+def run_command(command_name: str, command: dict, micros: int = 1000):
+    """What pymongo does on the driver thread for one command"""
+    request_id = next(request_ids)
+    listener.started(SimpleNamespace(connection_id=("db", 27017), request_id=request_id, command_name=command_name, command=command))
+    listener.succeeded(SimpleNamespace(connection_id=("db", 27017), request_id=request_id, command_name=command_name, duration_micros=micros))
+
+async def lookup_artist():
+    loop = asyncio.get_running_loop()
+    # Motor's path: the command runs on an executor thread with a copy of the context
+    await motor_framework.run_on_executor(loop, run_command, "find", {"find": "artists", "filter": {"artist_id": uuid4()}})
+
+async def list_tracks_with_artists(count: int):
+    for _ in range(count):
+        await lookup_artist()
+
+
+def test_commands_are_charged_to_the_active_budget_across_threads():
+    capture_call_sites()
+
+    async def scenario():
+        with track_queries() as outer:
+            with track_queries() as inner:
+                await list_tracks_with_artists(5)
+            await lookup_artist()
+        return outer, inner
+
+    outer, inner = asyncio.run(scenario())
+    assert (inner.count, outer.count) == (5, 6)
+    assert outer.total_seconds == 0.006
+    [(description, times, call_site)] = outer.repeated()
+    assert (description, times) == ("find artists", 6)
+    assert call_site.startswith("tests/test_query_budget.py")
+    assert "lookup_artist" in call_site and "list_tracks_with_artists" in call_site
+
+def test_commands_outside_a_budget_are_ignored():
+    run_command("find", {"find": "artists", "filter": {}})
+    assert listener._started == {}
+
+
+def test_middleware_adds_headers_and_reports_repeats(capsys):
+    app = FastAPI()
+
+    @app.get("/tracks")
+    async def tracks():
+        for _ in range(query_budget.REPEAT_WARNING):
+            run_command("find", {"find": "artists", "filter": {"artist_id": uuid4()}}, micros=2000)
+        run_command("aggregate", {"aggregate": "music", "pipeline": [{"$match": {}}]}, micros=5000)
+        return []
+
+    app.add_middleware(query_budget.QueryBudgetMiddleware)
+    response = TestClient(app).get("/tracks")
+    assert response.headers["x-query-count"] == str(query_budget.REPEAT_WARNING + 1)
+    assert response.headers["x-query-time-ms"] == f"{query_budget.REPEAT_WARNING * 2 + 5:.1f}"
+    assert response.headers["x-query-slowest"] == "aggregate music 5.0ms"
+    assert f"GET /tracks ran find artists {query_budget.REPEAT_WARNING} times" in capsys.readouterr().out
+
+
+# Endpoint budgets (need the test database). The limits do not grow with the number of
+# items, so a per-item lookup creeping back into a listing fails here.
+
+async def create_catalog():
+    from vessapi import crud, schemas
+    owner_id = uuid4()
+    artist = await crud.create_artist(schemas.ArtistCreate(name="Budget Artist"))
+    for index in range(3):
+        album = await crud.create_album(schemas.AlbumCreate(
+            title=f"Album {index}", artist_id=artist.artist_id, release_date="2024-01-01", cover_image_url="/x.png",
+        ), owner_id)
+        for track in range(3):
+            await crud.create_music(schemas.MusicCreate(
+                title=f"Track {index}-{track}", artist_ids=[artist.artist_id], album_id=album.album_id,
+                duration=60, file_path=f"music/{index}-{track}.mp3", publish_date="2024-01-01T00:00:00",
+            ), owner_id)
+    return artist
+
+async def test_catalog_lists_stay_within_query_budget(client, max_queries):
+    artist = await create_catalog()
+    with max_queries(1):
+        assert (await client.get("/v1/songs/")).status_code == 200
+    with max_queries(1):
+        assert (await client.get("/v1/albums/")).status_code == 200
+    with max_queries(1):
+        assert (await client.get(f"/v1/artists/{artist.artist_id}/music")).status_code == 200
+
+async def test_web_pages_stay_within_query_budget(client, max_queries):
+    artist = await create_catalog()
+    with max_queries(2):
+        assert (await client.get("/music_page")).status_code == 200
+    with max_queries(2):
+        assert (await client.get("/albums_page")).status_code == 200
+    with max_queries(3):
+        assert (await client.get(f"/artists_page/{artist.artist_id}")).status_code == 200
@@ -0,0 +1,58 @@
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID, uuid4
+
+import pytest
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from pydantic import BaseModel
+
+from vessapi.projections import MusicListing
+from vessapi.responses import dump_list
+from vessapi.schemas import ArtistResponse, MusicResponse
+
+
+def response_model_json(items, schema):
+    field = create_model_field(name="Response", type_=List[schema], mode="serialization")
+    return asyncio.run(serialize_response(field=field, response_content=items, dump_json=True))
+
+def test_listings_serialize_like_response_model():
+    listing = MusicListing.model_validate({
+        "_id": "6ad3c73c361764e9a8282190",
+        "music_id": str(uuid4()),
+        "title": "t",
+        "artist_ids": [str(uuid4())],
+        "artist_names": ["a"],
+        "duration": 1,
+        "file_path": "x",
+        "publish_date": "2024-01-01T00:00:00",
+        "created_at": "2024-01-01T00:00:00",
+        "updated_at": "2024-01-01T00:00:00",
+    })
+    assert dump_list([listing, listing], MusicResponse) == response_model_json([listing, listing], MusicResponse)
+    assert dump_list([], MusicResponse) == b"[]"
+
+
+class StoredArtist(BaseModel):
+    """Stands in for a document: extra fields, schema fields in another order"""
+    artist_id: UUID
+    name: str
+    created_at: datetime
+    updated_at: datetime
+    bio: Optional[str] = None
+    image_url: Optional[str] = None
+    name_lower: str = ""
+
+class Incomplete(BaseModel):
+    name: str
+
+def test_documents_serialize_like_response_model():
+    now = datetime(2024, 1, 1)
+    artists = [StoredArtist(artist_id=uuid4(), name="A", created_at=now, updated_at=now, name_lower="a")]
+    assert dump_list(artists, ArtistResponse) == response_model_json(artists, ArtistResponse)
+    assert b"name_lower" not in dump_list(artists, ArtistResponse)
+
+def test_documents_must_carry_every_schema_field():
+    with pytest.raises(TypeError):
+        dump_list([Incomplete(name="A")], ArtistResponse)
@@ -0,0 +1,76 @@
+import os
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from vessapi.streaming import StreamInfo, media_type_for, stream_response
+
+SAMPLE = os.path.join("library", "music", "Grogi ft. Anıl Piyancı - Balerin.opus")
+
+app = FastAPI()
+
+@app.get("/stream")
+async def stream(request: Request):
+    info = StreamInfo(path=SAMPLE, media_type=media_type_for("opus", SAMPLE), filename="Balerin.opus", stat_result=os.stat(SAMPLE))
+    return stream_response(request, info)
+
+client = TestClient(app)
+
+
+@pytest.mark.parametrize("codec, path, expected", [
+    ("opus", "a.opus", "audio/ogg"),
+    ("flac", "a.bin", "audio/flac"),
+    (None, "a.mp3", "audio/mpeg"),
+    (None, "a.m4a", "audio/mp4"),
+])
+def test_media_type_for(codec, path, expected):
+    """The MIME type comes from the stored codec, falling back to the file extension."""
+    assert media_type_for(codec, path) == expected
+
+def test_full_stream_has_validators():
+    """A plain GET returns the whole file with ETag, Last-Modified and Accept-Ranges."""
+    response = client.get("/stream")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "audio/ogg"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "etag" in response.headers and "last-modified" in response.headers
+    assert len(response.content) == os.path.getsize(SAMPLE)
+
+def test_range_request_returns_partial_content():
+    """Seeking fetches only the requested bytes."""
+    response = client.get("/stream", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 100-199/{os.path.getsize(SAMPLE)}"
+    assert len(response.content) == 100
+
+def test_multi_range_request():
+    """Several ranges come back as multipart/byteranges."""
+    response = client.get("/stream", headers={"Range": "bytes=0-9,100-109"})
+    assert response.status_code == 206
+    assert response.headers["content-type"].startswith("multipart/byteranges")
+
+def test_conditional_get_returns_not_modified():
+    """A matching If-None-Match is answered with 304 and no body."""
+    etag = client.get("/stream").headers["etag"]
+    response = client.get("/stream", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+def test_stale_if_range_returns_full_file():
+    """A Range with a stale If-Range validator falls back to the full file."""
+    response = client.get("/stream", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+
+def test_cached_streams_pick_up_a_replaced_file(tmp_path):
+    """Only the track lookup is cached; a file rewritten in place is served with its new size."""
+    import asyncio
+    from uuid import uuid4
+    from vessapi.streaming import resolve_stream, stream_cache
+
+    path = tmp_path / "track.mp3"
+    path.write_bytes(b"a" * 100)
+    music_id = uuid4()
+    stream_cache.set(music_id, StreamInfo(path=str(path), media_type="audio/mpeg", filename="track.mp3", stat_result=os.stat(path)))
+    path.write_bytes(b"b" * 250)
+    assert asyncio.run(resolve_stream(music_id)).stat_result.st_size == 250
+    stream_cache.invalidate(music_id)
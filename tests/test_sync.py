@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from vessapi.changes import decode_sync_token, encode_sync_token, token_expired
+from vessapi.models import CHANGE_RETENTION
+
+
+def test_sync_token_round_trip():
+    issued_at = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    assert decode_sync_token(encode_sync_token(1234, issued_at)) == (1234, issued_at)
+
+def test_invalid_sync_tokens_are_rejected():
+    for token in ("", "not-a-token", "MTIzNHx5ZXN0ZXJkYXk"): # The last one is "1234|yesterday"
+        with pytest.raises(ValueError):
+            decode_sync_token(token)
+
+def test_tokens_older_than_the_change_log_expire():
+    """Tombstones written after an old token was issued may already be gone."""
+    assert not token_expired(datetime.utcnow() - timedelta(days=1))
+    assert token_expired(datetime.utcnow() - CHANGE_RETENTION)
+
+
+# Endpoint (needs the test database)
+
+async def sync(client, headers, since=None, limit=500):
+    params = {"limit": limit} if since is None else {"since": since, "limit": limit}
+    response = await client.get("/v1/sync/changes", params=params, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+async def test_changes_collapse_per_entity_and_keep_tombstones(client, login):
+    admin = await login("sync-admin", role="admin")
+    old_id = (await client.post("/v1/artists/", json={"name": "Old"}, headers=admin)).json()["artist_id"]
+    token = (await sync(client, admin))["next_token"]
+
+    gone_id = (await client.post("/v1/artists/", json={"name": "Gone"}, headers=admin)).json()["artist_id"]
+    await client.put(f"/v1/artists/{gone_id}", json={"bio": "Short-lived"}, headers=admin)
+    await client.delete(f"/v1/artists/{gone_id}", headers=admin)
+    kept_id = (await client.post("/v1/artists/", json={"name": "Kept"}, headers=admin)).json()["artist_id"]
+    await client.delete(f"/v1/artists/{old_id}", headers=admin)
+
+    artists = (await sync(client, admin, token))["artists"]
+    # Created and deleted in between: the client never saw it, so it is not reported at all
+    assert [artist["artist_id"] for artist in artists["created"]] == [kept_id]
+    assert artists["updated"] == []
+    assert artists["deleted"] == [old_id]
+
+async def test_playlists_made_private_are_deleted_for_other_users(client, login):
+    owner = await login("owner")
+    listener = await login("listener")
+    token = (await sync(client, listener))["next_token"]
+    owner_token = (await sync(client, owner))["next_token"]
+
+    playlist_id = (await client.post("/v1/playlists/", json={"name": "Shared", "is_public": True}, headers=owner)).json()["playlist_id"]
+    changes = await sync(client, listener, token)
+    assert [playlist["playlist_id"] for playlist in changes["playlists"]["created"]] == [playlist_id]
+
+    await client.put(f"/v1/playlists/{playlist_id}", json={"is_public": False}, headers=owner)
+    assert (await sync(client, listener, changes["next_token"]))["playlists"]["deleted"] == [playlist_id]
+    # The owner still sees it, created and then updated within the same window
+    assert [playlist["playlist_id"] for playlist in (await sync(client, owner, owner_token))["playlists"]["created"]] == [playlist_id]
+
+async def test_changes_are_paged_with_has_more(client, login):
+    admin = await login("sync-admin", role="admin")
+    token = (await sync(client, admin))["next_token"]
+    for name in ("One", "Two", "Three"):
+        await client.post("/v1/artists/", json={"name": name}, headers=admin)
+
+    first = await sync(client, admin, token, limit=2)
+    assert first["has_more"] and [artist["name"] for artist in first["artists"]["created"]] == ["One", "Two"]
+    second = await sync(client, admin, first["next_token"], limit=2)
+    assert not second["has_more"] and [artist["name"] for artist in second["artists"]["created"]] == ["Three"]
+
+async def test_bad_and_expired_tokens_are_rejected(client, login):
+    headers = await login("syncer")
+    response = await client.get("/v1/sync/changes", params={"since": "not-a-token"}, headers=headers)
+    assert response.status_code == 400
+    expired = encode_sync_token(0, datetime.utcnow() - CHANGE_RETENTION)
+    response = await client.get("/v1/sync/changes", params={"since": expired}, headers=headers)
+    assert response.status_code == 410
@@ -0,0 +1,53 @@
+import hashlib
+import io
+import pytest
+from fastapi import UploadFile
+
+from vessapi.uploads import UploadRejected, content_addressed_path, save_upload, save_upload_content_addressed
+
+
+def make_upload(filename: str, data: bytes, declare_size: bool = True) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename=filename, size=len(data) if declare_size else None)
+
+
+@pytest.mark.asyncio
+async def test_save_upload_streams_and_hashes(tmp_path):
+    """The file is written in full and its SHA-256 is computed while streaming."""
+    data = b"x" * (3 * 1024 * 1024 + 17)
+    stored = await save_upload(make_upload("song.mp3", data), str(tmp_path), max_size_mb=10, allowed_formats=["mp3"])
+    assert stored.size == len(data)
+    assert stored.sha256 == hashlib.sha256(data).hexdigest()
+    assert (tmp_path / "song.mp3").read_bytes() == data
+    assert [p.name for p in tmp_path.iterdir()] == ["song.mp3"]
+
+@pytest.mark.asyncio
+async def test_save_upload_rejects_unsupported_format(tmp_path):
+    """Unsupported extensions are rejected before anything is written."""
+    with pytest.raises(UploadRejected):
+        await save_upload(make_upload("notes.txt", b"hello"), str(tmp_path), max_size_mb=10, allowed_formats=["mp3"])
+    assert list(tmp_path.iterdir()) == []
+
+@pytest.mark.asyncio
+async def test_save_upload_rejects_oversized_file_while_streaming(tmp_path):
+    """A file without a declared size is cut off once it passes the limit and leaves nothing behind."""
+    data = b"x" * (2 * 1024 * 1024)
+    with pytest.raises(UploadRejected):
+        await save_upload(make_upload("big.flac", data, declare_size=False), str(tmp_path), max_size_mb=1, allowed_formats=["flac"])
+    assert list(tmp_path.iterdir()) == []
+
+@pytest.mark.asyncio
+async def test_save_upload_strips_directories_from_filename(tmp_path):
+    """A crafted filename cannot write outside the target directory."""
+    stored = await save_upload(make_upload("../../evil.mp3", b"data"), str(tmp_path), max_size_mb=1, allowed_formats=["mp3"])
+    assert stored.path == str(tmp_path / "evil.mp3")
+
+@pytest.mark.asyncio
+async def test_content_addressed_upload_is_stored_once(tmp_path):
+    """Identical bytes under different names map to a single hash-named file."""
+    data = b"same audio bytes"
+    first = await save_upload_content_addressed(make_upload("a.mp3", data), str(tmp_path), max_size_mb=10, allowed_formats=["mp3"])
+    second = await save_upload_content_addressed(make_upload("b.mp3", data), str(tmp_path), max_size_mb=10, allowed_formats=["mp3"])
+    sha256 = hashlib.sha256(data).hexdigest()
+    assert first.path == second.path == content_addressed_path(str(tmp_path), sha256, "mp3")
+    assert not first.already_stored and second.already_stored
+    assert [p.name for p in tmp_path.rglob("*") if p.is_file()] == [f"{sha256}.mp3"]
@@ -1,5 +1,6 @@
 # auth.py
 import os
+import time
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
@@ -9,6 +10,7 @@ from pydantic import BaseModel
 
 from vessapi.models import User
 from vessapi.crud import get_user_by_username
+from vessapi.cache import token_cache, user_cache
 
 from vessapi.config import settings
 
@@ -41,17 +43,28 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    # Fast path: a token verified recently is not decoded again and its user comes from memory
+    username = token_cache.get(token)
+    if username is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+            token_data = TokenData(username=username)
+        except JWTError:
             raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
-    user = await get_user_by_username(username=token_data.username)
+        username = token_data.username
+        # exp is seconds since the epoch; a naive utcnow().timestamp() would be read as local time
+        expires_in = max(0.0, payload["exp"] - time.time()) if "exp" in payload else None
+        token_cache.set(token, username, ttl=expires_in)
+
+    user = user_cache.get(username)
     if user is None:
-        raise credentials_exception
+        user = await get_user_by_username(username=username)
+        if user is None:
+            raise credentials_exception
+        user_cache.set(username, user)
     return user
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
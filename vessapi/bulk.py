@@ -0,0 +1,374 @@
+"""
+Bulk catalog writes.
+
+POST /v1/songs/bulk, /v1/albums/bulk and /v1/artists/bulk take a JSON array of
+operations or NDJSON (Content-Type application/x-ndjson, one operation per line):
+
+    {"op": "create", "data": {...}}
+    {"op": "update", "id": "<uuid>", "data": {...}}
+    {"op": "delete", "id": "<uuid>"}
+
+Operations are applied in chunks of CHUNK_SIZE. A chunk costs one $in read of the
+documents it updates or deletes, one read per denormalized name source, one
+bulk_write and, for album and artist renames, one bulk_write per collection that
+stores their names. NDJSON bodies are parsed line by line as they arrive and fully
+read before anything is applied; the response then streams one NDJSON result per
+operation as each chunk completes, then a summary line.
+
+With ordered=true (the default) the first operation that fails stops the run and
+every later one is reported as skipped; with ordered=false everything that can be
+applied is, in any order.
+"""
+
+import json
+from collections import Counter
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from beanie import Document
+from beanie.odm.utils.dump import get_dict
+from beanie.odm.utils.encoder import Encoder
+from beanie.operators import In
+from fastapi import HTTPException, Request, status
+from pydantic import ValidationError
+from pymongo import DeleteOne, InsertOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from vessapi import crud, schemas
+from vessapi.changes import record_albums_matching, record_changes, record_music_matching
+from vessapi.http_cache import ALBUMS, ARTISTS, MUSIC, bump_generation
+from vessapi.models import Album, Artist, ChangeOp, Music
+from vessapi.streaming import stream_cache
+
+CHUNK_SIZE = 1000
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+NOT_FOUND = "not_found"
+ERROR = "error"
+SKIPPED = "skipped"
+
+
+class _InvalidLine:
+    """An NDJSON line that is not JSON; reported as that operation's error"""
+
+    def __init__(self, message: str):
+        self.message = message
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'operation'}: {e['msg']}" for e in error.errors())
+
+
+def _result(index: int, status: str, id: Optional[UUID] = None, error: Optional[str] = None) -> dict:
+    result = {"index": index, "status": status}
+    if id is not None:
+        result["id"] = str(id)
+    if error is not None:
+        result["error"] = error
+    return result
+
+
+async def _ndjson_items(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_line(line)
+    if buffer.strip():
+        yield _parse_line(buffer)
+
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return _InvalidLine(f"Invalid JSON: {e}")
+
+
+async def _list_items(items: list) -> AsyncIterator[Any]:
+    for item in items:
+        yield item
+
+
+async def operations_from_request(request: Request) -> AsyncIterator[Any]:
+    """The raw operations of a bulk request body, NDJSON or a JSON array"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_TYPES:
+        # Read the whole body before the response starts: once it streams, Starlette
+        # listens for a disconnect on the same receive channel and would take body messages
+        return _list_items([item async for item in _ndjson_items(request.stream())])
+    try:
+        items = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body must be a JSON array or NDJSON")
+    return _list_items(items)
+
+
+class BulkTarget:
+    """A collection bulk endpoints write to; subclasses keep the denormalized names in sync"""
+    model: type
+    id_field: str
+    create_schema: type
+    update_schema: type
+    generation: str # Collection name, as used by the response cache and the sync change log
+
+    def parse(self, raw: Any) -> Tuple[str, Optional[UUID], Any]:
+        """(op, id, payload) of one raw operation; raises ValueError or ValidationError"""
+        if isinstance(raw, _InvalidLine):
+            raise ValueError(raw.message)
+        operation = schemas.BulkOperation.model_validate(raw)
+        if operation.op == "create":
+            return "create", None, self.create_schema.model_validate(operation.data)
+        if operation.op == "update":
+            return "update", operation.id, self.update_schema.model_validate(operation.data).model_dump(exclude_unset=True)
+        return "delete", operation.id, None
+
+    def new_document(self, payload, owner_id: UUID) -> Document:
+        return self.model(**payload.model_dump(), owner_id=owner_id)
+
+    async def prepare(self, documents: List[Document], updates: List[dict]):
+        """Fill in denormalized fields of new documents and of $set data before writing"""
+
+    async def after_write(self, previous: Dict[UUID, Document], updates: Dict[UUID, dict], deleted: List[UUID]) -> Set[str]:
+        """Propagate applied updates and deletes; returns the other collections that changed"""
+        return set()
+
+
+async def _names_by_id(model: type, id_field: str, name_field: str, ids: Set[UUID]) -> Dict[UUID, str]:
+    if not ids:
+        return {}
+    documents = await model.find(In(getattr(model, id_field), list(ids))).to_list()
+    return {getattr(document, id_field): getattr(document, name_field) for document in documents}
+
+
+class MusicTarget(BulkTarget):
+    model = Music
+    id_field = "music_id"
+    create_schema = schemas.MusicCreate
+    update_schema = schemas.MusicUpdate
+    generation = MUSIC
+
+    async def prepare(self, documents: List[Music], updates: List[dict]):
+        artist_ids = {artist_id for music in documents for artist_id in music.artist_ids}
+        artist_ids.update(artist_id for data in updates for artist_id in data.get("artist_ids") or [])
+        album_ids = {music.album_id for music in documents if music.album_id}
+        album_ids.update(data["album_id"] for data in updates if data.get("album_id"))
+        artist_names = await _names_by_id(Artist, "artist_id", "name", artist_ids)
+        album_titles = await _names_by_id(Album, "album_id", "title", album_ids)
+
+        for music in documents:
+            music.artist_names = [artist_names[artist_id] for artist_id in music.artist_ids if artist_id in artist_names]
+            music.album_title = album_titles.get(music.album_id)
+        for data in updates:
+            if "artist_ids" in data:
+                data["artist_names"] = [artist_names[artist_id] for artist_id in data["artist_ids"] or [] if artist_id in artist_names]
+            if "album_id" in data:
+                data["album_title"] = album_titles.get(data["album_id"])
+
+    async def after_write(self, previous, updates, deleted):
+        for music_id in list(updates) + deleted:
+            stream_cache.invalidate(music_id)
+        return set()
+
+
+class AlbumTarget(BulkTarget):
+    model = Album
+    id_field = "album_id"
+    create_schema = schemas.AlbumCreate
+    update_schema = schemas.AlbumUpdate
+    generation = ALBUMS
+
+    async def prepare(self, documents: List[Album], updates: List[dict]):
+        artist_ids = {album.artist_id for album in documents}
+        artist_ids.update(data["artist_id"] for data in updates if data.get("artist_id"))
+        artist_names = await _names_by_id(Artist, "artist_id", "name", artist_ids)
+        for album in documents:
+            album.artist_name = artist_names.get(album.artist_id)
+        for data in updates:
+            if data.get("artist_id"):
+                data["artist_name"] = artist_names.get(data["artist_id"])
+
+    async def after_write(self, previous, updates, deleted):
+        requests = []
+        retitled = []
+        for album_id, data in updates.items():
+            old = previous[album_id]
+            crud.forget_album_key(old.title, old.artist_id)
+            if data.get("title") and data["title"] != old.title:
+                requests.append(UpdateMany(Encoder().encode({"album_id": album_id}), {"$set": {"album_title": data["title"]}}))
+                retitled.append(album_id)
+        for album_id in deleted:
+            old = previous[album_id]
+            crud.forget_album_key(old.title, old.artist_id)
+            requests.append(UpdateMany(Encoder().encode({"album_id": album_id}), {"$set": {"album_title": None}}))
+            retitled.append(album_id)
+        if not requests:
+            return set()
+        await Music.get_motor_collection().bulk_write(requests, ordered=False)
+        await record_music_matching(In(Music.album_id, retitled))
+        return {MUSIC}
+
+
+class ArtistTarget(BulkTarget):
+    model = Artist
+    id_field = "artist_id"
+    create_schema = schemas.ArtistCreate
+    update_schema = schemas.ArtistUpdate
+    generation = ARTISTS
+
+    def new_document(self, payload, owner_id: UUID) -> Artist:
+        return Artist(**payload.model_dump())
+
+    async def after_write(self, previous, updates, deleted):
+        music_requests = []
+        album_requests = []
+        renamed = []
+        for artist_id, data in updates.items():
+            old_name = previous[artist_id].name
+            crud.forget_artist_name(old_name)
+            if data.get("name") and data["name"] != old_name:
+                # Artist names are unique, so the old name identifies the entry in artist_names
+                music_requests.append(UpdateMany(
+                    Encoder().encode({"artist_ids": artist_id}),
+                    {"$set": {"artist_names.$[name]": data["name"]}},
+                    array_filters=[{"name": old_name}],
+                ))
+                album_requests.append(UpdateMany(Encoder().encode({"artist_id": artist_id}), {"$set": {"artist_name": data["name"]}}))
+                renamed.append(artist_id)
+        for artist_id in deleted:
+            old_name = previous[artist_id].name
+            crud.forget_artist_name(old_name)
+            music_requests.append(UpdateMany(Encoder().encode({"artist_ids": artist_id}), {"$pull": {"artist_names": old_name}}))
+            album_requests.append(UpdateMany(Encoder().encode({"artist_id": artist_id}), {"$set": {"artist_name": None}}))
+            renamed.append(artist_id)
+        if not renamed:
+            return set()
+        await Music.get_motor_collection().bulk_write(music_requests, ordered=False)
+        await Album.get_motor_collection().bulk_write(album_requests, ordered=False)
+        await record_music_matching(In(Music.artist_ids, renamed))
+        await record_albums_matching(In(Album.artist_id, renamed))
+        return {MUSIC, ALBUMS}
+
+
+MUSIC_TARGET = MusicTarget()
+ALBUM_TARGET = AlbumTarget()
+ARTIST_TARGET = ArtistTarget()
+
+
+async def _apply_chunk(target: BulkTarget, chunk: List[Tuple[int, Any]], owner_id: UUID, ordered: bool) -> List[dict]:
+    results: Dict[int, dict] = {}
+    planned = []
+    for index, raw in chunk:
+        try:
+            planned.append((index, *target.parse(raw)))
+        except ValidationError as e:
+            results[index] = _result(index, ERROR, error=_describe(e))
+        except ValueError as e:
+            results[index] = _result(index, ERROR, error=str(e))
+
+    ids = [id for _, op, id, _ in planned if op != "create"]
+    id_attribute = getattr(target.model, target.id_field)
+    previous = {getattr(document, target.id_field): document for document in await target.model.find(In(id_attribute, ids)).to_list()} if ids else {}
+    for index, op, id, _ in planned:
+        if op != "create" and id not in previous:
+            results[index] = _result(index, NOT_FOUND, id=id)
+    if ordered and results:
+        # Nothing after the first failure is applied
+        first_failure = min(results)
+        planned = [item for item in planned if item[0] < first_failure]
+    planned = [item for item in planned if item[0] not in results]
+
+    documents = {index: target.new_document(payload, owner_id) for index, op, _, payload in planned if op == "create"}
+    await target.prepare(list(documents.values()), [payload for _, op, _, payload in planned if op == "update"])
+
+    now = datetime.utcnow()
+    requests = []
+    for index, op, id, payload in planned:
+        if op == "create":
+            requests.append(InsertOne(get_dict(documents[index], to_db=True)))
+        elif op == "update":
+            requests.append(UpdateOne(Encoder().encode({target.id_field: id}), {"$set": Encoder().encode({**payload, "updated_at": now})}))
+        else:
+            requests.append(DeleteOne(Encoder().encode({target.id_field: id})))
+
+    write_errors: Dict[int, str] = {}
+    if requests:
+        try:
+            await target.model.get_motor_collection().bulk_write(requests, ordered=ordered)
+        except BulkWriteError as e:
+            write_errors = {error["index"]: error.get("errmsg", "Write failed") for error in e.details.get("writeErrors", [])}
+    stop = min(write_errors) if ordered and write_errors else None
+
+    created: List[UUID] = []
+    updates: Dict[UUID, dict] = {}
+    deleted: List[UUID] = []
+    for position, (index, op, id, payload) in enumerate(planned):
+        if position in write_errors:
+            results[index] = _result(index, ERROR, id=id, error=write_errors[position])
+        elif stop is not None and position > stop:
+            results[index] = _result(index, SKIPPED, id=id)
+        elif op == "create":
+            created.append(getattr(documents[index], target.id_field))
+            results[index] = _result(index, CREATED, id=created[-1])
+        elif op == "update":
+            # Several updates of one document apply in order; after_write sees their combined effect
+            if id not in deleted:
+                updates[id] = {**updates.get(id, {}), **payload}
+            results[index] = _result(index, UPDATED, id=id)
+        else:
+            # A document deleted later in the chunk only needs its delete propagated
+            updates.pop(id, None)
+            deleted.append(id)
+            results[index] = _result(index, DELETED, id=id)
+
+    await record_changes(target.generation, created, ChangeOp.CREATED)
+    await record_changes(target.generation, updates, ChangeOp.UPDATED)
+    await record_changes(target.generation, deleted, ChangeOp.DELETED)
+    changed = await target.after_write(previous, updates, deleted)
+    if len(write_errors) < len(requests):
+        changed.add(target.generation)
+    if changed:
+        bump_generation(*changed)
+
+    failures = [index for index, result in results.items() if result["status"] in (ERROR, NOT_FOUND)]
+    first_failure = min(failures) if ordered and failures else None
+    return [
+        _result(index, SKIPPED) if first_failure is not None and index > first_failure else results[index]
+        for index, _ in chunk
+    ]
+
+
+async def run_bulk(target: BulkTarget, operations: AsyncIterator[Any], owner_id: UUID, ordered: bool = True) -> AsyncIterator[bytes]:
+    """Apply the operations chunk by chunk, yielding NDJSON results and a final summary"""
+    counts = Counter()
+    failed = False
+    chunk: List[Tuple[int, Any]] = []
+    index = 0
+
+    async def flush():
+        nonlocal failed
+        if failed:
+            results = [_result(i, SKIPPED) for i, _ in chunk]
+        else:
+            results = await _apply_chunk(target, chunk, owner_id, ordered)
+            failed = ordered and any(result["status"] in (ERROR, NOT_FOUND) for result in results)
+        counts.update(result["status"] for result in results)
+        return "".join(json.dumps(result) + "\n" for result in results).encode()
+
+    async for raw in operations:
+        chunk.append((index, raw))
+        index += 1
+        if len(chunk) >= CHUNK_SIZE:
+            yield await flush()
+            chunk = []
+    if chunk:
+        yield await flush()
+    yield (json.dumps({"summary": {"total": index, **counts}}) + "\n").encode()
@@ -0,0 +1,73 @@
+"""
+Process-local TTL caches for the authentication fast path.
+
+Every authenticated request used to decode and verify its JWT and load the user
+from MongoDB. Verified token claims and users are kept here for a short time
+instead; crud drops a user's entries whenever that user is updated or deleted, and
+the TTL bounds how long another app instance's changes can go unnoticed.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from vessapi.config import settings
+
+
+class TTLCache:
+    """A bounded LRU mapping whose entries expire ttl seconds after they were set"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def discard_values(self, value: Any):
+        """Drop every entry holding value (e.g. all cached tokens of one user)"""
+        for key in [key for key, (cached, _) in self._entries.items() if cached == value]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Verified JWT -> username ("sub" claim); entries never outlive the token's exp
+token_cache = TTLCache(settings.security.auth_cache_size, settings.security.auth_cache_ttl)
+# username -> User document
+user_cache = TTLCache(settings.security.auth_cache_size, settings.security.auth_cache_ttl)
+
+
+def invalidate_user(username: str):
+    user_cache.pop(username)
+    token_cache.discard_values(username)
+
+
+def invalidate_all_users():
+    user_cache.clear()
+    token_cache.clear()
@@ -0,0 +1,154 @@
+"""
+Change log for delta sync.
+
+Every write to music, albums, artists and playlists appends a Change (collection,
+entity id, created/updated/deleted) after the write itself, numbered by a counter
+document that is incremented atomically. Deletes are kept as tombstones, and entries
+expire after CHANGE_RETENTION (TTL index on changed_at).
+
+GET /v1/sync/changes?since=<token> returns what changed after the token, each entity
+once in its latest state, and a token to resume from. Tokens hold the last sequence
+number a client has seen and when it was issued; a token older than the retention
+period may have missed expired tombstones and is rejected, and the client re-lists
+everything.
+
+Sequence numbers are allocated before the change is inserted, so a reader can see
+number n+1 before n. Readers stop in front of such a gap for GAP_GRACE and only then
+assume the missing change will never arrive (its writer died).
+"""
+
+import base64
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from beanie.operators import GT
+from pydantic import BaseModel
+from pymongo import ReturnDocument
+
+from vessapi.http_cache import ALBUMS, ARTISTS, MUSIC
+from vessapi.models import Album, Change, ChangeOp, CHANGE_RETENTION, Music
+
+PLAYLISTS = "playlists"
+SYNCED_COLLECTIONS = (MUSIC, ALBUMS, ARTISTS, PLAYLISTS)
+
+COUNTER_ID = "changes"
+GAP_GRACE = timedelta(seconds=10)
+
+# Called after changes were recorded in this process (the event bus wakes up on it)
+on_recorded: List[Callable[[], None]] = []
+
+
+def _counters():
+    return Change.get_motor_collection().database["counters"]
+
+
+async def _allocate(count: int) -> int:
+    """First of count consecutive new sequence numbers"""
+    raw = await _counters().find_one_and_update(
+        {"_id": COUNTER_ID},
+        {"$inc": {"value": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return raw["value"] - count + 1
+
+
+async def current_seq() -> int:
+    raw = await _counters().find_one({"_id": COUNTER_ID})
+    return raw["value"] if raw else 0
+
+
+async def record_changes(
+    collection: str,
+    entity_ids: Iterable[UUID],
+    op: ChangeOp = ChangeOp.UPDATED,
+    owner_id: Optional[UUID] = None,
+    public: bool = True,
+):
+    """Append one change per entity; call after the write has been applied"""
+    entity_ids = list(dict.fromkeys(entity_ids))
+    if not entity_ids:
+        return
+    first = await _allocate(len(entity_ids))
+    now = datetime.utcnow()
+    await Change.insert_many([
+        Change(seq=first + offset, collection=collection, entity_id=entity_id, op=op,
+               owner_id=owner_id, public=public, changed_at=now)
+        for offset, entity_id in enumerate(entity_ids)
+    ])
+    for listener in on_recorded:
+        listener()
+
+
+async def record_change(collection: str, entity_id: UUID, op: ChangeOp = ChangeOp.UPDATED, **visibility):
+    await record_changes(collection, [entity_id], op, **visibility)
+
+
+class _MusicId(BaseModel):
+    music_id: UUID
+
+class _AlbumId(BaseModel):
+    album_id: UUID
+
+
+async def record_music_matching(*filters):
+    """Record an update of every track matching filters (after a fan-out update_many)"""
+    tracks = await Music.find(*filters).project(_MusicId).to_list()
+    await record_changes(MUSIC, [track.music_id for track in tracks])
+
+
+async def record_albums_matching(*filters):
+    albums = await Album.find(*filters).project(_AlbumId).to_list()
+    await record_changes(ALBUMS, [album.album_id for album in albums])
+
+
+# Sync tokens
+def encode_sync_token(seq: int, issued_at: datetime) -> str:
+    return base64.urlsafe_b64encode(f"{seq}|{issued_at.isoformat()}".encode()).decode().rstrip("=")
+
+
+def decode_sync_token(token: str) -> Tuple[int, datetime]:
+    """Raises ValueError for anything that was not produced by encode_sync_token"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        seq, issued_at = raw.split("|")
+        return int(seq), datetime.fromisoformat(issued_at)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid sync token: {token}") from e
+
+
+def token_expired(issued_at: datetime) -> bool:
+    """Changes written after the token was issued may already have expired"""
+    return datetime.utcnow() - issued_at > CHANGE_RETENTION - GAP_GRACE
+
+
+def visible_to(change: Change, user_id: Optional[UUID]) -> bool:
+    """Catalog changes are public; playlist changes reach the owner, and everyone while it is or was public"""
+    return change.collection != PLAYLISTS or change.public or change.owner_id == user_id
+
+
+async def read_all_changes(since: int, limit: int) -> Tuple[List[Change], int, bool]:
+    """
+    Changes after since, oldest first, with the sequence number to resume from and
+    whether more changes are already waiting.
+    """
+    rows = await Change.find(GT(Change.seq, since)).sort("+seq").limit(limit + 1).to_list()
+    has_more = len(rows) > limit
+    now = datetime.utcnow()
+    last = since
+    readable = []
+    for row in rows[:limit]:
+        if row.seq != last + 1 and now - row.changed_at < GAP_GRACE:
+            # An earlier number is still being written; resume in front of it next time
+            has_more = False
+            break
+        readable.append(row)
+        last = row.seq
+    return readable, last, has_more
+
+
+async def read_changes(since: int, user_id: Optional[UUID], limit: int) -> Tuple[List[Change], int, bool]:
+    """Like read_all_changes, but only the changes user_id may see"""
+    changes, last, has_more = await read_all_changes(since, limit)
+    return [change for change in changes if visible_to(change, user_id)], last, has_more
@@ -16,6 +16,7 @@ class DatabaseSettings(BaseModel):
     url: str = Field(default="mongodb://localhost:27017", description="MongoDB bağlantı URL'si")
     name: str = Field(default="vessapi", description="Veritabanı adı")
     test_url: str = Field(default="mongodb://localhost:27017/vessapi_test", description="Test veritabanı URL'si")
+    drop_stale_indexes: bool = Field(default=False, description="Tanımsız veya değişmiş indexleri başlangıçta sil")
 
 
 class SecuritySettings(BaseModel):
@@ -23,14 +24,22 @@ class SecuritySettings(BaseModel):
     secret_key: str = Field(default="your-super-secret-key-change-this-in-production", description="JWT şifreleme anahtarı")
     algorithm: str = Field(default="HS256", description="JWT şifreleme algoritması")
     access_token_expire_minutes: int = Field(default=30, description="Token geçerlilik süresi (dakika)")
+    auth_cache_ttl: int = Field(default=60, description="Doğrulanmış token ve kullanıcı önbellek süresi (saniye, 0 = kapalı)")
+    auth_cache_size: int = Field(default=10000, description="Önbellekte tutulan en fazla token/kullanıcı sayısı")
+    bcrypt_rounds: int = Field(default=12, description="bcrypt maliyet faktörü; daha düşük maliyetli eski şifreler girişte yeniden hashlenir")
+    password_hash_workers: int = Field(default=4, description="Şifre hashleme için iş parçacığı sayısı")
+    password_hash_queue: int = Field(default=64, description="Şifre hashleme için bekleyebilecek en fazla istek sayısı")
 
 
 class ServerSettings(BaseModel):
     """Sunucu ayarları"""
     host: str = Field(default="0.0.0.0", description="Sunucu host adresi")
     port: int = Field(default=8000, description="Sunucu portu")
-    debug: bool = Field(default=False, description="Debug modu")
+    debug: bool = Field(default=False, description="Debug modu (yanıtlarda sorgu sayısı başlıkları ve N+1 sorgu uyarıları)")
     cors_origins: List[str] = Field(default=["*"], description="CORS izin verilen origin'ler")
+    response_cache_ttl: int = Field(default=30, description="Katalog yanıt önbelleği süresi (saniye, 0 = kapalı)")
+    response_cache_size: int = Field(default=2000, description="Önbellekte tutulan en fazla katalog yanıtı sayısı")
+    metrics_enabled: bool = Field(default=True, description="/metrics endpoint'i ve istek/sorgu ölçümleri")
 
 
 class FileSettings(BaseModel):
@@ -46,10 +55,20 @@ class FileSettings(BaseModel):
     max_image_file_size: int = Field(default=10, description="Maksimum resim dosyası boyutu (MB)")
     
     # Desteklenen formatlar
-    supported_music_formats: List[str] = Field(default=["mp3", "flac", "ogg", "wav", "m4a"], description="Desteklenen müzik formatları")
+    supported_music_formats: List[str] = Field(default=["mp3", "flac", "ogg", "opus", "wav", "m4a"], description="Desteklenen müzik formatları")
     supported_image_formats: List[str] = Field(default=["jpg", "jpeg", "png", "webp"], description="Desteklenen resim formatları")
 
 
+class IngestionSettings(BaseModel):
+    """Arka plan müzik işleme (ingestion) ayarları"""
+    concurrency: int = Field(default=4, description="Bir uygulama örneğinde aynı anda işlenen iş sayısı")
+    parser_processes: int = Field(default=2, description="Etiket okuma için süreç havuzu boyutu")
+    max_attempts: int = Field(default=3, description="Bir işin en fazla deneme sayısı")
+    lease_seconds: int = Field(default=60, description="Bir işin kilit (lease) süresi (saniye)")
+    poll_interval: float = Field(default=2.0, description="Yeni iş kontrol aralığı (saniye)")
+    retry_backoff: float = Field(default=5.0, description="Tekrar denemeler arasındaki temel bekleme süresi (saniye)")
+
+
 class LoggingSettings(BaseModel):
     """Loglama ayarları"""
     level: str = Field(default="INFO", description="Log seviyesi")
@@ -64,6 +83,7 @@ class Settings(BaseSettings):
     security: SecuritySettings = Field(default_factory=SecuritySettings)
     server: ServerSettings = Field(default_factory=ServerSettings)
     files: FileSettings = Field(default_factory=FileSettings)
+    ingestion: IngestionSettings = Field(default_factory=IngestionSettings)
     logging: LoggingSettings = Field(default_factory=LoggingSettings)
     
     # Geriye uyumluluk için direkt erişim
@@ -97,6 +117,8 @@ class Settings(BaseSettings):
             self.database.name = os.getenv("DATABASE_NAME")
         if os.getenv("TEST_DATABASE_URL"):
             self.database.test_url = os.getenv("TEST_DATABASE_URL")
+        if os.getenv("DATABASE_DROP_STALE_INDEXES"):
+            self.database.drop_stale_indexes = os.getenv("DATABASE_DROP_STALE_INDEXES").lower() in ("true", "1", "yes")
             
         # Güvenlik ayarları
         if os.getenv("SECRET_KEY"):
@@ -105,6 +127,16 @@ class Settings(BaseSettings):
             self.security.algorithm = os.getenv("ALGORITHM")
         if os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"):
             self.security.access_token_expire_minutes = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+        if os.getenv("AUTH_CACHE_TTL"):
+            self.security.auth_cache_ttl = int(os.getenv("AUTH_CACHE_TTL"))
+        if os.getenv("AUTH_CACHE_SIZE"):
+            self.security.auth_cache_size = int(os.getenv("AUTH_CACHE_SIZE"))
+        if os.getenv("BCRYPT_ROUNDS"):
+            self.security.bcrypt_rounds = int(os.getenv("BCRYPT_ROUNDS"))
+        if os.getenv("PASSWORD_HASH_WORKERS"):
+            self.security.password_hash_workers = int(os.getenv("PASSWORD_HASH_WORKERS"))
+        if os.getenv("PASSWORD_HASH_QUEUE"):
+            self.security.password_hash_queue = int(os.getenv("PASSWORD_HASH_QUEUE"))
             
         # Sunucu ayarları
         if os.getenv("HOST"):
@@ -115,6 +147,12 @@ class Settings(BaseSettings):
             self.server.debug = os.getenv("DEBUG").lower() in ("true", "1", "yes")
         if os.getenv("CORS_ORIGINS"):
             self.server.cors_origins = os.getenv("CORS_ORIGINS").split(",")
+        if os.getenv("RESPONSE_CACHE_TTL"):
+            self.server.response_cache_ttl = int(os.getenv("RESPONSE_CACHE_TTL"))
+        if os.getenv("RESPONSE_CACHE_SIZE"):
+            self.server.response_cache_size = int(os.getenv("RESPONSE_CACHE_SIZE"))
+        if os.getenv("METRICS_ENABLED"):
+            self.server.metrics_enabled = os.getenv("METRICS_ENABLED").lower() in ("true", "1", "yes")
             
         # Dosya ayarları
         if os.getenv("MUSIC_UPLOAD_DIRECTORY"):
@@ -127,6 +165,24 @@ class Settings(BaseSettings):
             self.files.user_image_directory = os.getenv("USER_IMAGE_DIRECTORY")
         if os.getenv("ARTIST_IMAGE_DIRECTORY"):
             self.files.artist_image_directory = os.getenv("ARTIST_IMAGE_DIRECTORY")
+        if os.getenv("MAX_MUSIC_FILE_SIZE"):
+            self.files.max_music_file_size = int(os.getenv("MAX_MUSIC_FILE_SIZE"))
+        if os.getenv("MAX_IMAGE_FILE_SIZE"):
+            self.files.max_image_file_size = int(os.getenv("MAX_IMAGE_FILE_SIZE"))
+        if os.getenv("SUPPORTED_MUSIC_FORMATS"):
+            self.files.supported_music_formats = [f.strip().lower() for f in os.getenv("SUPPORTED_MUSIC_FORMATS").split(",")]
+        if os.getenv("SUPPORTED_IMAGE_FORMATS"):
+            self.files.supported_image_formats = [f.strip().lower() for f in os.getenv("SUPPORTED_IMAGE_FORMATS").split(",")]
+            
+        # Ingestion ayarları
+        if os.getenv("INGEST_CONCURRENCY"):
+            self.ingestion.concurrency = int(os.getenv("INGEST_CONCURRENCY"))
+        if os.getenv("INGEST_PARSER_PROCESSES"):
+            self.ingestion.parser_processes = int(os.getenv("INGEST_PARSER_PROCESSES"))
+        if os.getenv("INGEST_MAX_ATTEMPTS"):
+            self.ingestion.max_attempts = int(os.getenv("INGEST_MAX_ATTEMPTS"))
+        if os.getenv("INGEST_LEASE_SECONDS"):
+            self.ingestion.lease_seconds = int(os.getenv("INGEST_LEASE_SECONDS"))
             
         # Loglama ayarları
         if os.getenv("LOG_LEVEL"):
@@ -1,38 +1,151 @@
-from passlib.context import CryptContext
-from typing import List, Optional
-from uuid import UUID
+import re
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID, uuid5
 from datetime import datetime, date
 
-from vessapi.models import Music, Album, User, Playlist, Artist
+from vessapi.models import Music, Album, User, Playlist, PlaylistEntry, Artist, ChangeOp
+from vessapi.cache import invalidate_all_users, invalidate_user
+from vessapi.passwords import password_hasher
+from vessapi.http_cache import ALBUMS, ARTISTS, MUSIC, bump_generation
+from vessapi.changes import (PLAYLISTS, current_seq, encode_sync_token, read_changes,
+                              record_albums_matching, record_change, record_music_matching)
+from vessapi.projections import (AlbumListing, MusicListing, PlaylistEntryListing,
+                                 PLAYLIST_ENTRY_LOOKUPS, aggregate_listings)
+from vessapi.pagination import Cursor, PositionCursor, POSITION_SORT, paginate, position_filter
+from beanie import Document, PydanticObjectId
+from beanie.odm.utils.dump import get_dict
+from beanie.odm.utils.encoder import Encoder
+from beanie.operators import In, Text
+from pydantic import BaseModel, Field
+from pymongo import DESCENDING, DeleteMany, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from vessapi.schemas import (MusicCreate, MusicUpdate, 
                      AlbumCreate, AlbumUpdate,
                      UserCreate, UserUpdate,
-                     PlaylistCreate, PlaylistUpdate,
-                     ArtistCreate, ArtistUpdate)
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+                     PlaylistCreate, PlaylistUpdate, PlaylistOperation,
+                     ArtistCreate, ArtistUpdate,
+                     AlbumResponse, ArtistResponse, MusicResponse, PlaylistResponse, SyncResponse)
+
+DUPLICATE_KEY_ERROR = 11000
+
+# bcrypt runs in the password hashing pool, never on the event loop
+async def get_password_hash(password: str) -> str:
+    return await password_hasher.hash(password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify(plain_password, hashed_password)
+
+# Get-or-create
+# Process-local name -> id caches used during ingestion so every track of an album
+# does not re-query (or re-write) the same artist and album. Entries are dropped when
+# this process renames or deletes the document; a stale id is detected on read.
+NAME_CACHE_SIZE = 10000
+_artist_id_cache: Dict[str, UUID] = {}
+_album_id_cache: Dict[Tuple[str, UUID], UUID] = {}
+
+def _cache_id(cache: dict, key, value: UUID):
+    if len(cache) >= NAME_CACHE_SIZE:
+        cache.clear()
+    cache[key] = value
+
+def forget_artist_name(name: str):
+    """Drop a cached name -> id entry after the artist was renamed or deleted elsewhere (e.g. in bulk)"""
+    _artist_id_cache.pop(name, None)
+
+def forget_album_key(title: str, artist_id: UUID):
+    _album_id_cache.pop((title, artist_id), None)
+
+async def _upsert_by_key(model: type, key: dict, document: Document) -> Document:
+    """
+    find_one_and_update with upsert on a unique key: the stored document is returned,
+    or document is inserted ($setOnInsert) when none exists. Two concurrent upserts of
+    the same key can both miss and one then fails on the unique index; retrying the
+    upsert finds the winner.
+    """
+    collection = model.get_motor_collection()
+    encoded_key = Encoder().encode(key)
+    on_insert = {field: value for field, value in get_dict(document, to_db=True).items() if field not in key}
+    for attempt in range(3):
+        try:
+            raw = await collection.find_one_and_update(
+                encoded_key,
+                {"$setOnInsert": on_insert},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return model.model_validate(raw)
+        except DuplicateKeyError:
+            if attempt == 2:
+                raise
+
+# Single round-trip writes
+# Updates and deletes put the id and, unless an admin is acting, the owner in the
+# filter of one find_one_and_update/find_one_and_delete: a missing document and
+# someone else's both come back as None without a prior read.
+def _owned(key: dict, owner_id: UUID, is_admin: bool = False) -> dict:
+    return key if is_admin else {**key, "owner_id": owner_id}
+
+async def _set_one(model: type, filter: dict, update_data: dict, return_previous: bool = False):
+    """
+    $set update_data and a fresh updated_at on the document matching filter. Returns
+    the updated document, or None when nothing matched. With return_previous the
+    document from before the update comes back too, as (previous, updated), for
+    callers that fan out or evict by the old values.
+    """
+    changes = {**update_data, "updated_at": datetime.utcnow()}
+    raw = await model.get_motor_collection().find_one_and_update(
+        Encoder().encode(filter),
+        {"$set": Encoder().encode(changes)},
+        return_document=ReturnDocument.BEFORE if return_previous else ReturnDocument.AFTER,
+    )
+    document = model.model_validate(raw) if raw else None
+    if not return_previous:
+        return document
+    # $set only replaces the given fields, so the updated document follows from the old one
+    return document, (document.model_copy(update=changes) if document else None)
+
+async def _delete_one(model: type, filter: dict) -> Optional[Document]:
+    """Delete the document matching filter and return it, or None when nothing matched"""
+    raw = await model.get_motor_collection().find_one_and_delete(Encoder().encode(filter))
+    return model.model_validate(raw) if raw else None
+
+# Denormalized names
+# Tracks store their artists' names and their album's title, albums their artist's
+# name, so listings never join. The copies are filled in whenever the referenced ids
+# are written, and renames and deletes of artists and albums fan out to them with one
+# update_many. vessapi.maintenance re-syncs anything that drifted anyway.
+async def _artist_names(artist_ids: List[UUID]) -> List[str]:
+    """Names of the given artists in the same order; unknown ids are left out"""
+    if not artist_ids:
+        return []
+    artists = await Artist.find(In(Artist.artist_id, artist_ids)).to_list()
+    names = {artist.artist_id: artist.name for artist in artists}
+    return [names[artist_id] for artist_id in artist_ids if artist_id in names]
+
+async def _artist_name(artist_id: UUID) -> Optional[str]:
+    artist = await get_artist(artist_id)
+    return artist.name if artist else None
+
+async def _album_title(album_id: Optional[UUID]) -> Optional[str]:
+    if not album_id:
+        return None
+    album = await get_album(album_id)
+    return album.title if album else None
 
 # Music CRUD
 async def get_music(music_id: UUID) -> Optional[Music]:
     return await Music.find_one(Music.music_id == music_id)
 
-async def get_music_all(
-    skip: int = 0,
-    limit: int = 100,
+async def _build_music_query(
     title: Optional[str] = None,
     artist_ids: Optional[List[UUID]] = None,
     genre: Optional[str] = None,
     min_duration: Optional[int] = None,
     max_duration: Optional[int] = None,
     start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None
-) -> List[Music]:
+    end_date: Optional[datetime] = None,
+    q: Optional[str] = None
+) -> dict:
     query = {}
     if title:
         query["title"] = {"$regex": title, "$options": "i"}
@@ -54,28 +167,78 @@ async def get_music_all(
             query["publish_date"]["$lte"] = end_date
         else:
             query["publish_date"] = {"$lte": end_date}
+    if q:
+        # Free-text match on the title or on any of the track's artist names
+        query["$or"] = [
+            {"title": {"$regex": re.escape(q), "$options": "i"}},
+            {"artist_names": {"$regex": re.escape(q), "$options": "i"}},
+        ]
+    return query
+
+async def get_music_by_content_hash(content_hash: str) -> Optional[Music]:
+    return await Music.find_one(Music.content_hash == content_hash)
+
+async def get_music_all(
+    skip: int = 0,
+    limit: int = 100,
+    title: Optional[str] = None,
+    artist_ids: Optional[List[UUID]] = None,
+    genre: Optional[str] = None,
+    min_duration: Optional[int] = None,
+    max_duration: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    q: Optional[str] = None,
+    cursor: Optional[Cursor] = None
+) -> List[Music]:
+    query = await _build_music_query(title, artist_ids, genre, min_duration, max_duration, start_date, end_date, q)
+    return await paginate(Music.find(query), skip, limit, cursor).to_list()
+
+async def get_music_responses(skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None, **filters) -> List[MusicListing]:
+    """A page of MusicResponses (with artist names and album title) from a single query"""
+    query = await _build_music_query(**filters)
+    return await aggregate_listings(paginate(Music.find(query), skip, limit, cursor), MusicListing)
 
-    return await Music.find(query).skip(skip).limit(limit).to_list()
+async def get_music_response(music_id: UUID) -> Optional[MusicListing]:
+    listings = await aggregate_listings(Music.find(Music.music_id == music_id).limit(1), MusicListing)
+    return listings[0] if listings else None
+
+async def get_music_page(skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None, **filters) -> Tuple[List[Music], int]:
+    """Like get_music_all, but also returns the total number of matching tracks"""
+    query = await _build_music_query(**filters)
+    music_list = await paginate(Music.find(query), skip, limit, cursor).to_list()
+    return music_list, await Music.find(query).count()
 
 async def create_music(music: MusicCreate, owner_id: UUID) -> Music:
-    db_music = Music(**music.model_dump(), owner_id=owner_id)
+    db_music = Music(
+        **music.model_dump(),
+        artist_names=await _artist_names(music.artist_ids),
+        album_title=await _album_title(music.album_id),
+        owner_id=owner_id,
+    )
     await db_music.insert()
+    bump_generation(MUSIC)
+    await record_change(MUSIC, db_music.music_id, ChangeOp.CREATED)
     return db_music
 
 async def update_music(music_id: UUID, music: MusicUpdate, owner_id: UUID, is_admin: bool = False) -> Optional[Music]:
-    db_music = await get_music(music_id)
-    if db_music and (db_music.owner_id == owner_id or is_admin):
-        update_data = music.model_dump(exclude_unset=True)
-        await db_music.update({"$set": update_data})
-        return await get_music(music_id)
-    return None
+    update_data = music.model_dump(exclude_unset=True)
+    if "artist_ids" in update_data:
+        update_data["artist_names"] = await _artist_names(update_data["artist_ids"] or [])
+    if "album_id" in update_data:
+        update_data["album_title"] = await _album_title(update_data["album_id"])
+    db_music = await _set_one(Music, _owned({"music_id": music_id}, owner_id, is_admin), update_data)
+    if db_music:
+        bump_generation(MUSIC)
+        await record_change(MUSIC, music_id)
+    return db_music
 
 async def delete_music(music_id: UUID, owner_id: UUID, is_admin: bool = False) -> Optional[Music]:
-    db_music = await get_music(music_id)
-    if db_music and (db_music.owner_id == owner_id or is_admin):
-        await db_music.delete()
-        return db_music
-    return None
+    db_music = await _delete_one(Music, _owned({"music_id": music_id}, owner_id, is_admin))
+    if db_music:
+        bump_generation(MUSIC)
+        await record_change(MUSIC, music_id, ChangeOp.DELETED)
+    return db_music
 
 # Album CRUD
 async def get_album(album_id: UUID) -> Optional[Album]:
@@ -84,15 +247,15 @@ async def get_album(album_id: UUID) -> Optional[Album]:
 async def get_album_by_title_and_artist_id(title: str, artist_id: UUID) -> Optional[Album]:
     return await Album.find_one(Album.title == title, Album.artist_id == artist_id)
 
-async def get_albums(
-    skip: int = 0,
-    limit: int = 100,
+async def _build_album_query(
     title: Optional[str] = None,
     artist_id: Optional[UUID] = None,
     genre: Optional[str] = None,
     start_date: Optional[date] = None,
-    end_date: Optional[date] = None
-) -> List[Album]:
+    end_date: Optional[date] = None,
+    q: Optional[str] = None,
+    artist_name: Optional[str] = None
+) -> dict:
     query = {}
     if title:
         query["title"] = {"$regex": title, "$options": "i"}
@@ -107,28 +270,98 @@ async def get_albums(
             query["release_date"]["$lte"] = end_date
         else:
             query["release_date"] = {"$lte": end_date}
+    if q:
+        # Free-text match on the album title or on the album artist's name
+        query["$or"] = [
+            {"title": {"$regex": re.escape(q), "$options": "i"}},
+            {"artist_name": {"$regex": re.escape(q), "$options": "i"}},
+        ]
+    if artist_name:
+        query["artist_name"] = {"$regex": f"^{re.escape(artist_name)}$", "$options": "i"}
+    return query
+
+async def get_albums(
+    skip: int = 0,
+    limit: int = 100,
+    title: Optional[str] = None,
+    artist_id: Optional[UUID] = None,
+    genre: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    q: Optional[str] = None,
+    artist_name: Optional[str] = None,
+    cursor: Optional[Cursor] = None
+) -> List[Album]:
+    query = await _build_album_query(title, artist_id, genre, start_date, end_date, q, artist_name)
+    return await paginate(Album.find(query), skip, limit, cursor).to_list()
+
+async def get_album_responses(skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None, **filters) -> List[AlbumListing]:
+    """A page of AlbumResponses (with artist name and track count) from a single query"""
+    query = await _build_album_query(**filters)
+    return await aggregate_listings(paginate(Album.find(query), skip, limit, cursor), AlbumListing)
+
+async def get_album_response(album_id: UUID) -> Optional[AlbumListing]:
+    listings = await aggregate_listings(Album.find(Album.album_id == album_id).limit(1), AlbumListing)
+    return listings[0] if listings else None
 
-    return await Album.find(query).skip(skip).limit(limit).to_list()
+async def get_albums_page(skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None, **filters) -> Tuple[List[Album], int]:
+    """Like get_albums, but also returns the total number of matching albums"""
+    query = await _build_album_query(**filters)
+    albums = await paginate(Album.find(query), skip, limit, cursor).to_list()
+    return albums, await Album.find(query).count()
 
 async def create_album(album: AlbumCreate, owner_id: UUID) -> Album:
-    db_album = Album(**album.model_dump(), owner_id=owner_id)
+    db_album = Album(**album.model_dump(), artist_name=await _artist_name(album.artist_id), owner_id=owner_id)
     await db_album.insert()
+    bump_generation(ALBUMS)
+    await record_change(ALBUMS, db_album.album_id, ChangeOp.CREATED)
     return db_album
 
+async def get_or_create_album(album: AlbumCreate, owner_id: UUID) -> Tuple[Album, bool]:
+    """Atomically find the album with this title and artist or insert it; returns (album, created)"""
+    key = (album.title, album.artist_id)
+    album_id = _album_id_cache.get(key)
+    if album_id:
+        # Another process may have renamed, moved or deleted the album since it was cached
+        db_album = await Album.find_one(Album.album_id == album_id, Album.title == album.title, Album.artist_id == album.artist_id)
+        if db_album:
+            return db_album, False
+        _album_id_cache.pop(key, None)
+
+    new_album = Album(**album.model_dump(), artist_name=await _artist_name(album.artist_id), owner_id=owner_id)
+    db_album = await _upsert_by_key(Album, {"title": album.title, "artist_id": album.artist_id}, new_album)
+    _cache_id(_album_id_cache, key, db_album.album_id)
+    created = db_album.album_id == new_album.album_id
+    if created:
+        bump_generation(ALBUMS)
+        await record_change(ALBUMS, db_album.album_id, ChangeOp.CREATED)
+    return db_album, created
+
 async def update_album(album_id: UUID, album: AlbumUpdate, owner_id: UUID, is_admin: bool = False) -> Optional[Album]:
-    db_album = await get_album(album_id)
-    if db_album and (db_album.owner_id == owner_id or is_admin):
-        update_data = album.model_dump(exclude_unset=True)
-        await db_album.update({"$set": update_data})
-        return await get_album(album_id)
-    return None
+    update_data = album.model_dump(exclude_unset=True)
+    if update_data.get("artist_id"):
+        update_data["artist_name"] = await _artist_name(update_data["artist_id"])
+    previous, db_album = await _set_one(Album, _owned({"album_id": album_id}, owner_id, is_admin), update_data, return_previous=True)
+    if previous is None:
+        return None
+    bump_generation(ALBUMS)
+    await record_change(ALBUMS, album_id)
+    _album_id_cache.pop((previous.title, previous.artist_id), None)
+    if db_album.title != previous.title:
+        await Music.find(Music.album_id == album_id).update({"$set": {"album_title": db_album.title}})
+        bump_generation(MUSIC)
+        await record_music_matching(Music.album_id == album_id)
+    return db_album
 
 async def delete_album(album_id: UUID, owner_id: UUID, is_admin: bool = False) -> Optional[Album]:
-    db_album = await get_album(album_id)
-    if db_album and (db_album.owner_id == owner_id or is_admin):
-        await db_album.delete()
-        return db_album
-    return None
+    db_album = await _delete_one(Album, _owned({"album_id": album_id}, owner_id, is_admin))
+    if db_album:
+        await Music.find(Music.album_id == album_id).update({"$set": {"album_title": None}})
+        bump_generation(ALBUMS, MUSIC)
+        _album_id_cache.pop((db_album.title, db_album.artist_id), None)
+        await record_change(ALBUMS, album_id, ChangeOp.DELETED)
+        await record_music_matching(Music.album_id == album_id)
+    return db_album
 
 # User CRUD
 async def get_user(user_id: UUID) -> Optional[User]:
@@ -137,11 +370,24 @@ async def get_user(user_id: UUID) -> Optional[User]:
 async def get_user_by_username(username: str) -> Optional[User]:
     return await User.find_one({"username": username})
 
-async def get_users(skip: int = 0, limit: int = 100) -> List[User]:
-    return await User.find_all().skip(skip).limit(limit).to_list()
+async def authenticate_user(username: str, password: str) -> Optional[User]:
+    """The user if the password matches; a hash with an outdated cost is replaced on the way"""
+    user = await get_user_by_username(username)
+    if not user:
+        return None
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        await user.update({"$set": {"hashed_password": new_hash}})
+        invalidate_user(user.username)
+    return user
+
+async def get_users(skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None) -> List[User]:
+    return await paginate(User.find_all(), skip, limit, cursor).to_list()
 
 async def create_user(user: UserCreate) -> User:
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     # Create a dictionary from the user model, excluding the password
     user_data = user.model_dump(exclude={"password"})
     
@@ -156,21 +402,29 @@ async def create_user(user: UserCreate) -> User:
     return db_user
 
 async def update_user(user_id: UUID, user: UserUpdate) -> Optional[User]:
-    db_user = await get_user(user_id)
-    if db_user:
-        update_data = user.model_dump(exclude_unset=True)
-        if "password" in update_data and update_data["password"]:
-            update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
-        await db_user.update({"$set": update_data})
-        return await get_user(user_id)
-    return None
+    update_data = user.model_dump(exclude_unset=True)
+    if "password" in update_data:
+        password = update_data.pop("password")
+        if password:
+            update_data["hashed_password"] = await get_password_hash(password)
+    previous, db_user = await _set_one(User, {"user_id": user_id}, update_data, return_previous=True)
+    if previous is None:
+        return None
+    # Role, is_active and password changes must reach the auth cache right away
+    invalidate_user(previous.username)
+    invalidate_user(db_user.username)
+    return db_user
 
 async def delete_user(user_id: UUID) -> Optional[User]:
-    db_user = await get_user(user_id)
+    db_user = await _delete_one(User, {"user_id": user_id})
     if db_user:
-        await db_user.delete()
-        return db_user
-    return None
+        invalidate_user(db_user.username)
+    return db_user
+
+async def delete_all_users() -> int:
+    deleted = await User.delete_all({})
+    invalidate_all_users()
+    return deleted.deleted_count
 
 # Playlist CRUD
 async def get_playlist(playlist_id: UUID, user_id: Optional[UUID] = None) -> Optional[Playlist]:
@@ -184,7 +438,8 @@ async def get_playlist(playlist_id: UUID, user_id: Optional[UUID] = None) -> Opt
 async def get_playlists(
     skip: int = 0, 
     limit: int = 100, 
-    user_id: Optional[UUID] = None
+    user_id: Optional[UUID] = None,
+    cursor: Optional[Cursor] = None
 ) -> List[Playlist]:
     query = {
         "$or": [
@@ -196,50 +451,344 @@ async def get_playlists(
         # If no user is provided, only return public playlists
         query = {"is_public": True}
         
-    return await Playlist.find(query).skip(skip).limit(limit).to_list()
+    return await paginate(Playlist.find(query), skip, limit, cursor).to_list()
 
 async def create_playlist(playlist: PlaylistCreate, owner_id: UUID) -> Playlist:
     db_playlist = Playlist(**playlist.model_dump(), owner_id=owner_id)
     await db_playlist.insert()
+    await _record_playlist(db_playlist, ChangeOp.CREATED)
     return db_playlist
 
 async def update_playlist(playlist_id: UUID, playlist: PlaylistUpdate, owner_id: UUID) -> Optional[Playlist]:
-    db_playlist = await get_playlist(playlist_id)
-    if db_playlist and db_playlist.owner_id == owner_id:
-        update_data = playlist.model_dump(exclude_unset=True)
-        await db_playlist.update({"$set": update_data})
-        return await get_playlist(playlist_id)
-    return None
+    update_data = playlist.model_dump(exclude_unset=True)
+    previous, db_playlist = await _set_one(Playlist, _owned({"playlist_id": playlist_id}, owner_id), update_data, return_previous=True)
+    if db_playlist is None:
+        return None
+    await _record_playlist(db_playlist, was_public=previous.is_public)
+    if db_playlist.music_ids:
+        db_playlist = await _migrate_legacy_entries(db_playlist)
+    return db_playlist
 
 async def delete_playlist(playlist_id: UUID, owner_id: UUID) -> Optional[Playlist]:
-    db_playlist = await get_playlist(playlist_id)
-    if db_playlist and db_playlist.owner_id == owner_id:
-        await db_playlist.delete()
-        return db_playlist
-    return None
+    db_playlist = await _delete_one(Playlist, _owned({"playlist_id": playlist_id}, owner_id))
+    if db_playlist:
+        await PlaylistEntry.find(PlaylistEntry.playlist_id == playlist_id).delete()
+        await _record_playlist(db_playlist, ChangeOp.DELETED)
+    return db_playlist
 
-# PlaylistMusic CRUD
-async def add_music_to_playlist(playlist_id: UUID, music_id: UUID, owner_id: UUID) -> Optional[Playlist]:
-    playlist = await get_playlist(playlist_id)
+async def _record_playlist(playlist: Playlist, op: ChangeOp = ChangeOp.UPDATED, was_public: bool = False):
+    """Log a playlist change; it reaches other users' sync feeds if the playlist was or is public"""
+    await record_change(PLAYLISTS, playlist.playlist_id, op, owner_id=playlist.owner_id, public=playlist.is_public or was_public)
+
+# Playlist entries
+# The tracks of a playlist are PlaylistEntry documents ordered by a float position
+# (ties broken by _id), so the playlist document stays small whatever its length and
+# pages are keyset reads on the (playlist_id, position, _id) index. Inserting or
+# moving an entry takes the midpoint of its new neighbours' positions; once repeated
+# inserts at one spot exhaust the precision between two neighbours, the playlist's
+# positions are spread out again.
+POSITION_GAP = 1024.0
+RENUMBER_BATCH_SIZE = 1000
+
+class _EntryKey(BaseModel):
+    id: PydanticObjectId = Field(alias="_id")
+    position: float
+
+def _entries_of(playlist_id: UUID, exclude_entry_id: Optional[UUID] = None):
+    query = PlaylistEntry.find(PlaylistEntry.playlist_id == playlist_id)
+    if exclude_entry_id:
+        query = query.find(PlaylistEntry.entry_id != exclude_entry_id)
+    return query
+
+async def _migrate_legacy_entries(playlist: Playlist) -> Playlist:
+    """Move a playlist's legacy music_ids array into PlaylistEntry documents"""
+    entries = [
+        # Deterministic ids make a concurrent or interrupted migration idempotent
+        PlaylistEntry(
+            entry_id=uuid5(playlist.playlist_id, str(index)),
+            playlist_id=playlist.playlist_id,
+            music_id=music_id,
+            position=(index + 1) * POSITION_GAP,
+        )
+        for index, music_id in enumerate(playlist.music_ids)
+    ]
+    try:
+        await PlaylistEntry.insert_many(entries, ordered=False)
+    except BulkWriteError as e:
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in e.details.get("writeErrors", [])):
+            raise
+    # Only the first migration to get here counts the entries
+    result = await Playlist.find_one(Playlist.playlist_id == playlist.playlist_id, {"music_ids.0": {"$exists": True}}).update(
+        {"$set": {"music_ids": []}, "$inc": {"track_count": len(entries)}}
+    )
+    migrated = await Playlist.find_one(Playlist.playlist_id == playlist.playlist_id)
+    if result and result.modified_count and migrated:
+        await _record_playlist(migrated)
+    return migrated
+
+async def _editable_playlist(playlist_id: UUID, owner_id: UUID) -> Optional[Playlist]:
+    """The playlist if owner_id owns it, with legacy music_ids moved to entries before it is edited"""
+    playlist = await Playlist.find_one(Playlist.playlist_id == playlist_id, Playlist.owner_id == owner_id)
+    if playlist and playlist.music_ids:
+        playlist = await _migrate_legacy_entries(playlist)
+    return playlist
+
+async def migrate_legacy_playlists() -> int:
+    """Move every playlist still storing music_ids to entries (reads leave them alone); returns how many"""
+    migrated = 0
+    async for playlist in Playlist.find({"music_ids.0": {"$exists": True}}):
+        await _migrate_legacy_entries(playlist)
+        migrated += 1
+    return migrated
+
+async def _renumber_entries(playlist_id: UUID):
+    """Spread the playlist's positions POSITION_GAP apart again, keeping their order"""
+    # Read the order first: updating while scanning the position index could revisit entries
+    keys = await _entries_of(playlist_id).sort(POSITION_SORT).project(_EntryKey).to_list()
+    collection = PlaylistEntry.get_motor_collection()
+    for start in range(0, len(keys), RENUMBER_BATCH_SIZE):
+        batch = keys[start:start + RENUMBER_BATCH_SIZE]
+        await collection.bulk_write(
+            [UpdateOne({"_id": key.id}, {"$set": {"position": (start + offset + 1) * POSITION_GAP}}) for offset, key in enumerate(batch)],
+            ordered=False,
+        )
+
+async def _position_at(playlist_id: UUID, index: Optional[int], exclude_entry_id: Optional[UUID] = None) -> Optional[float]:
+    """
+    Position for an entry placed at index (None appends), not counting exclude_entry_id.
+    None means there is no room left between the neighbours.
+    """
+    entries = _entries_of(playlist_id, exclude_entry_id)
+    if index is None:
+        last = await entries.sort([("position", DESCENDING), ("_id", DESCENDING)]).limit(1).project(_EntryKey).to_list()
+        return last[0].position + POSITION_GAP if last else POSITION_GAP
+    if index == 0:
+        first = await entries.sort(POSITION_SORT).limit(1).project(_EntryKey).to_list()
+        return first[0].position - POSITION_GAP if first else POSITION_GAP
+    neighbours = await entries.sort(POSITION_SORT).skip(index - 1).limit(2).project(_EntryKey).to_list()
+    if len(neighbours) < 2:
+        # At or past the end
+        return await _position_at(playlist_id, None, exclude_entry_id)
+    before, after = neighbours[0].position, neighbours[1].position
+    position = (before + after) / 2
+    return position if before < position < after else None
+
+async def _free_position(playlist_id: UUID, index: Optional[int], exclude_entry_id: Optional[UUID] = None) -> float:
+    position = await _position_at(playlist_id, index, exclude_entry_id)
+    if position is None:
+        await _renumber_entries(playlist_id)
+        position = await _position_at(playlist_id, index, exclude_entry_id)
+    return position
+
+async def _touch_playlist(playlist_id: UUID, track_delta: int = 0) -> Optional[Playlist]:
+    """Bump updated_at and track_count; returns the playlist after the change"""
+    raw = await Playlist.get_motor_collection().find_one_and_update(
+        Encoder().encode({"playlist_id": playlist_id}),
+        {"$set": {"updated_at": datetime.utcnow()}, "$inc": {"track_count": track_delta}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not raw:
+        return None
+    playlist = Playlist.model_validate(raw)
+    await _record_playlist(playlist)
+    return playlist
+
+async def get_playlist_entry(playlist_id: UUID, entry_id: UUID) -> Optional[PlaylistEntry]:
+    return await PlaylistEntry.find_one(PlaylistEntry.playlist_id == playlist_id, PlaylistEntry.entry_id == entry_id)
+
+async def add_music_to_playlist(playlist_id: UUID, music_id: UUID, owner_id: UUID, index: Optional[int] = None) -> Optional[Playlist]:
+    """Insert the track at index (zero-based; appended when None or past the end) unless it is already in the playlist"""
+    playlist = await _editable_playlist(playlist_id, owner_id)
     music = await get_music(music_id)
-    if playlist and music and playlist.owner_id == owner_id:
-        await playlist.update({"$addToSet": {"music_ids": music_id}})
-        return await get_playlist(playlist_id)
+    if playlist and music:
+        if await PlaylistEntry.find_one(PlaylistEntry.playlist_id == playlist_id, PlaylistEntry.music_id == music_id):
+            # Already in the playlist: adding is a no-op, as with the former $addToSet
+            return playlist
+        entry = PlaylistEntry(playlist_id=playlist_id, music_id=music_id, position=await _free_position(playlist_id, index))
+        await entry.insert()
+        return await _touch_playlist(playlist_id, 1)
     return None
 
 async def remove_music_from_playlist(playlist_id: UUID, music_id: UUID, owner_id: UUID) -> Optional[Playlist]:
-    playlist = await get_playlist(playlist_id)
+    """Remove every entry of the track from the playlist"""
+    playlist = await _editable_playlist(playlist_id, owner_id)
     music = await get_music(music_id)
-    if playlist and music and playlist.owner_id == owner_id:
-        await playlist.update({"$pull": {"music_ids": music_id}})
-        return await get_playlist(playlist_id)
+    if playlist and music:
+        result = await PlaylistEntry.find(PlaylistEntry.playlist_id == playlist_id, PlaylistEntry.music_id == music_id).delete()
+        return await _touch_playlist(playlist_id, -result.deleted_count)
     return None
 
-async def get_music_in_playlist(playlist_id: UUID) -> List[Music]:
-    playlist = await get_playlist(playlist_id)
+async def remove_playlist_entry(playlist_id: UUID, entry_id: UUID, owner_id: UUID) -> Optional[Playlist]:
+    playlist = await _editable_playlist(playlist_id, owner_id)
     if playlist:
-        return await Music.find(Music.music_id.in_(playlist.music_ids)).to_list()
-    return []
+        result = await PlaylistEntry.find(PlaylistEntry.playlist_id == playlist_id, PlaylistEntry.entry_id == entry_id).delete()
+        if result.deleted_count:
+            return await _touch_playlist(playlist_id, -result.deleted_count)
+    return None
+
+async def move_playlist_entry(playlist_id: UUID, entry_id: UUID, index: int, owner_id: UUID) -> Optional[PlaylistEntry]:
+    """Move an entry so it ends up at index (zero-based) in the playlist"""
+    playlist = await _editable_playlist(playlist_id, owner_id)
+    entry = await get_playlist_entry(playlist_id, entry_id)
+    if playlist and entry:
+        position = await _free_position(playlist_id, index, exclude_entry_id=entry_id)
+        await entry.update({"$set": {"position": position}})
+        await _touch_playlist(playlist_id)
+        return await get_playlist_entry(playlist_id, entry_id)
+    return None
+
+# Batched playlist edits
+# A batch of add/remove/move operations is validated and planned up front and applied
+# with a single bulk_write, whatever its size: one query checks every added track,
+# one reads what the plan needs, one writes the entries and one returns the playlist.
+PLAYLIST_BATCH_LIMIT = 5000
+
+class PlaylistBatchError(Exception):
+    """A batch refers to tracks or entries that do not exist, or is too large; nothing was applied"""
+
+class _MusicId(BaseModel):
+    music_id: UUID
+
+class _EntryOrder(BaseModel):
+    id: PydanticObjectId = Field(alias="_id")
+    entry_id: UUID
+    music_id: UUID
+    position: float
+
+def _entry_insert(playlist_id: UUID, music_id: UUID, position: float) -> InsertOne:
+    return InsertOne(get_dict(PlaylistEntry(playlist_id=playlist_id, music_id=music_id, position=position), to_db=True))
+
+def _spread_positions(order: list, fixed: set) -> Optional[List[float]]:
+    """
+    Positions for order where entries whose entry_id is in fixed keep theirs and each run
+    of other entries is spaced evenly between its neighbours. None if they do not fit.
+    """
+    positions: List[float] = []
+    index = 0
+    while index < len(order):
+        if order[index].entry_id in fixed:
+            positions.append(order[index].position)
+            index += 1
+            continue
+        end = index
+        while end < len(order) and order[end].entry_id not in fixed:
+            end += 1
+        before = positions[-1] if positions else None
+        after = order[end].position if end < len(order) else None
+        count = end - index
+        for k in range(count):
+            if before is None and after is None:
+                positions.append((k + 1) * POSITION_GAP)
+            elif before is None:
+                positions.append(after - (count - k) * POSITION_GAP)
+            elif after is None:
+                positions.append(before + (k + 1) * POSITION_GAP)
+            else:
+                positions.append(before + (after - before) * (k + 1) / (count + 1))
+        index = end
+    if all(a < b for a, b in zip(positions, positions[1:])):
+        return positions
+    return None
+
+async def _plan_appends(playlist_id: UUID, operations: List[PlaylistOperation]) -> list:
+    """Adds at the end and removes only: no need to read the playlist's order"""
+    position = await _position_at(playlist_id, None)
+    requests = []
+    for operation in operations:
+        if operation.op == "add":
+            for music_id in operation.music_ids:
+                requests.append(_entry_insert(playlist_id, music_id, position))
+                position += POSITION_GAP
+        else:
+            requests.append(DeleteMany(Encoder().encode({"playlist_id": playlist_id, "music_id": {"$in": operation.music_ids}})))
+    return requests
+
+async def _plan_reorder(playlist_id: UUID, operations: List[PlaylistOperation]) -> list:
+    """Inserts at an index and moves: replay the batch on the playlist's order in memory"""
+    existing = await _entries_of(playlist_id).sort(POSITION_SORT).project(_EntryOrder).to_list()
+    order: list = list(existing)
+    moved = set()
+    for operation in operations:
+        if operation.op == "add":
+            new_entries = [PlaylistEntry(playlist_id=playlist_id, music_id=music_id, position=0.0) for music_id in operation.music_ids]
+            index = len(order) if operation.index is None else min(operation.index, len(order))
+            order[index:index] = new_entries
+        elif operation.op == "remove":
+            removed = set(operation.music_ids)
+            order = [entry for entry in order if entry.music_id not in removed]
+        else:
+            current = next((i for i, entry in enumerate(order) if entry.entry_id == operation.entry_id), None)
+            if current is None:
+                raise PlaylistBatchError(f"Unknown playlist entry: {operation.entry_id}")
+            entry = order.pop(current)
+            order.insert(min(operation.index, len(order)), entry)
+            moved.add(entry.entry_id)
+
+    kept = {entry.entry_id: entry for entry in existing}
+    fixed = {entry.entry_id for entry in order if entry.entry_id in kept and entry.entry_id not in moved}
+    positions = _spread_positions(order, fixed)
+    if positions is None:
+        # No room between some neighbours: renumber the whole playlist in the same write
+        positions = [(k + 1) * POSITION_GAP for k in range(len(order))]
+
+    remaining = {entry.entry_id for entry in order}
+    requests = []
+    deleted = [entry.id for entry in existing if entry.entry_id not in remaining]
+    if deleted:
+        requests.append(DeleteMany({"_id": {"$in": deleted}}))
+    for entry, position in zip(order, positions):
+        if entry.entry_id not in kept:
+            requests.append(_entry_insert(playlist_id, entry.music_id, position))
+        elif position != kept[entry.entry_id].position:
+            requests.append(UpdateOne({"_id": entry.id}, {"$set": {"position": position}}))
+    return requests
+
+async def apply_playlist_operations(playlist_id: UUID, operations: List[PlaylistOperation], owner_id: UUID) -> Optional[Playlist]:
+    """
+    Apply add/remove/move operations in order; the whole batch is validated before
+    anything is written. Returns the playlist
+    afterwards, None if it does not exist or is not owned by owner_id, and raises
+    PlaylistBatchError for unknown tracks or entries.
+    """
+    playlist = await _editable_playlist(playlist_id, owner_id)
+    if not playlist:
+        return None
+    if sum(len(operation.music_ids) for operation in operations) > PLAYLIST_BATCH_LIMIT:
+        raise PlaylistBatchError(f"A batch can touch at most {PLAYLIST_BATCH_LIMIT} tracks")
+
+    added = list({music_id for operation in operations if operation.op == "add" for music_id in operation.music_ids})
+    if added:
+        found = {music.music_id for music in await Music.find(In(Music.music_id, added)).project(_MusicId).to_list()}
+        missing = [str(music_id) for music_id in added if music_id not in found]
+        if missing:
+            raise PlaylistBatchError(f"Unknown music: {', '.join(missing)}")
+
+    if any(operation.op == "move" or (operation.op == "add" and operation.index is not None) for operation in operations):
+        requests = await _plan_reorder(playlist_id, operations)
+    else:
+        requests = await _plan_appends(playlist_id, operations)
+
+    track_delta = 0
+    if requests:
+        result = await PlaylistEntry.get_motor_collection().bulk_write(requests, ordered=True)
+        track_delta = result.inserted_count - result.deleted_count
+    return await _touch_playlist(playlist_id, track_delta)
+
+async def get_playlist_entries(
+    playlist_id: UUID,
+    user_id: Optional[UUID] = None,
+    limit: int = 100,
+    cursor: Optional[PositionCursor] = None
+) -> Optional[List[PlaylistEntryListing]]:
+    """A page of the playlist in order, each entry with its track; None if the playlist is not accessible"""
+    playlist = await get_playlist(playlist_id, user_id)
+    if not playlist:
+        return None
+    query = _entries_of(playlist_id)
+    if cursor is not None:
+        query = query.find(position_filter(cursor))
+    query = query.sort(POSITION_SORT).limit(limit)
+    return await aggregate_listings(query, PlaylistEntryListing, PLAYLIST_ENTRY_LOOKUPS)
 
 # Artist CRUD
 async def get_artist(artist_id: UUID) -> Optional[Artist]:
@@ -248,85 +797,168 @@ async def get_artist(artist_id: UUID) -> Optional[Artist]:
 async def get_artist_by_name(name: str) -> Optional[Artist]:
     return await Artist.find_one(Artist.name == name)
 
-async def get_artists(skip: int = 0, limit: int = 100) -> List[Artist]:
-    return await Artist.find_all().skip(skip).limit(limit).to_list()
+async def get_artists(skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None) -> List[Artist]:
+    return await paginate(Artist.find_all(), skip, limit, cursor).to_list()
 
 async def create_artist(artist: ArtistCreate) -> Artist:
     db_artist = Artist(**artist.model_dump())
     await db_artist.insert()
+    bump_generation(ARTISTS)
+    await record_change(ARTISTS, db_artist.artist_id, ChangeOp.CREATED)
     return db_artist
 
+async def get_or_create_artist_id(name: str) -> UUID:
+    """Id of the artist with this exact name, created atomically if it does not exist yet"""
+    artist_id = _artist_id_cache.get(name)
+    if artist_id:
+        # Another process may have renamed or deleted the artist since it was cached
+        if await Artist.find_one(Artist.artist_id == artist_id, Artist.name == name):
+            return artist_id
+        _artist_id_cache.pop(name, None)
+    new_artist = Artist(name=name)
+    db_artist = await _upsert_by_key(Artist, {"name": name}, new_artist)
+    if db_artist.artist_id == new_artist.artist_id:
+        bump_generation(ARTISTS)
+        await record_change(ARTISTS, db_artist.artist_id, ChangeOp.CREATED)
+    _cache_id(_artist_id_cache, name, db_artist.artist_id)
+    return db_artist.artist_id
+
 async def update_artist(artist_id: UUID, artist: ArtistUpdate) -> Optional[Artist]:
-    db_artist = await get_artist(artist_id)
-    if db_artist:
-        update_data = artist.model_dump(exclude_unset=True)
-        await db_artist.update({"$set": update_data})
-        return await get_artist(artist_id)
-    return None
+    update_data = artist.model_dump(exclude_unset=True)
+    previous, db_artist = await _set_one(Artist, {"artist_id": artist_id}, update_data, return_previous=True)
+    if previous is None:
+        return None
+    bump_generation(ARTISTS)
+    await record_change(ARTISTS, artist_id)
+    _artist_id_cache.pop(previous.name, None)
+    if db_artist.name != previous.name:
+        await _rename_artist_copies(artist_id, previous.name, db_artist.name)
+    return db_artist
 
 async def delete_artist(artist_id: UUID) -> Optional[Artist]:
-    db_artist = await get_artist(artist_id)
+    db_artist = await _delete_one(Artist, {"artist_id": artist_id})
     if db_artist:
-        await db_artist.delete()
-        return db_artist
-    return None
-
-async def get_music_by_artist_id(artist_id: UUID, skip: int = 0, limit: int = 100) -> List[Music]:
-    return await Music.find(Music.artist_ids == artist_id).skip(skip).limit(limit).to_list()
-
-async def get_albums_by_artist_id(artist_id: UUID, skip: int = 0, limit: int = 100) -> List[Album]:
-    return await Album.find(Album.artist_id == artist_id).skip(skip).limit(limit).to_list()
+        bump_generation(ARTISTS)
+        _artist_id_cache.pop(db_artist.name, None)
+        await Music.find(Music.artist_ids == artist_id).update({"$pull": {"artist_names": db_artist.name}})
+        await Album.find(Album.artist_id == artist_id).update({"$set": {"artist_name": None}})
+        bump_generation(MUSIC, ALBUMS)
+        await record_change(ARTISTS, artist_id, ChangeOp.DELETED)
+        await _record_artist_copies(artist_id)
+    return db_artist
 
-# Helper function to enrich album response with additional data
-async def enrich_album_response(album: Album):
-    from vessapi.schemas import AlbumResponse
-    
-    # Get artist name
-    artist = await get_artist(album.artist_id)
-    artist_name = artist.name if artist else "Unknown Artist"
-    
-    # Count tracks in album
-    num_tracks = len(album.music_ids)
-    
+async def _rename_artist_copies(artist_id: UUID, old_name: str, new_name: str):
+    """Fan a rename out to the tracks and albums that store the artist's name"""
+    # Artist names are unique, so the old name identifies this artist's entry in artist_names
+    await Music.find(Music.artist_ids == artist_id).update(
+        {"$set": {"artist_names.$[name]": new_name}},
+        array_filters=[{"name": old_name}],
+    )
+    await Album.find(Album.artist_id == artist_id).update({"$set": {"artist_name": new_name}})
+    bump_generation(MUSIC, ALBUMS)
+    await _record_artist_copies(artist_id)
+
+async def _record_artist_copies(artist_id: UUID):
+    await record_music_matching(Music.artist_ids == artist_id)
+    await record_albums_matching(Album.artist_id == artist_id)
+
+async def get_music_by_artist_id(artist_id: UUID, skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None) -> List[Music]:
+    return await paginate(Music.find(Music.artist_ids == artist_id), skip, limit, cursor).to_list()
+
+async def get_albums_by_artist_id(artist_id: UUID, skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None) -> List[Album]:
+    return await paginate(Album.find(Album.artist_id == artist_id), skip, limit, cursor).to_list()
+
+# Search
+SEARCH_TYPES = {"song": Music, "album": Album, "artist": Artist}
+
+async def _text_search(model: type, q: str, limit: int) -> List[Tuple[float, Document]]:
+    pipeline = [
+        {"$addFields": {"_score": {"$meta": "textScore"}}},
+        {"$sort": {"_score": -1}},
+        {"$limit": limit},
+    ]
+    docs = await model.find(Text(q)).aggregate(pipeline).to_list()
+    return [(doc.pop("_score"), model.model_validate(doc)) for doc in docs]
+
+async def search_catalog(
+    q: str,
+    skip: int = 0,
+    limit: int = 20,
+    types: Optional[List[str]] = None
+) -> Tuple[int, List[Tuple[str, float, Document]]]:
+    """
+    Ranked full-text search over songs, albums and artists using their text indexes.
+    Each collection returns its best skip+limit hits; they are merged by score and paginated.
+    """
+    models = {name: model for name, model in SEARCH_TYPES.items() if not types or name in types}
+    total = 0
+    hits = []
+    for name, model in models.items():
+        total += await model.find(Text(q)).count()
+        hits.extend((name, score, doc) for score, doc in await _text_search(model, q, skip + limit))
+    hits.sort(key=lambda hit: hit[1], reverse=True)
+    return total, hits[skip:skip + limit]
+
+# Responses are built from the stored fields; names are denormalized at write time
+def album_response(album: Album) -> AlbumResponse:
     return AlbumResponse(
-        album_id=album.album_id,
-        title=album.title,
-        artist_id=album.artist_id,
-        artist_name=artist_name,
-        release_date=album.release_date,
-        cover_image_url=album.cover_image_url,
-        genre=album.genre,
-        description=album.description,
-        music_ids=album.music_ids,
-        num_tracks=num_tracks,
-        created_at=album.created_at,
-        updated_at=album.updated_at
+        **album.model_dump(exclude={"id", "artist_name", "owner_id"}),
+        artist_name=album.artist_name or "Unknown Artist",
+        num_tracks=len(album.music_ids),
     )
 
-# Helper function to enrich music response with additional data
-async def enrich_music_response(music: Music):
-    from vessapi.schemas import MusicResponse
-    
-    # Get artist names
-    artist_names = []
-    for artist_id in music.artist_ids:
-        artist = await get_artist(artist_id)
-        if artist:
-            artist_names.append(artist.name)
-    
-    return MusicResponse(
-        music_id=music.music_id,
-        title=music.title,
-        artist_ids=music.artist_ids,
-        artist_names=artist_names,
-        duration=music.duration,
-        file_path=music.file_path,
-        genre=music.genre,
-        track_number=music.track_number,
-        publish_date=music.publish_date,
-        lyrics=music.lyrics,
-        album_id=music.album_id,
-        cover_image_url=music.cover_image_url,
-        created_at=music.created_at,
-        updated_at=music.updated_at
-    )
\ No newline at end of file
+def music_response(music: Music) -> MusicResponse:
+    return MusicResponse.model_validate(music, from_attributes=True)
+
+# Delta sync
+# A page of the change log becomes each changed entity once, in its current state:
+# created/updated entities are read with one $in per collection, deletes are tombstones.
+_SYNC_ENTITIES = {
+    MUSIC: (Music, "music_id", music_response),
+    ALBUMS: (Album, "album_id", album_response),
+    ARTISTS: (Artist, "artist_id", lambda artist: ArtistResponse.model_validate(artist, from_attributes=True)),
+    PLAYLISTS: (Playlist, "playlist_id", lambda playlist: PlaylistResponse.model_validate(playlist, from_attributes=True)),
+}
+
+async def get_sync_changes(since: Optional[int], user_id: UUID, limit: int = 500) -> SyncResponse:
+    """
+    What changed after sequence number since, as seen by user_id. Without since only a
+    token for the current state is returned; a new client takes it before listing everything.
+    """
+    issued_at = datetime.utcnow()
+    if since is None:
+        return SyncResponse(next_token=encode_sync_token(await current_seq(), issued_at))
+
+    changes, last_seq, has_more = await read_changes(since, user_id, limit)
+    # (first op, last op) per entity within the page
+    ops: Dict[Tuple[str, UUID], Tuple[ChangeOp, ChangeOp]] = {}
+    for change in changes:
+        key = (change.collection, change.entity_id)
+        ops[key] = (ops[key][0] if key in ops else change.op, change.op)
+
+    response = SyncResponse(next_token=encode_sync_token(last_seq, issued_at), has_more=has_more)
+    written: Dict[str, Dict[UUID, ChangeOp]] = {collection: {} for collection in _SYNC_ENTITIES}
+    for (collection, entity_id), (first, last) in ops.items():
+        if last != ChangeOp.DELETED:
+            written[collection][entity_id] = ChangeOp.CREATED if first == ChangeOp.CREATED else ChangeOp.UPDATED
+        elif first != ChangeOp.CREATED:
+            # Deleted after the client saw it: send a tombstone. Entities created and
+            # deleted since the last sync were never seen by the client and are skipped
+            getattr(response, collection).deleted.append(entity_id)
+
+    for collection, entities in written.items():
+        if not entities:
+            continue
+        model, id_field, to_response = _SYNC_ENTITIES[collection]
+        documents = await model.find(In(getattr(model, id_field), list(entities))).to_list()
+        by_id = {getattr(document, id_field): document for document in documents}
+        changes_of = getattr(response, collection)
+        for entity_id, op in entities.items():
+            document = by_id.get(entity_id)
+            visible = document is not None and (collection != PLAYLISTS or document.is_public or document.owner_id == user_id)
+            if visible:
+                (changes_of.created if op == ChangeOp.CREATED else changes_of.updated).append(to_response(document))
+            elif op == ChangeOp.UPDATED:
+                # Deleted after this page (its tombstone follows), or a playlist made private
+                changes_of.deleted.append(entity_id)
+    return response
@@ -1,17 +1,98 @@
+from collections.abc import Mapping
+from typing import Any, Dict, List, Tuple
+
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
+from pymongo.errors import OperationFailure
+
 from vessapi.config import settings
+from vessapi.metrics import MongoCommandMetrics
+from vessapi.query_budget import QueryBudgetListener, capture_call_sites
+
+# Index options that change how an index behaves; anything else reported by
+# index_information() (v, ns, background...) is ignored when looking for drift.
+INDEX_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "weights", "default_language")
+
 
 async def init_db():
     """Veritabanını başlat"""
-    client = AsyncIOMotorClient(settings.database.url)
+    from vessapi.models import __beanie_models__
+
+    listeners = [MongoCommandMetrics()] if settings.server.metrics_enabled else []
+    if settings.server.debug:
+        # Per-request query counts and N+1 warnings (see vessapi.query_budget)
+        listeners.append(QueryBudgetListener())
+        capture_call_sites()
+    client = AsyncIOMotorClient(settings.database.url, event_listeners=listeners)
     await init_beanie(
         database=client.get_database(settings.database.name),
-        document_models=[
-            "vessapi.models.Music",
-            "vessapi.models.Album",
-            "vessapi.models.User",
-            "vessapi.models.Playlist",
-            "vessapi.models.Artist",
-        ]
-    )
\ No newline at end of file
+        document_models=__beanie_models__,
+        # Indexes are reconciled by sync_indexes so drift is reported instead of failing startup
+        skip_indexes=True,
+    )
+    report = await sync_indexes(drop_stale=settings.database.drop_stale_indexes)
+    for collection, entries in report.items():
+        for entry in entries:
+            print(f"Index {collection}.{entry}")
+
+
+def _option_value(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return tuple(sorted((key, _option_value(item)) for key, item in value.items()))
+    return value
+
+
+def _index_signature(spec: dict) -> Tuple:
+    """Comparable (key, options) form of an index spec or an index_information() entry"""
+    key = tuple((field, direction) for field, direction in spec["key"].items()) if isinstance(spec["key"], dict) else tuple(tuple(item) for item in spec["key"])
+    if any(direction == "text" for _, direction in key) or any(field == "_fts" for field, _ in key):
+        # Text indexes are stored as _fts/_ftsx; their fields live in the weights option
+        key = ("$text",)
+    options = tuple((option, _option_value(spec[option])) for option in INDEX_OPTIONS if option in spec)
+    return key, options
+
+
+async def sync_indexes(drop_stale: bool = False) -> Dict[str, List[str]]:
+    """
+    Declared indexes (Settings.indexes of every document model) are created when missing.
+    Indexes that exist but differ from their declaration, or that are not declared at all,
+    are reported as drift; with drop_stale they are dropped (and re-created if declared).
+    A changed text index is always rebuilt: a collection holds only one, so the declared
+    fields could never be searched otherwise.
+    Returns a report of "<index name>: <action>" lines per collection.
+    """
+    from vessapi.models import __beanie_models__
+
+    report: Dict[str, List[str]] = {}
+    for model in __beanie_models__:
+        collection = model.get_motor_collection()
+        entries = report.setdefault(collection.name, [])
+        existing = await collection.index_information()
+        declared = {field.name: field.index for field in model.get_settings().indexes}
+
+        for name, info in list(existing.items()):
+            if name == "_id_":
+                continue
+            if name not in declared:
+                if drop_stale:
+                    await collection.drop_index(name)
+                    entries.append(f"{name}: dropped (not declared)")
+                else:
+                    entries.append(f"{name}: drift (not declared)")
+            elif _index_signature(info) != _index_signature(declared[name].document):
+                if drop_stale or _index_signature(info)[0] == ("$text",):
+                    await collection.drop_index(name)
+                    del existing[name]
+                    entries.append(f"{name}: dropped (definition changed)")
+                else:
+                    entries.append(f"{name}: drift (definition changed)")
+
+        for name, index in declared.items():
+            if name in existing:
+                continue
+            try:
+                await collection.create_indexes([index])
+                entries.append(f"{name}: created")
+            except OperationFailure as e:
+                entries.append(f"{name}: failed ({e})")
+    return report
@@ -0,0 +1,165 @@
+"""
+Live change events.
+
+GET /v1/events is a server-sent events stream of the change log (see vessapi.changes):
+one event per created, updated or deleted track, album, artist or playlist, named
+"<collection>.<op>" (e.g. "playlists.updated") with {"seq", "collection", "id", "op"}
+as data and the sequence number as event id. Clients fetch what they need, or use
+/v1/sync/changes, when an event arrives.
+
+Each process runs one EventBus that reads new change log entries and fans them out to
+its subscribers, filtered by playlist visibility like the sync feed. The bus reads
+when this process records a change, when a MongoDB change stream on the changes
+collection reports an insert (any worker's; replica sets only), and otherwise every
+POLL_INTERVAL, so every worker pushes every change once.
+
+A client reconnecting with Last-Event-ID first gets what it missed from the log; if
+that is more than REPLAY_LIMIT changes it gets a "reset" event and should sync with
+/v1/sync/changes instead. A subscriber that falls QUEUE_SIZE events behind is
+disconnected and catches up the same way when it reconnects.
+"""
+
+import asyncio
+import json
+from typing import AsyncIterator, Optional, Set
+from uuid import UUID
+
+from pymongo.errors import PyMongoError
+
+from vessapi import changes
+from vessapi.models import Change
+
+POLL_INTERVAL = 1.0 # Without change streams
+STREAM_REREAD_INTERVAL = 10.0 # With change streams; picks up changes after a gap
+KEEPALIVE_INTERVAL = 15.0
+QUEUE_SIZE = 1000
+READ_LIMIT = 1000
+REPLAY_LIMIT = 1000
+
+
+def format_event(change: Change) -> str:
+    data = {"seq": change.seq, "collection": change.collection, "id": str(change.entity_id), "op": change.op.value}
+    return f"id: {change.seq}\nevent: {change.collection}.{change.op.value}\ndata: {json.dumps(data)}\n\n"
+
+
+class Subscriber:
+    def __init__(self, user_id: Optional[UUID]):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+
+    def push(self, change: Change) -> bool:
+        """Queue the change; False when the subscriber is too far behind (it is closed instead)"""
+        try:
+            self.queue.put_nowait(change)
+            return True
+        except asyncio.QueueFull:
+            self.close()
+            return False
+
+    def close(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class EventBus:
+    def __init__(self):
+        self.subscribers: Set[Subscriber] = set()
+        self.last_seq = 0
+        self.change_streams = False
+        self._wake = asyncio.Event()
+        self._tasks = []
+
+    async def start(self):
+        self.last_seq = await changes.current_seq()
+        changes.on_recorded.append(self.nudge)
+        self._tasks = [asyncio.create_task(self._run()), asyncio.create_task(self._watch())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.nudge in changes.on_recorded:
+            changes.on_recorded.remove(self.nudge)
+        for subscriber in list(self.subscribers):
+            subscriber.close()
+        self.subscribers.clear()
+
+    def nudge(self):
+        self._wake.set()
+
+    def subscribe(self, user_id: Optional[UUID]) -> Subscriber:
+        subscriber = Subscriber(user_id)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def _watch(self):
+        """Wake the bus on inserts into the change log by any worker"""
+        try:
+            async with Change.get_motor_collection().watch([{"$match": {"operationType": "insert"}}]) as stream:
+                self.change_streams = True
+                async for _ in stream:
+                    self._wake.set()
+        except PyMongoError as e:
+            # Standalone servers have no change streams
+            print(f"Change streams unavailable, polling the change log every {POLL_INTERVAL}s: {e}")
+        finally:
+            self.change_streams = False
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), STREAM_REREAD_INTERVAL if self.change_streams else POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self._dispatch()
+            except PyMongoError as e:
+                print(f"Reading the change log for events failed: {e}")
+
+    async def _dispatch(self):
+        has_more = True
+        while has_more:
+            new_changes, self.last_seq, has_more = await changes.read_all_changes(self.last_seq, READ_LIMIT)
+            for change in new_changes:
+                for subscriber in list(self.subscribers):
+                    if changes.visible_to(change, subscriber.user_id) and not subscriber.push(change):
+                        self.unsubscribe(subscriber)
+
+
+event_bus = EventBus()
+
+
+async def event_stream(user_id: Optional[UUID], last_event_id: Optional[int] = None) -> AsyncIterator[str]:
+    """SSE lines for one client: missed changes after last_event_id, then live ones"""
+    # Subscribe before replaying so nothing written meanwhile is lost
+    subscriber = event_bus.subscribe(user_id)
+    try:
+        sent = last_event_id
+        if last_event_id is not None:
+            missed, last_seq, has_more = await changes.read_changes(last_event_id, user_id, REPLAY_LIMIT)
+            if has_more:
+                yield "event: reset\ndata: {}\n\n"
+                return
+            for change in missed:
+                yield format_event(change)
+            sent = last_seq
+        yield ": connected\n\n"
+        while True:
+            try:
+                change = await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if change is None:
+                return
+            if sent is not None and change.seq <= sent:
+                continue # Already replayed
+            yield format_event(change)
+    finally:
+        event_bus.unsubscribe(subscriber)
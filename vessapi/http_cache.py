@@ -0,0 +1,135 @@
+"""
+HTTP response cache for the public catalog reads.
+
+GET responses of /v1/songs, /v1/albums and /v1/artists (lists, single documents and
+the artist sub-lists) are kept in memory, keyed by path and normalized query string,
+and carry a strong ETag; a request whose If-None-Match matches gets a 304 without
+touching MongoDB.
+
+Invalidation is write-through: every catalog collection has a generation counter
+that crud bumps on create, update and delete, and each cached route records which
+collections its response is built from. A write therefore makes exactly the entries
+that could have changed unreachable. Counters are process-local, so entries also
+expire after a TTL to bound how long another instance's writes go unnoticed.
+"""
+
+import hashlib
+import re
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from vessapi.cache import TTLCache
+
+MUSIC = "music"
+ALBUMS = "albums"
+ARTISTS = "artists"
+
+_generations: Dict[str, int] = {MUSIC: 0, ALBUMS: 0, ARTISTS: 0}
+
+# Cached routes and the collections their responses are read from. Artist names and
+# album titles are stored on the documents that show them, and renames bump the
+# collections they fan out to, so each route depends on one collection only.
+CACHED_ROUTES: List[Tuple[re.Pattern, FrozenSet[str]]] = [
+    (re.compile(r"^/v1/songs/?$|^/v1/songs/[^/]+/?$"), frozenset({MUSIC})),
+    (re.compile(r"^/v1/albums/?$|^/v1/albums/[^/]+/?$"), frozenset({ALBUMS})),
+    (re.compile(r"^/v1/artists/?$|^/v1/artists/[^/]+/?$"), frozenset({ARTISTS})),
+    (re.compile(r"^/v1/artists/[^/]+/music/?$"), frozenset({MUSIC})),
+    (re.compile(r"^/v1/artists/[^/]+/albums/?$"), frozenset({ALBUMS})),
+]
+
+# Response headers that are replayed on a cache hit
+STORED_HEADERS = {b"content-type", b"x-next-cursor"}
+
+
+def bump_generation(*collections: str):
+    """Called by crud after a write so cached responses built from these collections are not served again"""
+    for collection in collections:
+        _generations[collection] += 1
+
+
+def route_dependencies(path: str) -> Optional[FrozenSet[str]]:
+    for pattern, dependencies in CACHED_ROUTES:
+        if pattern.match(path):
+            return dependencies
+    return None
+
+
+def cache_key(path: str, query_string: bytes, dependencies: FrozenSet[str]) -> tuple:
+    query = urlencode(sorted(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)))
+    return (path.rstrip("/"), query, tuple(sorted((name, _generations[name]) for name in dependencies)))
+
+
+def make_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware serving cached catalog GETs and filling the cache on misses"""
+
+    def __init__(self, app, maxsize: int, ttl: float):
+        self.app = app
+        self.cache = TTLCache(maxsize, ttl)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+        dependencies = route_dependencies(scope["path"])
+        if dependencies is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = cache_key(scope["path"], scope["query_string"], dependencies)
+        if_none_match = next((value.decode("latin-1") for name, value in scope["headers"] if name == b"if-none-match"), None)
+        entry = self.cache.get(key)
+        if entry is not None:
+            await self._send_cached(send, entry, if_none_match, include_body=scope["method"] == "GET")
+            return
+        if scope["method"] == "HEAD":
+            # HEAD responses have no body to cache
+            await self.app(scope, receive, send)
+            return
+
+        started = {}
+        body = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                started.update(message)
+            elif message["type"] == "http.response.body":
+                body.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    await self._finish(key, started, b"".join(body), if_none_match, send)
+
+        await self.app(scope, receive, capture)
+
+    async def _finish(self, key, start: dict, body: bytes, if_none_match: Optional[str], send):
+        if start["status"] != 200:
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+            return
+        etag = make_etag(body)
+        headers = [(name, value) for name, value in start.get("headers", []) if name in STORED_HEADERS]
+        entry = (etag, headers, body)
+        self.cache.set(key, entry)
+        await self._send_cached(send, entry, if_none_match, include_body=True)
+
+    async def _send_cached(self, send, entry: tuple, if_none_match: Optional[str], include_body: bool):
+        etag, headers, body = entry
+        headers = headers + [(b"etag", etag.encode("latin-1"))]
+        if etag_matches(if_none_match, etag):
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body if include_body else b""})
+
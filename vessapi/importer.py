@@ -0,0 +1,285 @@
+"""
+Bulk library import.
+
+Walks a directory tree of existing audio and registers every file in the catalog
+without going through the web upload path:
+
+    python -m vessapi.importer /path/to/library [--copy] [--batch-size 500] [--processes 8]
+
+Files are hashed and their tags parsed across a process pool (the same
+services.read_audio_metadata used by the ingestion worker). Artists and albums are
+resolved through in-memory get-or-create maps preloaded from the database, and
+artists, albums and music are written with one insert_many per batch. Files whose
+path or content hash is already in the catalog are skipped, so an interrupted
+import can simply be run again.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from uuid import UUID
+
+from pydantic import BaseModel
+from pymongo.errors import BulkWriteError
+
+from vessapi import services
+from vessapi.changes import record_changes
+from vessapi.config import settings
+from vessapi.database import init_db
+from vessapi.http_cache import ALBUMS, ARTISTS, MUSIC
+from vessapi.models import Album, Artist, ChangeOp, Music
+from vessapi.uploads import CHUNK_SIZE, content_addressed_path, file_extension
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class _ArtistKey(BaseModel):
+    artist_id: UUID
+    name: str
+
+
+class _AlbumKey(BaseModel):
+    album_id: UUID
+    title: str
+    artist_id: UUID
+    cover_image_url: str
+
+
+class _MusicKey(BaseModel):
+    file_path: str
+    content_hash: Optional[str] = None
+
+
+def iter_audio_files(root: str, formats: List[str]) -> Iterator[str]:
+    for directory, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if file_extension(filename) in formats:
+                yield os.path.abspath(os.path.join(directory, filename))
+
+
+def scan_audio_file(path: str, store_directory: Optional[str]) -> dict:
+    """
+    Hash and parse one file; runs in the parser pool. With store_directory the file
+    is also copied into the content-addressed store used by uploads.
+    """
+    try:
+        digest = hashlib.sha256()
+        with open(path, "rb") as source:
+            while chunk := source.read(CHUNK_SIZE):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        metadata = services.read_audio_metadata(path)
+        stored_path = path
+        if store_directory:
+            stored_path = content_addressed_path(store_directory, sha256, file_extension(path))
+            if not os.path.exists(stored_path):
+                os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+                shutil.copy2(path, stored_path)
+        return {"path": path, "stored_path": stored_path, "sha256": sha256, "metadata": metadata}
+    except Exception as e:
+        return {"path": path, "error": str(e)}
+
+
+async def _insert_many_ignoring_duplicates(model, documents: list) -> list:
+    """
+    Unordered insert_many; documents rejected by a unique index count as already
+    present. Returns the documents that were inserted.
+    """
+    if not documents:
+        return []
+    try:
+        await model.insert_many(documents, ordered=False)
+        return documents
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        rejected = {error["index"] for error in errors}
+        return [document for index, document in enumerate(documents) if index not in rejected]
+
+
+async def _remove_covers(albums):
+    """Delete the cover files saved for albums that were not stored"""
+    for album in albums:
+        if album.cover_image_url:
+            await services.remove_album_cover(album.cover_image_url)
+
+
+class LibraryImporter:
+    def __init__(self, owner_id: UUID, store_directory: Optional[str] = None):
+        self.owner_id = owner_id
+        self.store_directory = store_directory
+        self.artists: Dict[str, UUID] = {}
+        self.albums: Dict[Tuple[str, UUID], Tuple[UUID, str]] = {}
+        self.known_paths: Set[str] = set()
+        self.known_hashes: Set[str] = set()
+        self.imported = 0
+        self.skipped = 0
+        self.failed = 0
+
+    async def load_existing(self):
+        """Preload the get-or-create maps and what has already been imported"""
+        async for artist in Artist.find_all().project(_ArtistKey):
+            self.artists[artist.name] = artist.artist_id
+        async for album in Album.find_all().project(_AlbumKey):
+            self.albums[(album.title, album.artist_id)] = (album.album_id, album.cover_image_url)
+        async for music in Music.find_all().project(_MusicKey):
+            self.known_paths.add(music.file_path)
+            if music.content_hash:
+                self.known_hashes.add(music.content_hash)
+
+    async def _resolve_artists(self, names: Set[str]):
+        new_names = [name for name in names if name not in self.artists]
+        if not new_names:
+            return
+        inserted = await _insert_many_ignoring_duplicates(Artist, [Artist(name=name) for name in new_names])
+        await record_changes(ARTISTS, [artist.artist_id for artist in inserted], ChangeOp.CREATED)
+        # Re-read rather than trusting our ids: another writer may have created some first
+        async for artist in Artist.find({"name": {"$in": new_names}}).project(_ArtistKey):
+            self.artists[artist.name] = artist.artist_id
+
+    async def _resolve_albums(self, scans: List[dict]):
+        new_albums: Dict[Tuple[str, UUID], Album] = {}
+        for scan in scans:
+            metadata = scan["metadata"]
+            if not (metadata["album_title"] and metadata["album_artist_name"]):
+                continue
+            key = (metadata["album_title"], self.artists[metadata["album_artist_name"]])
+            if key in self.albums or key in new_albums:
+                continue
+            cover_image_url = await services.save_album_cover(metadata["album_image_data"], metadata["album_title"])
+            new_albums[key] = Album(
+                title=key[0],
+                artist_id=key[1],
+                artist_name=metadata["album_artist_name"],
+                release_date=metadata["publish_date"].date(),
+                cover_image_url=cover_image_url or "",
+                genre=metadata["genre"],
+                owner_id=self.owner_id,
+            )
+        inserted = await _insert_many_ignoring_duplicates(Album, list(new_albums.values()))
+        inserted_ids = {album.album_id for album in inserted}
+        # Albums another writer created first keep their own cover
+        await _remove_covers(album for album in new_albums.values() if album.album_id not in inserted_ids)
+        await record_changes(ALBUMS, [album.album_id for album in inserted], ChangeOp.CREATED)
+        for key, album in new_albums.items():
+            self.albums[key] = (album.album_id, album.cover_image_url)
+        if len(inserted) < len(new_albums):
+            # Some albums were created concurrently; point at the stored ones
+            keys = [{"title": title, "artist_id": artist_id} for title, artist_id in new_albums]
+            async for album in Album.find({"$or": keys}).project(_AlbumKey):
+                self.albums[(album.title, album.artist_id)] = (album.album_id, album.cover_image_url)
+
+    def _build_music(self, scan: dict) -> Music:
+        metadata = scan["metadata"]
+        album_id, album_title, album_cover_image_url = None, None, None
+        if metadata["album_title"] and metadata["album_artist_name"]:
+            album_title = metadata["album_title"]
+            album_id, album_cover_image_url = self.albums[(album_title, self.artists[metadata["album_artist_name"]])]
+        return Music(
+            title=metadata["title"],
+            artist_ids=[self.artists[name] for name in metadata["artist_names"]],
+            artist_names=metadata["artist_names"],
+            duration=metadata["duration"],
+            file_path=scan["stored_path"],
+            codec=metadata["codec"],
+            content_hash=scan["sha256"],
+            genre=metadata["genre"],
+            publish_date=metadata["publish_date"],
+            lyrics=metadata["lyrics"],
+            album_id=album_id,
+            album_title=album_title,
+            cover_image_url=album_cover_image_url or None,
+            owner_id=self.owner_id,
+        )
+
+    async def write_batch(self, scans: List[dict]):
+        fresh = []
+        for scan in scans:
+            if "error" in scan:
+                self.failed += 1
+                print(f"Skipping '{scan['path']}': {scan['error']}")
+            elif scan["sha256"] in self.known_hashes:
+                self.skipped += 1
+            else:
+                # Also catches the same file appearing twice in one batch
+                self.known_hashes.add(scan["sha256"])
+                fresh.append(scan)
+        if not fresh:
+            return
+
+        names = set()
+        for scan in fresh:
+            names.update(scan["metadata"]["artist_names"])
+            if scan["metadata"]["album_artist_name"]:
+                names.add(scan["metadata"]["album_artist_name"])
+        await self._resolve_artists(names)
+        await self._resolve_albums(fresh)
+
+        music = [self._build_music(scan) for scan in fresh]
+        inserted = await _insert_many_ignoring_duplicates(Music, music)
+        await record_changes(MUSIC, [track.music_id for track in inserted], ChangeOp.CREATED)
+        self.imported += len(inserted)
+        self.skipped += len(music) - len(inserted)
+        self.known_paths.update(scan["stored_path"] for scan in fresh)
+
+    async def run(self, root: str, batch_size: int, processes: int):
+        await self.load_existing()
+        pending = []
+        for path in iter_audio_files(root, settings.files.supported_music_formats):
+            if path in self.known_paths:
+                self.skipped += 1
+            else:
+                pending.append(path)
+
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        # spawn: the parent already runs an event loop and driver threads
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            def submit(batch):
+                return asyncio.gather(*(loop.run_in_executor(pool, scan_audio_file, path, self.store_directory) for path in batch))
+
+            batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+            scanning = submit(batches[0]) if batches else None
+            for index in range(len(batches)):
+                scans = await scanning
+                # Parse the next batch while this one is written
+                scanning = submit(batches[index + 1]) if index + 1 < len(batches) else None
+                await self.write_batch(scans)
+                done = sum(len(batch) for batch in batches[:index + 1])
+                elapsed = time.monotonic() - started
+                print(f"{done}/{len(pending)} files, {self.imported} imported, {self.skipped} skipped, "
+                      f"{self.failed} failed, {done / elapsed:.1f} files/s")
+
+        elapsed = time.monotonic() - started
+        print(f"Import finished in {elapsed:.1f}s: {self.imported} imported, {self.skipped} skipped, {self.failed} failed "
+              f"({len(pending) / elapsed if elapsed else 0:.1f} files/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import an existing audio library into VessAPI")
+    parser.add_argument("root", help="Directory to import recursively")
+    parser.add_argument("--copy", action="store_true", help="Copy files into the content-addressed music store instead of referencing them in place")
+    parser.add_argument("--batch-size", type=int, default=500, help="Files parsed and inserted per batch")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Tag parser processes")
+    args = parser.parse_args()
+
+    async def run():
+        await init_db()
+        importer = LibraryImporter(
+            owner_id=services.SYSTEM_USER_ID,
+            store_directory=settings.files.music_upload_directory if args.copy else None,
+        )
+        await importer.run(args.root, args.batch_size, args.processes)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Durable ingestion job queue.
+
+Uploads are recorded as IngestJob documents in MongoDB instead of fire-and-forget
+tasks. Every app instance runs an IngestWorker with a fixed number of slots; a
+slot claims a job by atomically leasing it (find_one_and_update), keeps the lease
+alive while it works (stopping if another worker took the job over) and records the
+outcome. Jobs whose worker died are picked
+up again once their lease expires, failed jobs are retried with exponential
+backoff until max_attempts, so several instances can share the load safely and
+nothing is lost on restart. The stored upload of a job that finally fails is deleted
+unless a track or another queued job uses the same file.
+"""
+
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import List, Optional
+from uuid import UUID, uuid4
+
+from beanie.operators import In
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from vessapi import metrics, services
+from vessapi.config import settings
+from vessapi.models import IngestJob, JobStatus, Music
+from vessapi.uploads import remove_if_exists
+
+
+async def enqueue_music_upload(
+    file_path: str,
+    cover_image_url: Optional[str],
+    owner_id: UUID,
+    original_filename: Optional[str] = None,
+    content_hash: Optional[str] = None
+) -> IngestJob:
+    job = IngestJob(
+        file_path=file_path,
+        original_filename=original_filename,
+        content_hash=content_hash,
+        cover_image_url=cover_image_url,
+        owner_id=owner_id,
+        max_attempts=settings.ingestion.max_attempts,
+    )
+    await job.insert()
+    ingest_worker.notify()
+    return job
+
+
+async def get_job(job_id: UUID) -> Optional[IngestJob]:
+    return await IngestJob.find_one(IngestJob.job_id == job_id)
+
+
+async def get_active_job_by_content_hash(content_hash: str) -> Optional[IngestJob]:
+    """A queued or running job for the same bytes, so re-uploads do not queue twice"""
+    return await IngestJob.find_one(
+        IngestJob.content_hash == content_hash,
+        In(IngestJob.status, [JobStatus.PENDING, JobStatus.RUNNING]),
+    )
+
+
+async def count_pending_jobs() -> int:
+    return await IngestJob.find(IngestJob.status == JobStatus.PENDING).count()
+
+
+async def _collect_metrics():
+    metrics.INGEST_PENDING.set(await count_pending_jobs())
+
+metrics.collectors.append(_collect_metrics)
+
+
+async def claim_job(worker_id: str, lease_seconds: int) -> Optional[IngestJob]:
+    """Lease the oldest available job: a pending one, or a running one whose lease expired"""
+    now = datetime.utcnow()
+    raw = await IngestJob.get_motor_collection().find_one_and_update(
+        {
+            "$or": [
+                {"status": JobStatus.PENDING.value, "available_at": {"$lte": now}},
+                {"status": JobStatus.RUNNING.value, "lease_expires_at": {"$lt": now}},
+            ],
+            "$expr": {"$lt": ["$attempts", "$max_attempts"]},
+        },
+        {
+            "$set": {
+                "status": JobStatus.RUNNING.value,
+                "lease_owner": worker_id,
+                "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("available_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+    return IngestJob.model_validate(raw) if raw else None
+
+
+async def fail_abandoned_jobs() -> None:
+    """Jobs whose last allowed attempt lost its lease will never be claimed again"""
+    now = datetime.utcnow()
+    abandoned = {
+        "status": JobStatus.RUNNING.value,
+        "lease_expires_at": {"$lt": now},
+        "$expr": {"$gte": ["$attempts", "$max_attempts"]},
+    }
+    # Out of attempts, so no worker can claim these between the read and the update
+    jobs = await IngestJob.find(abandoned).to_list()
+    if not jobs:
+        return
+    await IngestJob.get_motor_collection().update_many(
+        {**abandoned, "_id": {"$in": [job.id for job in jobs]}},
+        {"$set": {"status": JobStatus.FAILED.value, "error": "Worker lease expired", "finished_at": now, "updated_at": now}},
+    )
+    for job in jobs:
+        await remove_unused_upload(job)
+
+
+async def remove_unused_upload(job: IngestJob) -> None:
+    """Delete a failed job's stored file unless a track or another queued job uses it (uploads are content-addressed)"""
+    if await Music.find_one(Music.file_path == job.file_path):
+        return
+    if await IngestJob.find_one(
+        IngestJob.file_path == job.file_path,
+        In(IngestJob.status, [JobStatus.PENDING, JobStatus.RUNNING]),
+        IngestJob.job_id != job.job_id,
+    ):
+        return
+    await remove_if_exists(job.file_path)
+
+
+def _leased(job: IngestJob, worker_id: str):
+    return IngestJob.find_one(IngestJob.job_id == job.job_id, IngestJob.lease_owner == worker_id)
+
+
+class IngestWorker:
+    def __init__(self, concurrency: int, lease_seconds: int, poll_interval: float, retry_backoff: float):
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.retry_backoff = retry_backoff
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run_slot()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake idle slots right away instead of waiting for the next poll"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run_slot(self):
+        while True:
+            try:
+                job = await claim_job(self.worker_id, self.lease_seconds)
+                if job is None:
+                    await fail_abandoned_jobs()
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Ingestion worker error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _heartbeat(self, job: IngestJob):
+        """Renews the lease until cancelled; returns once the lease was lost (e.g. taken over after expiring)"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                result = await _leased(job, self.worker_id).update({"$set": {
+                    "lease_expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds),
+                }})
+            except PyMongoError as e:
+                # The lease lasts three beats, so one failed renewal does not lose it
+                print(f"Renewing the lease of ingestion job {job.job_id} failed: {e}")
+                continue
+            if result.matched_count == 0:
+                return
+
+    async def _process(self, job: IngestJob):
+        work = asyncio.create_task(services.process_music_upload_task(
+            job.file_path,
+            job.cover_image_url,
+            job.owner_id,
+            content_hash=job.content_hash,
+            original_filename=job.original_filename,
+        ))
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await asyncio.wait((work, heartbeat), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            heartbeat.cancel()
+            if not work.done():
+                work.cancel()
+        if work.cancelled() or not work.done():
+            # Another worker owns the job now; its outcome is not ours to record
+            await asyncio.gather(work, return_exceptions=True)
+            print(f"Ingestion job {job.job_id} lost its lease; stopped processing it")
+            return
+        try:
+            music = work.result()
+        except Exception as e:
+            now = datetime.utcnow()
+            if job.attempts >= job.max_attempts:
+                update = {"status": JobStatus.FAILED, "finished_at": now}
+            else:
+                delay = self.retry_backoff * 2 ** (job.attempts - 1)
+                update = {"status": JobStatus.PENDING, "available_at": now + timedelta(seconds=delay)}
+            print(f"Ingestion job {job.job_id} failed (attempt {job.attempts}/{job.max_attempts}): {e}")
+            result = await _leased(job, self.worker_id).update({"$set": {
+                **update, "error": str(e), "lease_owner": None, "lease_expires_at": None, "updated_at": now,
+            }})
+            if update["status"] == JobStatus.FAILED and result.matched_count:
+                await remove_unused_upload(job)
+        else:
+            now = datetime.utcnow()
+            await _leased(job, self.worker_id).update({"$set": {
+                "status": JobStatus.SUCCEEDED, "music_id": music.music_id, "error": None,
+                "lease_owner": None, "lease_expires_at": None, "finished_at": now, "updated_at": now,
+            }})
+
+ingest_worker = IngestWorker(
+    concurrency=settings.ingestion.concurrency,
+    lease_seconds=settings.ingestion.lease_seconds,
+    poll_interval=settings.ingestion.poll_interval,
+    retry_backoff=settings.ingestion.retry_backoff,
+)
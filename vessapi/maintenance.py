@@ -0,0 +1,129 @@
+"""
+Repair of the denormalized names and migration of legacy playlists.
+
+Tracks store their artists' names and their album's title, albums their artist's name
+(see crud). crud keeps the copies in sync on every write, but writes that bypass it,
+or a process dying between a rename and its fan-out, can leave them stale. The repair
+recomputes the copies server-side, returns only the documents that differ and writes
+them back with batched bulk updates:
+
+    python -m vessapi.maintenance
+
+Run it after upgrading (it fills in the fields for documents created before they
+existed) or when copies are known to have drifted; the app does not run it. Each
+write only applies while the document still holds the values the repair read, so a
+rename fanned out by crud in the meantime is not overwritten with the older name.
+
+The same run moves playlists that still store their tracks in the legacy music_ids
+array to PlaylistEntry documents. Reading a playlist does not migrate it; editing one
+does, so only playlists nobody edited since the upgrade are left for this step.
+"""
+
+import asyncio
+import time
+from typing import List
+
+from pymongo import UpdateOne
+
+from vessapi import crud
+from vessapi.changes import record_albums_matching, record_music_matching
+from vessapi.database import init_db
+from vessapi.http_cache import ALBUMS, MUSIC, bump_generation
+from vessapi.models import Album, Music
+
+# Names of artist_ids in the track's order; $lookup returns artists in collection order
+_ORDERED_ARTIST_NAMES = {
+    "$map": {
+        "input": {"$filter": {"input": "$artist_ids", "as": "id", "cond": {"$in": ["$$id", "$_artists.artist_id"]}}},
+        "as": "id",
+        "in": {"$arrayElemAt": [
+            {"$map": {
+                "input": {"$filter": {"input": "$_artists", "as": "artist", "cond": {"$eq": ["$$artist.artist_id", "$$id"]}}},
+                "as": "artist",
+                "in": "$$artist.name",
+            }},
+            0,
+        ]},
+    }
+}
+
+MUSIC_RESYNC_PIPELINE = [
+    {"$lookup": {"from": "artists", "localField": "artist_ids", "foreignField": "artist_id", "as": "_artists"}},
+    {"$lookup": {"from": "albums", "localField": "album_id", "foreignField": "album_id", "as": "_album"}},
+    {"$project": {
+        "artist_names": 1,
+        "album_title": 1,
+        "_artist_names": _ORDERED_ARTIST_NAMES,
+        "_album_title": {"$ifNull": [{"$arrayElemAt": ["$_album.title", 0]}, None]},
+    }},
+    {"$match": {"$expr": {"$or": [
+        {"$ne": [{"$ifNull": ["$artist_names", None]}, "$_artist_names"]},
+        {"$ne": [{"$ifNull": ["$album_title", None]}, "$_album_title"]},
+    ]}}},
+    {"$project": {
+        "artist_names": "$_artist_names",
+        "album_title": "$_album_title",
+        "_stored": {"artist_names": {"$ifNull": ["$artist_names", None]}, "album_title": {"$ifNull": ["$album_title", None]}},
+    }},
+]
+
+ALBUM_RESYNC_PIPELINE = [
+    {"$lookup": {"from": "artists", "localField": "artist_id", "foreignField": "artist_id", "as": "_artist"}},
+    {"$project": {
+        "artist_name": 1,
+        "_artist_name": {"$ifNull": [{"$arrayElemAt": ["$_artist.name", 0]}, None]},
+    }},
+    {"$match": {"$expr": {"$ne": [{"$ifNull": ["$artist_name", None]}, "$_artist_name"]}}},
+    {"$project": {"artist_name": "$_artist_name", "_stored": {"artist_name": {"$ifNull": ["$artist_name", None]}}}},
+]
+
+BATCH_SIZE = 1000
+
+
+async def _resync(collection, pipeline: List[dict], record_fixed) -> int:
+    """
+    Apply the corrected fields yielded by pipeline and log the fixed documents for
+    delta sync with record_fixed; returns the number of documents fixed. Rows carry
+    the values they were computed from in _stored; a document changed since is skipped.
+    """
+    fixed = 0
+    batch = {}
+
+    async def write():
+        nonlocal fixed
+        requests = [UpdateOne({"_id": document_id, **stored}, {"$set": row}) for document_id, (row, stored) in batch.items()]
+        fixed += (await collection.bulk_write(requests, ordered=False)).modified_count
+        await record_fixed({"_id": {"$in": list(batch)}})
+
+    async for row in collection.aggregate(pipeline):
+        batch[row.pop("_id")] = (row, row.pop("_stored"))
+        if len(batch) >= BATCH_SIZE:
+            await write()
+            batch = {}
+    if batch:
+        await write()
+    return fixed
+
+
+async def resync_denormalized_names():
+    """Recompute artist_names/album_title on music and artist_name on albums where they drifted"""
+    started = time.monotonic()
+    music_fixed = await _resync(Music.get_motor_collection(), MUSIC_RESYNC_PIPELINE, record_music_matching)
+    albums_fixed = await _resync(Album.get_motor_collection(), ALBUM_RESYNC_PIPELINE, record_albums_matching)
+    if music_fixed or albums_fixed:
+        bump_generation(MUSIC, ALBUMS)
+    print(f"Denormalized names re-synced in {time.monotonic() - started:.1f}s: "
+          f"{music_fixed} tracks, {albums_fixed} albums fixed")
+
+
+def main():
+    async def run():
+        await init_db()
+        await resync_denormalized_names()
+        print(f"Legacy playlists migrated: {await crud.migrate_legacy_playlists()}")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
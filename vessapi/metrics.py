@@ -0,0 +1,286 @@
+"""
+Prometheus metrics.
+
+GET /metrics serves counters, gauges and histograms in the Prometheus text format:
+
+- HTTP requests per route template (not raw path), method and status, their latency,
+  and how many are in progress (connected event streams count while they last)
+- MongoDB command latency per command and collection, from a driver command listener
+- Time spent in bcrypt (queueing and hashing) and in mutagen tag parsing
+- Pending ingestion jobs, password pool occupancy and event-loop lag
+
+Recording is a dictionary lookup and a few additions per observation; nothing is
+sorted or kept per request, so it is meant to stay on in production
+(settings.server.metrics_enabled). Values that are only known elsewhere, like the
+queue depth, are read when /metrics is scraped by the functions in `collectors`.
+"""
+
+import asyncio
+import bisect
+import re
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+from starlette.routing import Mount, compile_path
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; HTTP and MongoDB buckets start lower than the Prometheus defaults
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+SLOW_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LOOP_LAG_INTERVAL = 0.5
+
+# Any other method is counted as "other": the method comes from the client, and every
+# distinct label value is a new series kept for the life of the process
+HTTP_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "CONNECT", "TRACE"}
+
+LabelValues = Tuple[str, ...]
+
+_metrics: List["Metric"] = []
+
+# Called before every scrape to bring values owned by other modules up to date
+collectors: List[Callable[[], Awaitable[None]]] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        # Motor runs the command listener on driver threads
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _label_text(self, values: LabelValues, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, labels: LabelValues = (), amount: float = 1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def set(self, value: float, labels: LabelValues = ()):
+        """For totals that another module already counts"""
+        with self._lock:
+            self.values[labels] = value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self.values.items())
+        return [f"{self.name}{self._label_text(labels)} {_format_value(value)}" for labels, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: LabelValues = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = HTTP_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (not cumulative; the last one is +Inf), sum]
+        self.values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, labels: LabelValues = ()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self.values.items()]
+        lines = []
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{self._label_text(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._label_text(labels)} {cumulative}")
+        return lines
+
+
+HTTP_REQUESTS = Counter("vessapi_http_requests_total", "HTTP requests by route, method and status", ("method", "route", "status"))
+HTTP_REQUEST_SECONDS = Histogram("vessapi_http_request_duration_seconds", "Time until the response was fully sent", ("method", "route"))
+HTTP_IN_PROGRESS = Gauge("vessapi_http_requests_in_progress", "HTTP requests being handled, including open streams", ("method",))
+MONGO_COMMAND_SECONDS = Histogram("vessapi_mongodb_command_duration_seconds", "MongoDB command round trips", ("command", "collection"), MONGO_BUCKETS)
+MONGO_COMMAND_FAILURES = Counter("vessapi_mongodb_command_failures_total", "MongoDB commands that failed", ("command", "collection"))
+PASSWORD_QUEUE_SECONDS = Histogram("vessapi_password_hash_queue_seconds", "Time password operations waited for a hashing thread", buckets=SLOW_BUCKETS)
+PASSWORD_HASH_SECONDS = Histogram("vessapi_password_hash_seconds", "Time spent in bcrypt per password operation", buckets=SLOW_BUCKETS)
+PASSWORD_WAITING = Gauge("vessapi_password_hash_waiting", "Password operations waiting for a hashing thread")
+PASSWORD_RUNNING = Gauge("vessapi_password_hash_running", "Password operations being hashed")
+PASSWORD_REJECTED = Counter("vessapi_password_hash_rejected_total", "Password operations rejected because the queue was full")
+TAG_PARSE_SECONDS = Histogram("vessapi_tag_parse_seconds", "Time spent reading audio tags with mutagen, including the process pool queue", buckets=SLOW_BUCKETS)
+INGEST_PENDING = Gauge("vessapi_ingest_jobs_pending", "Ingestion jobs waiting for a worker")
+EVENT_LOOP_LAG_SECONDS = Gauge("vessapi_event_loop_lag_seconds", "How late the last event loop lag probe woke up")
+EVENT_LOOP_LAG = Histogram("vessapi_event_loop_lag_probe_seconds", "How late event loop lag probes woke up", buckets=MONGO_BUCKETS)
+
+
+async def render() -> str:
+    for collect in collectors:
+        try:
+            await collect()
+        except Exception as e:
+            # A failing source (e.g. MongoDB down) must not hide the other metrics
+            print(f"Collecting metrics with {collect.__module__}.{collect.__qualname__} failed: {e!r}")
+    return "\n".join(metric.render() for metric in _metrics) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting and timing HTTP requests per route template"""
+
+    def __init__(self, app, openapi: Callable[[], dict]):
+        self.app = app
+        self.openapi = openapi
+        self._templates: Optional[Dict[str, List[Tuple[re.Pattern, str]]]] = None
+
+    def _match_template(self, path: str) -> Optional[str]:
+        """Template of a documented route matching path; for requests answered before routing (cache hits, preflights)"""
+        if self._templates is None:
+            self._templates = {}
+            for template in self.openapi().get("paths", {}):
+                regex = compile_path(template)[0]
+                self._templates.setdefault(template.split("/")[1], []).append((regex, template))
+        for regex, template in self._templates.get(path.split("/")[1], ()):
+            if regex.match(path):
+                return template
+        return None
+
+    def _route(self, scope) -> str:
+        route = scope.get("route")
+        path = scope["path"]
+        if isinstance(route, Mount):
+            return route.path
+        if route is not None:
+            # Routes of included routers may only know their own path; the part of the
+            # request path in front of it is the include prefix
+            try:
+                rendered = route.path_format.format(**scope.get("path_params", {}))
+            except (AttributeError, KeyError):
+                rendered = None
+            if rendered is not None and path.endswith(rendered):
+                return path[:len(path) - len(rendered)] + route.path_format
+        return self._match_template(path) or "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"] if scope["method"] in HTTP_METHODS else "other"
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc((method,))
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_PROGRESS.dec((method,))
+            route = self._route(scope)
+            HTTP_REQUEST_SECONDS.observe(elapsed, (method, route))
+            HTTP_REQUESTS.inc((method, route, str(status[0])))
+
+
+def _command_collection(event: monitoring.CommandStartedEvent) -> str:
+    target = event.command.get(event.command_name)
+    if isinstance(target, str):
+        return target
+    if event.command_name == "getMore":
+        return event.command.get("collection", "")
+    return "" # Database commands (ping, endSessions...)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Driver command listener timing every MongoDB command"""
+
+    def __init__(self):
+        self._collections: Dict[Tuple, str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        self._collections[(event.connection_id, event.request_id)] = _command_collection(event)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, (event.command_name, collection))
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, (event.command_name, collection))
+        MONGO_COMMAND_FAILURES.inc((event.command_name, collection))
+
+
+class LoopLagMonitor:
+    """Sleeps LOOP_LAG_INTERVAL at a time and records how much later than that it woke up"""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            EVENT_LOOP_LAG_SECONDS.set(lag)
+            EVENT_LOOP_LAG.observe(lag)
+
+
+loop_lag_monitor = LoopLagMonitor()
@@ -1,6 +1,7 @@
 from beanie import Document
 from pydantic import Field
-from datetime import datetime, date
+from pymongo import IndexModel, ASCENDING, TEXT
+from datetime import datetime, date, timedelta
 from typing import List, Optional
 from uuid import UUID, uuid4
 
@@ -8,13 +9,17 @@ class Music(Document):
     music_id: UUID = Field(default_factory=uuid4, unique=True)
     title: str
     artist_ids: List[UUID] = []
+    artist_names: List[str] = [] # Names of artist_ids, kept in sync at write time
     duration: int
     file_path: str
+    codec: Optional[str] = None
+    content_hash: Optional[str] = None # SHA-256 of the audio file
     genre: Optional[str] = None
     track_number: Optional[int] = None
     publish_date: datetime
     lyrics: Optional[str] = None
     album_id: Optional[UUID] = None
+    album_title: Optional[str] = None # Title of album_id, kept in sync at write time
     cover_image_url: Optional[str] = None
     owner_id: UUID
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -22,11 +27,31 @@ class Music(Document):
 
     class Settings:
         name = "music"
+        indexes = [
+            IndexModel([("music_id", ASCENDING)], name="music_id_unique", unique=True),
+            IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at_id"),
+            IndexModel([("artist_ids", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], name="artist_ids_created_at"),
+            IndexModel([("album_id", ASCENDING)], name="album_id"),
+            IndexModel([("owner_id", ASCENDING)], name="owner_id"),
+            IndexModel(
+                [("content_hash", ASCENDING)],
+                name="content_hash_unique",
+                unique=True,
+                partialFilterExpression={"content_hash": {"$type": "string"}},
+            ),
+            IndexModel(
+                [("title", TEXT), ("artist_names", TEXT), ("album_title", TEXT), ("genre", TEXT), ("lyrics", TEXT)],
+                name="search_text",
+                weights={"title": 10, "artist_names": 5, "album_title": 3, "genre": 2, "lyrics": 1},
+                default_language="none",
+            ),
+        ]
 
 class Album(Document):
     album_id: UUID = Field(default_factory=uuid4, unique=True)
     title: str
     artist_id: UUID
+    artist_name: Optional[str] = None # Name of artist_id, kept in sync at write time
     release_date: date
     cover_image_url: str
     genre: Optional[str] = None
@@ -38,6 +63,19 @@ class Album(Document):
 
     class Settings:
         name = "albums"
+        indexes = [
+            IndexModel([("album_id", ASCENDING)], name="album_id_unique", unique=True),
+            IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at_id"),
+            IndexModel([("title", ASCENDING), ("artist_id", ASCENDING)], name="title_artist_id_unique", unique=True),
+            IndexModel([("artist_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], name="artist_id_created_at"),
+            IndexModel([("owner_id", ASCENDING)], name="owner_id"),
+            IndexModel(
+                [("title", TEXT), ("artist_name", TEXT), ("genre", TEXT), ("description", TEXT)],
+                name="search_text",
+                weights={"title": 10, "artist_name": 5, "genre": 2, "description": 1},
+                default_language="none",
+            ),
+        ]
 
 from enum import Enum
 
@@ -57,12 +95,18 @@ class User(Document):
 
     class Settings:
         name = "users"
+        indexes = [
+            IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+            IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at_id"),
+            IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        ]
 
 class Playlist(Document):
     playlist_id: UUID = Field(default_factory=uuid4, unique=True)
     name: str
     description: Optional[str] = None
-    music_ids: List[UUID] = []
+    music_ids: List[UUID] = [] # Legacy storage; moved to PlaylistEntry on the first edit or by python -m vessapi.maintenance
+    track_count: int = 0
     is_public: bool = False
     owner_id: UUID
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -70,6 +114,28 @@ class Playlist(Document):
 
     class Settings:
         name = "playlists"
+        indexes = [
+            IndexModel([("playlist_id", ASCENDING)], name="playlist_id_unique", unique=True),
+            IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at_id"),
+            IndexModel([("is_public", ASCENDING), ("owner_id", ASCENDING)], name="is_public_owner_id"),
+            IndexModel([("owner_id", ASCENDING)], name="owner_id"),
+        ]
+
+class PlaylistEntry(Document):
+    """One track of a playlist; entries are ordered by position (then _id for ties)"""
+    entry_id: UUID = Field(default_factory=uuid4, unique=True)
+    playlist_id: UUID
+    music_id: UUID
+    position: float
+    added_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "playlist_entries"
+        indexes = [
+            IndexModel([("entry_id", ASCENDING)], name="entry_id_unique", unique=True),
+            IndexModel([("playlist_id", ASCENDING), ("position", ASCENDING), ("_id", ASCENDING)], name="playlist_id_position_id"),
+            IndexModel([("playlist_id", ASCENDING), ("music_id", ASCENDING)], name="playlist_id_music_id"),
+        ]
 
 class Artist(Document):
     artist_id: UUID = Field(default_factory=uuid4, unique=True)
@@ -81,5 +147,81 @@ class Artist(Document):
 
     class Settings:
         name = "artists"
+        indexes = [
+            IndexModel([("artist_id", ASCENDING)], name="artist_id_unique", unique=True),
+            IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at_id"),
+            IndexModel([("name", ASCENDING)], name="name_unique", unique=True),
+            IndexModel(
+                [("name", TEXT), ("bio", TEXT)],
+                name="search_text",
+                weights={"name": 10, "bio": 1},
+                default_language="none",
+            ),
+        ]
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+class IngestJob(Document):
+    job_id: UUID = Field(default_factory=uuid4, unique=True)
+    kind: str = "music_upload"
+    status: JobStatus = JobStatus.PENDING
+    file_path: str
+    original_filename: Optional[str] = None
+    content_hash: Optional[str] = None
+    cover_image_url: Optional[str] = None
+    owner_id: UUID
+    attempts: int = 0
+    max_attempts: int = 3
+    available_at: datetime = Field(default_factory=datetime.utcnow) # Not claimed before this time (retry backoff)
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    error: Optional[str] = None
+    music_id: Optional[UUID] = None # Result of a succeeded job
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+    class Settings:
+        name = "ingest_jobs"
+        indexes = [
+            IndexModel([("job_id", ASCENDING)], name="job_id_unique", unique=True),
+            IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at_id"),
+            IndexModel([("status", ASCENDING), ("available_at", ASCENDING)], name="status_available_at"),
+            IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)], name="status_lease_expires_at"),
+            IndexModel([("content_hash", ASCENDING)], name="content_hash"),
+        ]
+
+# How long changes are kept for delta sync; clients that were away longer re-sync fully
+CHANGE_RETENTION = timedelta(days=30)
+
+class ChangeOp(str, Enum):
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+
+class Change(Document):
+    """One entry of the delta sync log; deletes are kept as tombstones until the entry expires"""
+    seq: int
+    collection: str # music, albums, artists or playlists
+    entity_id: UUID
+    op: ChangeOp
+    owner_id: Optional[UUID] = None # Playlists: the owner always sees the change
+    public: bool = True # Playlists: public before or after the change, so others see it too
+    changed_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "changes"
+        indexes = [
+            IndexModel([("seq", ASCENDING)], name="seq_unique", unique=True),
+            IndexModel(
+                [("changed_at", ASCENDING)],
+                name="changed_at_ttl",
+                expireAfterSeconds=int(CHANGE_RETENTION.total_seconds()),
+            ),
+        ]
 
-__beanie_models__ = [Music, Album, User, Playlist, Artist]
+__beanie_models__ = [Music, Album, User, Playlist, PlaylistEntry, Artist, IngestJob, Change]
@@ -0,0 +1,129 @@
+"""
+Keyset (cursor) pagination.
+
+List endpoints are ordered by the indexed key (created_at, _id). A cursor is an
+opaque token holding that key of the last item of a page; the next page starts
+strictly after it, so deep pages cost the same as the first one and concurrent
+inserts never shift rows between pages. Playlist entries use the same scheme on
+(position, _id).
+"""
+
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from beanie.odm.queries.find import FindMany
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Query, Response, status
+from pymongo import ASCENDING
+
+KEYSET_SORT = [("created_at", ASCENDING), ("_id", ASCENDING)]
+POSITION_SORT = [("position", ASCENDING), ("_id", ASCENDING)]
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+Cursor = Tuple[datetime, ObjectId]
+PositionCursor = Tuple[float, ObjectId]
+
+
+def _pack(key: str, object_id: ObjectId) -> str:
+    return base64.urlsafe_b64encode(f"{key}|{object_id}".encode()).decode().rstrip("=")
+
+
+def _unpack(token: str) -> Tuple[str, ObjectId]:
+    raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+    key, object_id = raw.split("|")
+    return key, ObjectId(object_id)
+
+
+def encode_cursor(created_at: datetime, object_id: ObjectId) -> str:
+    return _pack(created_at.isoformat(), object_id)
+
+
+def decode_cursor(token: str) -> Cursor:
+    """Raises ValueError for anything that was not produced by encode_cursor"""
+    try:
+        created_at, object_id = _unpack(token)
+        return datetime.fromisoformat(created_at), object_id
+    except (ValueError, UnicodeDecodeError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+
+
+def encode_position_cursor(position: float, object_id: ObjectId) -> str:
+    return _pack(repr(position), object_id)
+
+
+def decode_position_cursor(token: str) -> PositionCursor:
+    """Raises ValueError for anything that was not produced by encode_position_cursor"""
+    try:
+        position, object_id = _unpack(token)
+        return float(position), object_id
+    except (ValueError, UnicodeDecodeError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+
+
+def _after(field: str, value, object_id: ObjectId) -> dict:
+    return {
+        "$or": [
+            {field: {"$gt": value}},
+            {field: value, "_id": {"$gt": object_id}},
+        ]
+    }
+
+
+def keyset_filter(cursor: Cursor) -> dict:
+    return _after("created_at", *cursor)
+
+
+def position_filter(cursor: PositionCursor) -> dict:
+    return _after("position", *cursor)
+
+
+def paginate(query: FindMany, skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None) -> FindMany:
+    """Apply the keyset order and either the cursor or the legacy skip to a find query"""
+    if cursor is not None:
+        query = query.find(keyset_filter(cursor))
+        skip = 0
+    return query.sort(KEYSET_SORT).skip(skip).limit(limit)
+
+
+def next_cursor(items: List, limit: int) -> Optional[str]:
+    """Cursor for the page after items, or None when this was the last page"""
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(last.created_at, last.id)
+
+
+def set_next_cursor(response: Response, items: List, limit: int) -> None:
+    token = next_cursor(items, limit)
+    if token:
+        response.headers[NEXT_CURSOR_HEADER] = token
+
+
+def set_next_position_cursor(response: Response, entries: List, limit: int) -> None:
+    """set_next_cursor for playlist entries, which are ordered by (position, _id)"""
+    if entries and len(entries) >= limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_position_cursor(entries[-1].position, entries[-1].id)
+
+
+async def cursor_param(
+    cursor: Optional[str] = Query(None, description=f"Opaque cursor from the {NEXT_CURSOR_HEADER} header of the previous page")
+) -> Optional[Cursor]:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+async def position_cursor_param(
+    cursor: Optional[str] = Query(None, description=f"Opaque cursor from the {NEXT_CURSOR_HEADER} header of the previous page")
+) -> Optional[PositionCursor]:
+    if cursor is None:
+        return None
+    try:
+        return decode_position_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
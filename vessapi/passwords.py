@@ -0,0 +1,125 @@
+"""
+Password hashing off the event loop.
+
+bcrypt is deliberately slow (hundreds of milliseconds per call at production cost),
+so hashing and verification run in a small thread pool (bcrypt releases the GIL)
+instead of inside the async handlers. Admission is bounded: at most `workers` calls
+run at once and at most `max_queue` wait for a slot; beyond that PasswordHashingBusy
+is raised so a login burst is answered with 503 instead of piling up and freezing
+every other request. Queue and run times are recorded for monitoring (see vessapi.metrics).
+
+Hashes created with fewer rounds than bcrypt_rounds are reported by verify_and_update
+so the caller can store a fresh hash after a successful login.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from vessapi import metrics
+from vessapi.config import settings
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when too many password operations are already waiting for the pool"""
+
+
+class PasswordHasher:
+    def __init__(self, rounds: int, workers: int, max_queue: int):
+        self.context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            # Older, cheaper hashes are flagged for rehashing by verify_and_update
+            bcrypt__min_desired_rounds=rounds,
+        )
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+
+    async def _run(self, func: Callable, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            self._slots = asyncio.Semaphore(self.workers)
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise PasswordHashingBusy("Too many password operations in progress, try again shortly")
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        started_at = time.perf_counter()
+        queue_seconds = started_at - queued_at
+        self.queue_seconds_total += queue_seconds
+        self.queue_seconds_max = max(self.queue_seconds_max, queue_seconds)
+        metrics.PASSWORD_QUEUE_SECONDS.observe(queue_seconds)
+
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            run_seconds = time.perf_counter() - started_at
+            self.run_seconds_total += run_seconds
+            metrics.PASSWORD_HASH_SECONDS.observe(run_seconds)
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, password, hashed_password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """(valid, new_hash); new_hash is set when the stored hash uses an outdated cost"""
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_seconds_total": self.queue_seconds_total,
+            "queue_seconds_max": self.queue_seconds_max,
+            "run_seconds_total": self.run_seconds_total,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            self._slots = None
+
+
+password_hasher = PasswordHasher(
+    rounds=settings.security.bcrypt_rounds,
+    workers=settings.security.password_hash_workers,
+    max_queue=settings.security.password_hash_queue,
+)
+
+
+async def _collect_metrics():
+    stats = password_hasher.stats()
+    metrics.PASSWORD_WAITING.set(stats["waiting"])
+    metrics.PASSWORD_RUNNING.set(stats["running"])
+    metrics.PASSWORD_REJECTED.set(stats["rejected"])
+
+metrics.collectors.append(_collect_metrics)
@@ -0,0 +1,69 @@
+"""
+Listings as a plain projection.
+
+Tracks store their artists' names and their album's title, and albums their artist's
+name, all maintained at write time by crud (see the denormalized names section
+there, and vessapi.maintenance for the repair job). A page of responses is therefore
+the page query ($match, keyset sort, skip/limit) followed by a $project that produces
+exactly the response shape: one round trip and no joins on the read path.
+
+Playlist entries are the exception: a page of entries is joined to its tracks with a
+$lookup after $limit, which only touches the rows of the page through the unique
+music_id index.
+"""
+
+from typing import List, Optional, Type
+
+from beanie import PydanticObjectId
+from beanie.odm.queries.find import FindMany
+from pydantic import Field
+
+from vessapi.schemas import AlbumResponse, MusicResponse, PlaylistEntryResponse
+
+
+def _fields(model: Type) -> dict:
+    return {name: 1 for name in model.model_fields}
+
+
+class MusicListing(MusicResponse):
+    """MusicResponse as projected by the pipeline; _id is kept for the next-page cursor"""
+    id: Optional[PydanticObjectId] = Field(default=None, alias="_id", exclude=True)
+
+    class Settings:
+        projection = {**_fields(MusicResponse), "_id": 1}
+
+
+class AlbumListing(AlbumResponse):
+    """AlbumResponse as projected by the pipeline; _id is kept for the next-page cursor"""
+    id: Optional[PydanticObjectId] = Field(default=None, alias="_id", exclude=True)
+
+    class Settings:
+        projection = {
+            **_fields(AlbumResponse),
+            "_id": 1,
+            "artist_name": {"$ifNull": ["$artist_name", "Unknown Artist"]},
+            "num_tracks": {"$size": {"$ifNull": ["$music_ids", []]}},
+        }
+
+
+PLAYLIST_ENTRY_LOOKUPS = [
+    {"$lookup": {"from": "music", "localField": "music_id", "foreignField": "music_id", "as": "_music"}},
+]
+
+
+class PlaylistEntryListing(PlaylistEntryResponse):
+    """PlaylistEntryResponse with its track; _id is kept for the next-page cursor"""
+    id: Optional[PydanticObjectId] = Field(default=None, alias="_id", exclude=True)
+
+    class Settings:
+        projection = {
+            **_fields(PlaylistEntryResponse),
+            "_id": 1,
+            "music": {"$arrayElemAt": ["$_music", 0]},
+        }
+
+
+async def aggregate_listings(query: FindMany, projection_model: Type, lookups: List[dict] = ()) -> list:
+    """Run a (paginated) find query as $match/$sort/$skip/$limit + lookups + response projection"""
+    pipeline = query.build_aggregation_pipeline() + list(lookups)
+    return await query.document_model.aggregate(pipeline, projection_model=projection_model).to_list()
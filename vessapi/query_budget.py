@@ -0,0 +1,214 @@
+"""
+Per-request MongoDB query accounting for debug mode.
+
+With settings.server.debug on, every response carries the number of MongoDB commands
+the request issued before its headers were sent, their summed round-trip time and the
+slowest of them:
+
+    X-Query-Count: 3
+    X-Query-Time-Ms: 4.2
+    X-Query-Slowest: aggregate music 2.9ms
+
+A request that runs the same query shape (command, collection and filter structure,
+values ignored) REPEAT_WARNING times or more is an N+1 pattern; it is reported with
+the lines that issued the query.
+
+Commands are attributed through a ContextVar. Motor runs pymongo on executor threads
+with a copy of the caller's context, so the command listener sees the QueryBudget of
+the request that issued the command. The issuing line is only visible on the event
+loop thread, so capture_call_sites() wraps Motor's run_on_executor to note it in the
+context before the copy is made.
+
+track_queries() opens a budget around any block; tests use it (through the
+max_queries fixture) to bound the commands an endpoint may issue.
+"""
+
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pymongo import monitoring
+
+COUNT_HEADER = "X-Query-Count"
+TIME_HEADER = "X-Query-Time-Ms"
+SLOWEST_HEADER = "X-Query-Slowest"
+HEADERS = (COUNT_HEADER, TIME_HEADER, SLOWEST_HEADER)
+
+REPEAT_WARNING = 5
+CALL_SITE_DEPTH = 3
+
+# Where the filter of a command lives; it defines the shape together with command and collection
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+    "update": "updates",
+    "delete": "deletes",
+}
+# Follow-ups of an earlier command, not queries of their own
+UNSHAPED_COMMANDS = {"getMore", "killCursors", "endSessions"}
+
+_THIS_FILE = os.path.abspath(__file__)
+_ROOT = os.path.dirname(os.path.dirname(_THIS_FILE))
+
+_current: ContextVar[Optional["QueryBudget"]] = ContextVar("query_budget", default=None)
+_call_site: ContextVar[Optional[str]] = ContextVar("query_call_site", default=None)
+
+
+def query_shape(command_name: str, command: dict) -> tuple:
+    """Command, collection and the keys of its filter; scalar values and $in lists are left out"""
+    def shape(value):
+        if isinstance(value, dict):
+            return tuple((key, shape(item)) for key, item in value.items())
+        if isinstance(value, (list, tuple)):
+            return tuple(shape(item) for item in value if isinstance(item, (dict, list, tuple)))
+        return None
+
+    collection = command.get(command_name)
+    field = FILTER_FIELDS.get(command_name)
+    return command_name, collection if isinstance(collection, str) else "", shape(command.get(field)) if field else None
+
+
+class QueryBudget:
+    """Commands issued inside one track_queries() block (and its nested blocks)"""
+
+    def __init__(self, parent: Optional["QueryBudget"] = None):
+        self.parent = parent
+        self.count = 0
+        self.total_seconds = 0.0
+        self.slowest: Optional[Tuple[float, str]] = None
+        # shape -> [times issued, description, call site of the first one]
+        self.shapes: Dict[tuple, list] = {}
+        # The listener records from driver threads
+        self._lock = threading.Lock()
+
+    def record(self, description: str, shape: Optional[tuple], seconds: float, call_site: Optional[str]):
+        budget = self
+        while budget is not None:
+            budget._add(description, shape, seconds, call_site)
+            budget = budget.parent
+
+    def _add(self, description: str, shape: Optional[tuple], seconds: float, call_site: Optional[str]):
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            if self.slowest is None or seconds > self.slowest[0]:
+                self.slowest = (seconds, description)
+            if shape is not None:
+                entry = self.shapes.setdefault(shape, [0, description, call_site])
+                entry[0] += 1
+
+    def repeated(self, threshold: int = REPEAT_WARNING) -> List[Tuple[str, int, Optional[str]]]:
+        """(description, times, call site) of every shape issued at least threshold times"""
+        with self._lock:
+            return [(description, times, call_site) for times, description, call_site in self.shapes.values() if times >= threshold]
+
+    def headers(self) -> List[Tuple[bytes, bytes]]:
+        values = [(COUNT_HEADER, str(self.count)), (TIME_HEADER, f"{self.total_seconds * 1000:.1f}")]
+        if self.slowest is not None:
+            values.append((SLOWEST_HEADER, f"{self.slowest[1]} {self.slowest[0] * 1000:.1f}ms"))
+        return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in values]
+
+    def report(self) -> str:
+        """Every shape with how often it ran, most frequent first"""
+        with self._lock:
+            entries = sorted(self.shapes.values(), key=lambda entry: -entry[0])
+        return "\n".join(f"{times}x {description} from {call_site or 'unknown'}" for times, description, call_site in entries)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryBudget]:
+    budget = QueryBudget(parent=_current.get())
+    token = _current.set(budget)
+    try:
+        yield budget
+    finally:
+        _current.reset(token)
+
+
+class QueryBudgetListener(monitoring.CommandListener):
+    """Driver command listener charging every command to the active QueryBudget"""
+
+    def __init__(self):
+        self._started: Dict[Tuple, tuple] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        budget = _current.get()
+        if budget is None:
+            return
+        collection = event.command.get(event.command_name)
+        description = f"{event.command_name} {collection}" if isinstance(collection, str) else event.command_name
+        shape = None if event.command_name in UNSHAPED_COMMANDS else query_shape(event.command_name, event.command)
+        self._started[(event.connection_id, event.request_id)] = (budget, description, shape, _call_site.get())
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finish(event)
+
+    def _finish(self, event):
+        started = self._started.pop((event.connection_id, event.request_id), None)
+        if started is not None:
+            budget, description, shape, call_site = started
+            budget.record(description, shape, event.duration_micros / 1e6, call_site)
+
+
+def _find_call_site() -> Optional[str]:
+    """The innermost CALL_SITE_DEPTH frames of this project's code, innermost first"""
+    frames = []
+    frame = sys._getframe(2)
+    while frame is not None and len(frames) < CALL_SITE_DEPTH:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_ROOT) and "site-packages" not in filename and filename != _THIS_FILE:
+            frames.append(f"{os.path.relpath(filename, _ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}")
+        frame = frame.f_back
+    return " <- ".join(frames) or None
+
+
+def capture_call_sites():
+    """Note the issuing line of every Motor operation in the context (debug only: walks the stack per command)"""
+    from motor.frameworks import asyncio as motor_framework
+
+    run_on_executor = motor_framework.run_on_executor
+    if getattr(run_on_executor, "captures_call_sites", False):
+        return
+
+    def run_on_executor_with_call_site(loop, fn, *args, **kwargs):
+        if _current.get() is not None:
+            call_site = _find_call_site()
+            if call_site is not None:
+                # Follow-up fetches run from callbacks and keep the site of their query
+                _call_site.set(call_site)
+        return run_on_executor(loop, fn, *args, **kwargs)
+
+    run_on_executor_with_call_site.captures_call_sites = True
+    motor_framework.run_on_executor = run_on_executor_with_call_site
+
+
+class QueryBudgetMiddleware:
+    """ASGI middleware adding query budget headers and reporting N+1 patterns (debug mode)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as budget:
+            async def send_with_headers(message):
+                if message["type"] == "http.response.start":
+                    message = {**message, "headers": list(message.get("headers", [])) + budget.headers()}
+                await send(message)
+
+            await self.app(scope, receive, send_with_headers)
+
+        for description, times, call_site in budget.repeated():
+            print(f"N+1 query warning: {scope['method']} {scope['path']} ran {description} {times} times with the same shape, from {call_site or 'unknown'}")
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from uuid import UUID
 from datetime import date
 
-from vessapi import crud, schemas, models
+from vessapi import bulk, crud, schemas, models
 from vessapi.auth import get_current_active_user, has_role
 from vessapi.models import UserRole, User
+from vessapi.pagination import Cursor, cursor_param, set_next_cursor
+from vessapi.responses import list_response
 
 router = APIRouter(
     prefix="/albums",
@@ -24,61 +27,68 @@ async def create_album_api(album: schemas.AlbumCreate, admin: User = Depends(is_
     """
     return await crud.create_album(album=album, owner_id=admin.user_id)
 
+@router.post("/bulk", summary="Create, update and delete albums in bulk (Admin only)")
+async def bulk_albums_api(request: Request, ordered: bool = Query(True, description="Stop at the first failed operation"), admin: User = Depends(is_admin)):
+    """
+    Applies a JSON array or NDJSON stream of create/update/delete operations.
+    The response is NDJSON: one result per operation in request order, then a summary line.
+    """
+    operations = await bulk.operations_from_request(request)
+    return StreamingResponse(bulk.run_bulk(bulk.ALBUM_TARGET, operations, admin.user_id, ordered), media_type="application/x-ndjson")
+
 @router.get("/", response_model=List[schemas.AlbumResponse], summary="Retrieve all albums")
 async def read_albums(
     skip: int = Query(0, ge=0), 
     limit: int = Query(100, ge=1), 
     title: Optional[str] = Query(None),
     artist_id: Optional[UUID] = Query(None),
-    genre: Optional[str] = Query(None)
+    genre: Optional[str] = Query(None),
+    cursor: Optional[Cursor] = Depends(cursor_param)
 ):
     """
     Retrieve a list of all albums. This endpoint is public.
-    Supports pagination and filtering.
+    Supports pagination and filtering. The cursor for the next page is returned
+    in the X-Next-Cursor header; pass it back as `cursor` instead of using `skip`.
     """
-    albums = await crud.get_albums(
+    # One aggregation: page query, artist $lookup, response projection
+    albums = await crud.get_album_responses(
         skip=skip, 
         limit=limit, 
         title=title, 
         artist_id=artist_id, 
-        genre=genre
+        genre=genre,
+        cursor=cursor
     )
-    # This part can be optimized
-    response_list = []
-    for album in albums:
-        response_list.append(await crud.enrich_album_response(album))
-    return response_list
+    response = list_response(albums, schemas.AlbumResponse)
+    set_next_cursor(response, albums, limit)
+    return response
 
 @router.get("/{album_id}", response_model=schemas.AlbumResponse, summary="Retrieve a single album by ID")
 async def read_album(album_id: UUID):
     """
     Retrieve a specific album by its unique ID. This endpoint is public.
     """
-    db_album = await crud.get_album(album_id=album_id)
-    if db_album is None:
+    album = await crud.get_album_response(album_id=album_id)
+    if album is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Album not found")
-    return await crud.enrich_album_response(db_album)
+    return album
 
 @router.put("/{album_id}", response_model=schemas.AlbumResponse, summary="Update an existing album (Admin only)")
 async def update_album_api(album_id: UUID, album_update: schemas.AlbumUpdate, admin: User = Depends(is_admin)):
     """
     Updates an existing album. Requires admin privileges.
     """
-    db_album = await crud.get_album(album_id=album_id)
-    if db_album is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Album not found")
-    
     updated_album = await crud.update_album(album_id=album_id, album=album_update, owner_id=admin.user_id, is_admin=True)
-    return await crud.enrich_album_response(updated_album)
+    if updated_album is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Album not found")
+    return crud.album_response(updated_album)
 
 @router.delete("/{album_id}", status_code=status.HTTP_204_NO_CONTENT, summary="Delete an album (Admin only)")
 async def delete_album_api(album_id: UUID, admin: User = Depends(is_admin)):
     """
     Deletes an album. Requires admin privileges.
     """
-    db_album = await crud.get_album(album_id=album_id)
+    db_album = await crud.delete_album(album_id=album_id, owner_id=admin.user_id, is_admin=True)
     if db_album is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Album not found")
-    
-    await crud.delete_album(album_id=album_id, owner_id=admin.user_id, is_admin=True)
     return None
\ No newline at end of file
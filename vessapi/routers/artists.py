@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from uuid import UUID
 
-from vessapi import crud, schemas, models
+from vessapi import bulk, crud, schemas, models
 from vessapi.auth import has_role
 from vessapi.models import UserRole, User
+from vessapi.pagination import Cursor, cursor_param, set_next_cursor
+from vessapi.responses import list_response
 
 router = APIRouter(
     prefix="/artists",
@@ -25,12 +28,25 @@ async def create_artist_api(artist: schemas.ArtistCreate, admin: User = Depends(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Artist with this name already exists")
     return await crud.create_artist(artist=artist)
 
+@router.post("/bulk", summary="Create, update and delete artists in bulk (Admin only)")
+async def bulk_artists_api(request: Request, ordered: bool = Query(True, description="Stop at the first failed operation"), admin: User = Depends(is_admin)):
+    """
+    Applies a JSON array or NDJSON stream of create/update/delete operations.
+    The response is NDJSON: one result per operation in request order, then a summary line.
+    """
+    operations = await bulk.operations_from_request(request)
+    return StreamingResponse(bulk.run_bulk(bulk.ARTIST_TARGET, operations, admin.user_id, ordered), media_type="application/x-ndjson")
+
 @router.get("/", response_model=List[schemas.ArtistResponse], summary="Retrieve all artists")
-async def read_artists(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1)):
+async def read_artists(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1), cursor: Optional[Cursor] = Depends(cursor_param)):
     """
     Retrieve a list of all registered artists. This endpoint is public.
+    The cursor for the next page is returned in the X-Next-Cursor header.
     """
-    return await crud.get_artists(skip=skip, limit=limit)
+    artists = await crud.get_artists(skip=skip, limit=limit, cursor=cursor)
+    response = list_response(artists, schemas.ArtistResponse)
+    set_next_cursor(response, artists, limit)
+    return response
 
 @router.get("/{artist_id}", response_model=schemas.ArtistResponse, summary="Retrieve a single artist by ID")
 async def read_artist(artist_id: UUID):
@@ -47,42 +63,39 @@ async def update_artist_api(artist_id: UUID, artist_update: schemas.ArtistUpdate
     """
     Updates an existing artist. Requires admin privileges.
     """
-    db_artist = await crud.get_artist(artist_id=artist_id)
+    db_artist = await crud.update_artist(artist_id=artist_id, artist=artist_update)
     if db_artist is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Artist not found")
-    
-    return await crud.update_artist(artist_id=artist_id, artist=artist_update)
+    return db_artist
 
 @router.delete("/{artist_id}", status_code=status.HTTP_204_NO_CONTENT, summary="Delete an artist (Admin only)")
 async def delete_artist_api(artist_id: UUID, admin: User = Depends(is_admin)):
     """
     Deletes an artist. Requires admin privileges.
     """
-    db_artist = await crud.get_artist(artist_id=artist_id)
+    db_artist = await crud.delete_artist(artist_id=artist_id)
     if db_artist is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Artist not found")
-    
-    await crud.delete_artist(artist_id=artist_id)
     return None
 
 @router.get("/{artist_id}/music", response_model=List[schemas.MusicResponse], summary="Retrieve music by artist ID")
-async def get_music_by_artist_api(artist_id: UUID, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1)):
+async def get_music_by_artist_api(artist_id: UUID, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1), cursor: Optional[Cursor] = Depends(cursor_param)):
     """
     Retrieve a list of music tracks by a specific artist ID. This endpoint is public.
+    The cursor for the next page is returned in the X-Next-Cursor header.
     """
-    music_list = await crud.get_music_by_artist_id(artist_id=artist_id, skip=skip, limit=limit)
-    response_list = []
-    for music in music_list:
-        response_list.append(await crud.enrich_music_response(music))
-    return response_list
+    music_list = await crud.get_music_responses(artist_ids=[artist_id], skip=skip, limit=limit, cursor=cursor)
+    response = list_response(music_list, schemas.MusicResponse)
+    set_next_cursor(response, music_list, limit)
+    return response
 
 @router.get("/{artist_id}/albums", response_model=List[schemas.AlbumResponse], summary="Retrieve albums by artist ID")
-async def get_albums_by_artist_api(artist_id: UUID, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1)):
+async def get_albums_by_artist_api(artist_id: UUID, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1), cursor: Optional[Cursor] = Depends(cursor_param)):
     """
     Retrieve a list of albums by a specific artist ID. This endpoint is public.
+    The cursor for the next page is returned in the X-Next-Cursor header.
     """
-    albums = await crud.get_albums_by_artist_id(artist_id=artist_id, skip=skip, limit=limit)
-    response_list = []
-    for album in albums:
-        response_list.append(await crud.enrich_album_response(album))
-    return response_list
\ No newline at end of file
+    albums = await crud.get_album_responses(artist_id=artist_id, skip=skip, limit=limit, cursor=cursor)
+    response = list_response(albums, schemas.AlbumResponse)
+    set_next_cursor(response, albums, limit)
+    return response
\ No newline at end of file
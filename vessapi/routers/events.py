@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, Header
+from fastapi.responses import StreamingResponse
+from typing import Optional
+
+from vessapi import models
+from vessapi.auth import get_current_active_user
+from vessapi.events import event_stream
+
+router = APIRouter(
+    prefix="/events",
+    tags=["events"],
+)
+
+@router.get("/", summary="Live change events (server-sent events)", response_class=StreamingResponse)
+async def stream_events(
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID", description="id of the last event received, to catch up after reconnecting"),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    A text/event-stream of changes to music, albums, artists and the playlists the user
+    can see, e.g. `event: playlists.updated` with `{"seq", "collection", "id", "op"}` as data.
+    A `reset` event means too much was missed; sync with /v1/sync/changes and reconnect.
+    """
+    return StreamingResponse(
+        event_stream(current_user.user_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException, status
+from uuid import UUID
+
+from vessapi import jobs, schemas
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Jobs"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get("/{job_id}", response_model=schemas.JobResponse, summary="Get the status of an ingestion job")
+async def read_job(job_id: UUID):
+    """
+    Retrieve the status of a background ingestion job, as returned by the upload form.
+    Job ids are random and only known to the uploader; this endpoint is public like the upload itself.
+    """
+    job = await jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from uuid import UUID
 from datetime import date
 
-from vessapi import crud, schemas, models
+from vessapi import bulk, crud, schemas, models
 from vessapi.auth import get_current_active_user, has_role
 from vessapi.models import UserRole, User
+from vessapi.pagination import Cursor, cursor_param, set_next_cursor
+from vessapi.responses import list_response
+from vessapi.streaming import StreamNotFound, resolve_stream, stream_cache, stream_response
 
 router = APIRouter(
     prefix="/songs",
@@ -24,83 +28,83 @@ async def create_music_api(music: schemas.MusicCreate, admin: User = Depends(is_
     """
     return await crud.create_music(music=music, owner_id=admin.user_id)
 
+@router.post("/bulk", summary="Create, update and delete music tracks in bulk (Admin only)")
+async def bulk_music_api(request: Request, ordered: bool = Query(True, description="Stop at the first failed operation"), admin: User = Depends(is_admin)):
+    """
+    Applies a JSON array or NDJSON stream of create/update/delete operations.
+    The response is NDJSON: one result per operation in request order, then a summary line.
+    """
+    operations = await bulk.operations_from_request(request)
+    return StreamingResponse(bulk.run_bulk(bulk.MUSIC_TARGET, operations, admin.user_id, ordered), media_type="application/x-ndjson")
+
 @router.get("/", response_model=List[schemas.MusicResponse], summary="Retrieve all music tracks")
 async def read_music_all(
     skip: int = Query(0, ge=0), 
     limit: int = Query(100, ge=1), 
     title: Optional[str] = Query(None),
     artist_id: Optional[UUID] = Query(None),
-    genre: Optional[str] = Query(None)
+    genre: Optional[str] = Query(None),
+    cursor: Optional[Cursor] = Depends(cursor_param)
 ):
     """
     Retrieve a list of all music tracks. This endpoint is public.
-    Supports pagination and filtering.
+    Supports pagination and filtering. The cursor for the next page is returned
+    in the X-Next-Cursor header; pass it back as `cursor` instead of using `skip`.
     """
-    music_list = await crud.get_music_all(
+    # One aggregation: page query, artist and album $lookup, response projection
+    music_list = await crud.get_music_responses(
         skip=skip, 
         limit=limit, 
         title=title, 
         artist_ids=[artist_id] if artist_id else None, 
-        genre=genre
+        genre=genre,
+        cursor=cursor
     )
-    # This part can be optimized, but following existing pattern for now
-    response_list = []
-    for music in music_list:
-        response_list.append(await crud.enrich_music_response(music))
-    return response_list
+    response = list_response(music_list, schemas.MusicResponse)
+    set_next_cursor(response, music_list, limit)
+    return response
 
 @router.get("/{music_id}", response_model=schemas.MusicResponse, summary="Retrieve a single music track by ID")
 async def read_music(music_id: UUID):
     """
     Retrieve a specific music track by its unique ID. This endpoint is public.
     """
-    db_music = await crud.get_music(music_id=music_id)
-    if db_music is None:
+    music = await crud.get_music_response(music_id=music_id)
+    if music is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Music not found")
-    return await crud.enrich_music_response(db_music)
+    return music
 
 @router.put("/{music_id}", response_model=schemas.MusicResponse, summary="Update an existing music track (Admin only)")
 async def update_music_api(music_id: UUID, music_update: schemas.MusicUpdate, admin: User = Depends(is_admin)):
     """
     Updates an existing music track. Requires admin privileges.
     """
-    db_music = await crud.get_music(music_id=music_id)
-    if db_music is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Music not found")
-    
     updated_music = await crud.update_music(music_id=music_id, music=music_update, owner_id=admin.user_id, is_admin=True)
-    return await crud.enrich_music_response(updated_music)
+    if updated_music is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Music not found")
+    stream_cache.invalidate(music_id)
+    return crud.music_response(updated_music)
 
 @router.delete("/{music_id}", status_code=status.HTTP_204_NO_CONTENT, summary="Delete a music track (Admin only)")
 async def delete_music_api(music_id: UUID, admin: User = Depends(is_admin)):
     """
     Deletes a music track. Requires admin privileges.
     """
-    db_music = await crud.get_music(music_id=music_id)
+    db_music = await crud.delete_music(music_id=music_id, owner_id=admin.user_id, is_admin=True)
     if db_music is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Music not found")
-    
-    await crud.delete_music(music_id=music_id, owner_id=admin.user_id, is_admin=True)
+    stream_cache.invalidate(music_id)
     return None
 
 @router.get("/{music_id}/stream", summary="Stream a music track")
-async def stream_music(music_id: UUID):
+async def stream_music(music_id: UUID, request: Request):
     """
     Stream a music track by its ID. This endpoint is public.
+    Supports Range requests (206 Partial Content, multiple ranges), If-Range and
+    conditional GET through ETag/Last-Modified, so players can seek without re-downloading.
     """
-    from fastapi.responses import FileResponse
-    import os
-    
-    db_music = await crud.get_music(music_id=music_id)
-    if db_music is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Music not found")
-    
-    # Check if file exists
-    if not os.path.exists(db_music.file_path):
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Music file not found")
-    
-    return FileResponse(
-        path=db_music.file_path,
-        media_type="audio/mpeg",
-        filename=f"{db_music.title}.mp3"
-    )
\ No newline at end of file
+    try:
+        info = await resolve_stream(music_id)
+    except StreamNotFound as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return stream_response(request, info)
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
 from vessapi import crud, schemas, models
 from vessapi.auth import get_current_active_user
+from vessapi.pagination import Cursor, PositionCursor, cursor_param, position_cursor_param, set_next_cursor, set_next_position_cursor
+from vessapi.responses import list_response
 
 router = APIRouter(
     prefix="/playlists",
@@ -16,8 +18,11 @@ async def create_playlist_api(playlist: schemas.PlaylistCreate, current_user: mo
     return await crud.create_playlist(playlist=playlist, owner_id=current_user.user_id)
 
 @router.get("/", response_model=List[schemas.PlaylistResponse], summary="Retrieve accessible playlists", description="Retrieves a list of public playlists and playlists owned by the current user.")
-async def read_playlists(skip: int = Query(0, ge=0, description="Number of items to skip"), limit: int = Query(100, ge=1, le=1000, description="Maximum number of items to return"), current_user: models.User = Depends(get_current_active_user)):
-    return await crud.get_playlists(skip=skip, limit=limit, user_id=current_user.user_id)
+async def read_playlists(skip: int = Query(0, ge=0, description="Number of items to skip"), limit: int = Query(100, ge=1, le=1000, description="Maximum number of items to return"), cursor: Optional[Cursor] = Depends(cursor_param), current_user: models.User = Depends(get_current_active_user)):
+    playlists = await crud.get_playlists(skip=skip, limit=limit, user_id=current_user.user_id, cursor=cursor)
+    response = list_response(playlists, schemas.PlaylistResponse)
+    set_next_cursor(response, playlists, limit)
+    return response
 
 @router.get("/{playlist_id}", response_model=schemas.PlaylistResponse, summary="Retrieve a single playlist by ID", description="Retrieves a specific playlist by its ID. Can only be accessed by the owner or if the playlist is public.")
 async def read_playlist(playlist_id: UUID, current_user: models.User = Depends(get_current_active_user)):
@@ -40,20 +45,59 @@ async def delete_playlist_api(playlist_id: UUID, current_user: models.User = Dep
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Playlist not found or you don't have permission to delete it")
     return
 
-@router.post("/{playlist_id}/music/{music_id}", response_model=schemas.PlaylistResponse, summary="Add music to a playlist", description="Adds a music track to a specific playlist. Only the owner of the playlist can modify it.")
-async def add_music_to_playlist_api(playlist_id: UUID, music_id: UUID, current_user: models.User = Depends(get_current_active_user)):
-    db_playlist = await crud.add_music_to_playlist(playlist_id=playlist_id, music_id=music_id, owner_id=current_user.user_id)
+@router.post("/{playlist_id}/music/{music_id}", response_model=schemas.PlaylistResponse, summary="Add music to a playlist", description="Inserts a music track into a specific playlist at the given zero-based index, or appends it; a track already in the playlist is left where it is. Only the owner of the playlist can modify it.")
+async def add_music_to_playlist_api(playlist_id: UUID, music_id: UUID, index: Optional[int] = Query(None, ge=0, description="Zero-based index to insert at; appended when omitted"), current_user: models.User = Depends(get_current_active_user)):
+    db_playlist = await crud.add_music_to_playlist(playlist_id=playlist_id, music_id=music_id, owner_id=current_user.user_id, index=index)
     if db_playlist is None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Playlist or Music not found or you don't have permission to modify it")
     return db_playlist
 
-@router.delete("/{playlist_id}/music/{music_id}", response_model=schemas.PlaylistResponse, summary="Remove music from a playlist", description="Removes a music track from a specific playlist. Only the owner of the playlist can modify it.")
+@router.delete("/{playlist_id}/music/{music_id}", response_model=schemas.PlaylistResponse, summary="Remove music from a playlist", description="Removes every entry of a music track from a specific playlist. Only the owner of the playlist can modify it.")
 async def remove_music_from_playlist_api(playlist_id: UUID, music_id: UUID, current_user: models.User = Depends(get_current_active_user)):
     db_playlist = await crud.remove_music_from_playlist(playlist_id=playlist_id, music_id=music_id, owner_id=current_user.user_id)
     if db_playlist is None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Playlist or Music not found or you don't have permission to modify it")
     return db_playlist
 
-@router.get("/{playlist_id}/music/", response_model=List[schemas.MusicResponse], summary="Retrieve music tracks in a playlist", description="Retrieves all music tracks within a specific playlist.")
-async def get_music_in_playlist(playlist_id: UUID, current_user: models.User = Depends(get_current_active_user)):
-    return await crud.get_music_in_playlist(playlist_id=playlist_id)
+@router.get("/{playlist_id}/music/", response_model=List[schemas.MusicResponse], summary="Retrieve music tracks in a playlist", description="Retrieves the music tracks of a specific playlist in playlist order, one page at a time.")
+async def get_music_in_playlist(playlist_id: UUID, limit: int = Query(100, ge=1, le=1000, description="Maximum number of items to return"), cursor: Optional[PositionCursor] = Depends(position_cursor_param), current_user: models.User = Depends(get_current_active_user)):
+    entries = await crud.get_playlist_entries(playlist_id=playlist_id, user_id=current_user.user_id, limit=limit, cursor=cursor)
+    if entries is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Playlist not found or you don't have permission to view it")
+    # Entries whose track was deleted are skipped; the cursor still advances past them
+    response = list_response([entry.music for entry in entries if entry.music], schemas.MusicResponse)
+    set_next_position_cursor(response, entries, limit)
+    return response
+
+@router.post("/{playlist_id}/entries/batch", response_model=schemas.PlaylistResponse, summary="Add, remove and move many tracks at once", description="Applies a list of add, remove and move operations to a playlist in order, after validating all of them, and returns the playlist afterwards. Only the owner of the playlist can modify it.")
+async def batch_playlist_entries_api(playlist_id: UUID, batch: schemas.PlaylistBatch, current_user: models.User = Depends(get_current_active_user)):
+    try:
+        db_playlist = await crud.apply_playlist_operations(playlist_id=playlist_id, operations=batch.operations, owner_id=current_user.user_id)
+    except crud.PlaylistBatchError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if db_playlist is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Playlist not found or you don't have permission to modify it")
+    return db_playlist
+
+@router.get("/{playlist_id}/entries/", response_model=List[schemas.PlaylistEntryResponse], summary="Retrieve the entries of a playlist", description="Retrieves the entries of a specific playlist in playlist order, each with its music track, one page at a time.")
+async def get_playlist_entries(playlist_id: UUID, limit: int = Query(100, ge=1, le=1000, description="Maximum number of items to return"), cursor: Optional[PositionCursor] = Depends(position_cursor_param), current_user: models.User = Depends(get_current_active_user)):
+    entries = await crud.get_playlist_entries(playlist_id=playlist_id, user_id=current_user.user_id, limit=limit, cursor=cursor)
+    if entries is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Playlist not found or you don't have permission to view it")
+    response = list_response(entries, schemas.PlaylistEntryResponse)
+    set_next_position_cursor(response, entries, limit)
+    return response
+
+@router.post("/{playlist_id}/entries/{entry_id}/move", response_model=schemas.PlaylistEntryResponse, summary="Move a playlist entry", description="Moves an entry to a new zero-based index within its playlist. Only the owner of the playlist can modify it.")
+async def move_playlist_entry_api(playlist_id: UUID, entry_id: UUID, move: schemas.PlaylistEntryMove, current_user: models.User = Depends(get_current_active_user)):
+    entry = await crud.move_playlist_entry(playlist_id=playlist_id, entry_id=entry_id, index=move.index, owner_id=current_user.user_id)
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Playlist entry not found or you don't have permission to modify it")
+    return entry
+
+@router.delete("/{playlist_id}/entries/{entry_id}", response_model=schemas.PlaylistResponse, summary="Remove a playlist entry", description="Removes a single entry from a playlist. Only the owner of the playlist can modify it.")
+async def remove_playlist_entry_api(playlist_id: UUID, entry_id: UUID, current_user: models.User = Depends(get_current_active_user)):
+    db_playlist = await crud.remove_playlist_entry(playlist_id=playlist_id, entry_id=entry_id, owner_id=current_user.user_id)
+    if db_playlist is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Playlist entry not found or you don't have permission to modify it")
+    return db_playlist
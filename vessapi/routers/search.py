@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Query
+from typing import List, Literal, Optional
+
+from vessapi import crud, schemas
+
+router = APIRouter(
+    prefix="/search",
+    tags=["Search"],
+)
+
+@router.get("/", response_model=schemas.SearchResponse, summary="Search songs, albums and artists")
+async def search(
+    q: str = Query(..., min_length=1, description="Search terms"),
+    type: Optional[List[Literal["song", "album", "artist"]]] = Query(None, description="Restrict results to song, album and/or artist"),
+    skip: int = Query(0, ge=0, le=1000),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """
+    Full-text search over song titles, artist names, album titles, genres and lyrics;
+    album titles, artist names, genres and descriptions; and artist names and bios,
+    so "<artist> <song>" finds the song. Results of every type are ranked together by relevance.
+    This endpoint is public.
+    """
+    total, hits = await crud.search_catalog(q=q, skip=skip, limit=limit, types=type)
+
+    results = []
+    for kind, score, doc in hits:
+        if kind == "song":
+            results.append(schemas.SearchResult(type=kind, score=score, song=crud.music_response(doc)))
+        elif kind == "album":
+            results.append(schemas.SearchResult(type=kind, score=score, album=crud.album_response(doc)))
+        else:
+            results.append(schemas.SearchResult(type=kind, score=score, artist=schemas.ArtistResponse.model_validate(doc, from_attributes=True)))
+    return schemas.SearchResponse(query=q, total=total, skip=skip, limit=limit, results=results)
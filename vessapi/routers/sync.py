@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import Optional
+
+from vessapi import changes, crud, schemas, models
+from vessapi.auth import get_current_active_user
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["sync"],
+)
+
+@router.get("/changes", response_model=schemas.SyncResponse, summary="Changes since the last sync")
+async def read_changes(
+    since: Optional[str] = Query(None, description="next_token of the previous call; omit on the first sync"),
+    limit: int = Query(500, ge=1, le=5000, description="Maximum number of change log entries to read"),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Music, albums, artists and playlists created, updated or deleted after the token, each
+    entity once in its current state. Call again with next_token while has_more is true.
+
+    A first sync calls this without since, keeps the token and then lists everything.
+    A token older than the change log retention gets 410; the client then syncs from scratch.
+    """
+    since_seq = None
+    if since is not None:
+        try:
+            since_seq, issued_at = changes.decode_sync_token(since)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+        if changes.token_expired(issued_at):
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Sync token expired; sync from scratch")
+    return await crud.get_sync_changes(since_seq, current_user.user_id, limit)
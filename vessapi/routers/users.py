@@ -1,10 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
 from vessapi import crud, schemas
 from vessapi.models import User, UserRole
 from vessapi.auth import get_current_active_user, has_role
+from vessapi.pagination import Cursor, cursor_param, set_next_cursor
+from vessapi.responses import list_response
 
 router = APIRouter(
     prefix="/users",
@@ -49,12 +51,15 @@ async def delete_current_user(current_user: User = Depends(get_current_active_us
 # --- Admin Routes ---
 
 @router.get("/", response_model=List[schemas.UserResponse], summary="List all users (Admin only)")
-async def read_users(skip: int = 0, limit: int = 100, admin: User = Depends(is_admin)):
+async def read_users(skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = Depends(cursor_param), admin: User = Depends(is_admin)):
     """
     Retrieve a list of all users. Requires admin privileges.
+    The cursor for the next page is returned in the X-Next-Cursor header.
     """
-    users = await crud.get_users(skip=skip, limit=limit)
-    return users
+    users = await crud.get_users(skip=skip, limit=limit, cursor=cursor)
+    response = list_response(users, schemas.UserResponse)
+    set_next_cursor(response, users, limit)
+    return response
 
 @router.get("/{user_id}", response_model=schemas.UserResponse, summary="Get user by ID (Admin only)")
 async def read_user_by_id(user_id: UUID, admin: User = Depends(is_admin)):
@@ -71,9 +76,7 @@ async def delete_user_by_id(user_id: UUID, admin: User = Depends(is_admin)):
     """
     Delete a specific user by their ID. Requires admin privileges.
     """
-    db_user = await crud.get_user(user_id=user_id)
+    db_user = await crud.delete_user(user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    
-    await crud.delete_user(user_id=user_id)
     return None
\ No newline at end of file
@@ -1,16 +1,17 @@
-from fastapi import APIRouter, Depends, Request, Form, File, UploadFile, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, Form, File, UploadFile, Query
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from typing import List, Optional
 from uuid import UUID
-import shutil
 import os
-import asyncio
+import re
 
 
 from vessapi import crud, schemas, models
 from vessapi.auth import get_current_active_user
-from vessapi.services import process_music_upload_task, SYSTEM_USER_ID
+from vessapi.jobs import enqueue_music_upload, get_active_job_by_content_hash
+from vessapi.services import SYSTEM_USER_ID
+from vessapi.uploads import UploadRejected, save_upload, save_upload_content_addressed
 from vessapi.config import settings
 
 router = APIRouter(
@@ -41,28 +42,53 @@ async def upload_music(request: Request, music_files: List[UploadFile] = File(..
     music_cover_image_url = None
 
     if cover_image and cover_image.filename:
-        music_cover_image_path = os.path.join(settings.files.music_image_directory, cover_image.filename)
         try:
-            with open(music_cover_image_path, "wb") as buffer:
-                shutil.copyfileobj(cover_image.file, buffer)
-            music_cover_image_url = f"/{settings.files.music_image_directory}/{cover_image.filename}"
+            stored = await save_upload(
+                cover_image,
+                settings.files.music_image_directory,
+                settings.files.max_image_file_size,
+                settings.files.supported_image_formats,
+            )
+            music_cover_image_url = f"/{settings.files.music_image_directory}/{stored.filename}"
             messages.append(f"Music cover image '{cover_image.filename}' uploaded successfully.")
+        except UploadRejected as e:
+            errors.append(str(e))
         except Exception as e:
             errors.append(f"Error uploading music cover image '{cover_image.filename}': {e}")
         finally:
-            cover_image.file.close()
+            await cover_image.close()
 
     for music_file in music_files:
-        file_location = os.path.join(settings.files.music_upload_directory, music_file.filename)
         try:
-            with open(file_location, "wb") as buffer:
-                shutil.copyfileobj(music_file.file, buffer)
-            asyncio.create_task(process_music_upload_task(file_location, music_cover_image_url, SYSTEM_USER_ID))
-            messages.append(f"File '{music_file.filename}' upload initiated. Processing in background.")
+            stored = await save_upload_content_addressed(
+                music_file,
+                settings.files.music_upload_directory,
+                settings.files.max_music_file_size,
+                settings.files.supported_music_formats,
+            )
+            # Identical bytes are registered or queued once; re-uploads skip parsing and writes
+            existing_music = await crud.get_music_by_content_hash(stored.sha256)
+            if existing_music:
+                messages.append(f"File '{music_file.filename}' is already in the library as '{existing_music.title}'.")
+                continue
+            job = await get_active_job_by_content_hash(stored.sha256)
+            if job:
+                messages.append(f"File '{music_file.filename}' is already queued for processing (job {job.job_id}).")
+                continue
+            job = await enqueue_music_upload(
+                stored.path,
+                music_cover_image_url,
+                SYSTEM_USER_ID,
+                original_filename=music_file.filename,
+                content_hash=stored.sha256,
+            )
+            messages.append(f"File '{music_file.filename}' queued for processing (job {job.job_id}, status at /v1/jobs/{job.job_id}).")
+        except UploadRejected as e:
+            errors.append(str(e))
         except Exception as e:
             errors.append(f"Error saving file '{music_file.filename}': {e}")
         finally:
-            music_file.file.close()
+            await music_file.close()
     
     return templates.TemplateResponse("index.html", {"request": request, "messages": messages, "errors": errors})
 
@@ -72,72 +98,41 @@ async def upload_album_cover(request: Request, album_id: UUID = Form(...), cover
     if not album:
         raise HTTPException(status_code=404, detail="Album not found")
 
-    file_location = os.path.join(settings.files.album_image_directory, cover_image.filename)
     try:
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(cover_image.file, buffer)
+        stored = await save_upload(
+            cover_image,
+            settings.files.album_image_directory,
+            settings.files.max_image_file_size,
+            settings.files.supported_image_formats,
+        )
         
-        album_update = schemas.AlbumUpdate(cover_image_url=f"/{settings.files.album_image_directory}/{cover_image.filename}")
+        album_update = schemas.AlbumUpdate(cover_image_url=f"/{settings.files.album_image_directory}/{stored.filename}")
         await crud.update_album(album_id, album_update, SYSTEM_USER_ID, is_admin=True)
         return templates.TemplateResponse("index.html", {"request": request, "message": f"Album cover for '{album.title}' updated successfully!", "error": False})
+    except UploadRejected as e:
+        return templates.TemplateResponse("index.html", {"request": request, "message": str(e), "error": True})
     except Exception as e:
         return templates.TemplateResponse("index.html", {"request": request, "message": f"Error uploading album cover: {e}", "error": True})
     finally:
-        cover_image.file.close()
+        await cover_image.close()
 
 @router.get("/music_page", response_class=HTMLResponse)
 async def music_page(request: Request, skip: int = 0, limit: int = 10, q: Optional[str] = None, genre: Optional[str] = None):
-    all_music = await crud.get_music_all()
-    filtered_music = []
-    for music in all_music:
-        match = True
-        if q and q.lower() not in music.title.lower() and not any(q.lower() in artist.name.lower() for artist_id in music.artist_ids for artist in [await crud.get_artist(artist_id)] if artist):
-            match = False
-        if genre and music.genre and genre.lower() != music.genre.lower():
-            match = False
-        if match:
-            filtered_music.append(music)
-    
-    total_music = len(filtered_music)
-    paginated_music = filtered_music[skip:skip + limit]
-
-    music_response_list = []
-    for music_item in paginated_music:
-        music_dict = music_item.model_dump()
-        display_artists = []
-        for artist_id in music_item.artist_ids:
-            artist = await crud.get_artist(artist_id)
-            if artist:
-                display_artists.append(artist.name)
-        music_dict["artist_names"] = display_artists
-        music_response_list.append(schemas.MusicResponse(**music_dict))
+    # Filtering, counting and pagination all happen in MongoDB
+    music_list, total_music = await crud.get_music_page(
+        skip=skip,
+        limit=limit,
+        q=q,
+        genre=f"^{re.escape(genre)}$" if genre else None
+    )
+    music_response_list = [crud.music_response(music) for music in music_list]
 
     return templates.TemplateResponse("music.html", {"request": request, "music": music_response_list, "skip": skip, "limit": limit, "total": total_music, "q": q, "genre": genre})
 
 @router.get("/albums_page", response_class=HTMLResponse)
 async def albums_page(request: Request, skip: int = 0, limit: int = 10, q: Optional[str] = None, artist_name: Optional[str] = None):
-    albums = await crud.get_albums(skip=skip, limit=limit)
-    albums_data = []
-    for album in albums:
-        album_dict = album.model_dump()
-        album_dict["num_tracks"] = len(album.music_ids)
-        artist = await crud.get_artist(album.artist_id)
-        if artist:
-            album_dict["artist_name"] = artist.name
-        albums_data.append(schemas.AlbumResponse(**album_dict))
-    
-    filtered_albums = []
-    for album in albums_data:
-        match = True
-        if q and q.lower() not in album.title.lower() and (album.artist_name and q.lower() not in album.artist_name.lower()):
-            match = False
-        if artist_name and album.artist_name and artist_name.lower() != album.artist_name.lower():
-            match = False
-        if match:
-            filtered_albums.append(album)
-
-    total_albums = len(filtered_albums)
-    paginated_albums = filtered_albums[skip:skip + limit]
+    albums, total_albums = await crud.get_albums_page(skip=skip, limit=limit, q=q, artist_name=artist_name)
+    paginated_albums = [crud.album_response(album) for album in albums]
 
     return templates.TemplateResponse("albums.html", {"request": request, "albums": paginated_albums, "skip": skip, "limit": limit, "total": total_albums, "q": q, "artist": artist_name})
 
@@ -147,24 +142,8 @@ async def artist_page(request: Request, artist_id: UUID):
     if not artist:
         raise HTTPException(status_code=404, detail="Artist not found")
     
-    music_by_artist = await crud.get_music_by_artist_id(artist_id)
-    albums_by_artist = await crud.get_albums_by_artist_id(artist_id)
-
-    for music_item in music_by_artist:
-        music_item.artist_names = []
-        for art_id in music_item.artist_ids:
-            art = await crud.get_artist(art_id)
-            if art:
-                music_item.artist_names.append(art.name)
-
-    albums_with_artist_names = []
-    for album in albums_by_artist:
-        album_dict = album.model_dump()
-        album_dict["num_tracks"] = len(album.music_ids)
-        art = await crud.get_artist(album.artist_id)
-        if art:
-            album_dict["artist_name"] = art.name
-        albums_with_artist_names.append(schemas.AlbumResponse(**album_dict))
+    music_by_artist = await crud.get_music_responses(artist_ids=[artist_id])
+    albums_with_artist_names = await crud.get_album_responses(artist_id=artist_id)
 
     return templates.TemplateResponse("artist.html", {"request": request, "artist": artist, "music": music_by_artist, "albums": albums_with_artist_names})
 
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime, date
-from typing import List, Optional
+from typing import List, Literal, Optional
 from uuid import UUID
 
 # Base Schemas (Ortak alanlar)
@@ -14,6 +14,8 @@ class MusicBase(BaseModel):
     artist_ids: List[UUID] # Changed from 'artists' to 'artist_ids' and type to List[UUID]
     duration: int # in seconds
     file_path: str
+    codec: Optional[str] = None # Audio codec (mp3, flac, opus...) detected at ingestion
+    content_hash: Optional[str] = None # SHA-256 of the audio file, identical uploads share it
     genre: Optional[str] = None
     track_number: Optional[int] = None
     publish_date: datetime
@@ -58,6 +60,7 @@ class MusicResponse(MusicBase):
     created_at: datetime
     updated_at: datetime
     artist_names: List[str] = [] # Added for display purposes
+    album_title: Optional[str] = None # Title of album_id, for display purposes
     class Config:
         json_schema_extra = {
             "example": {
@@ -218,7 +221,7 @@ class PlaylistUpdate(PlaylistBase):
 class PlaylistResponse(PlaylistBase):
     playlist_id: UUID
     owner_id: UUID
-    music_ids: List[UUID]
+    track_count: int = 0 # Tracks are read in pages from /playlists/{id}/music/
     created_at: datetime
     updated_at: datetime
     class Config:
@@ -229,12 +232,75 @@ class PlaylistResponse(PlaylistBase):
                 "description": "My favorite songs.",
                 "is_public": True,
                 "owner_id": "a1b2c3d4-e5f6-7890-1234-567890abcdef",
-                "music_ids": ["12345678-1234-5678-1234-567890abcdef"],
+                "track_count": 1,
                 "created_at": "2023-04-01T10:00:00Z",
                 "updated_at": "2023-04-01T10:00:00Z"
             }
         }
 
+class PlaylistEntryMove(BaseModel):
+    index: int = Field(..., ge=0, description="Zero-based index the entry should end up at")
+
+class PlaylistOperation(BaseModel):
+    op: Literal["add", "remove", "move"]
+    music_ids: List[UUID] = [] # Tracks to add, or to remove every entry of
+    entry_id: Optional[UUID] = None # Entry to move
+    index: Optional[int] = Field(None, ge=0, description="Zero-based index to insert at or move to; adds append when omitted")
+
+    @model_validator(mode="after")
+    def check_operation(self):
+        if self.op == "move" and (self.entry_id is None or self.index is None):
+            raise ValueError("move needs entry_id and index")
+        if self.op in ("add", "remove") and not self.music_ids:
+            raise ValueError(f"{self.op} needs music_ids")
+        return self
+
+class PlaylistBatch(BaseModel):
+    operations: List[PlaylistOperation] = Field(..., min_length=1, max_length=1000)
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "operations": [
+                    {"op": "add", "music_ids": ["12345678-1234-5678-1234-567890abcdef"]},
+                    {"op": "add", "music_ids": ["23456789-2345-6789-2345-67890abcdef1"], "index": 0},
+                    {"op": "move", "entry_id": "d4e5f6a7-b8c9-0123-4567-890abcdef123", "index": 3},
+                    {"op": "remove", "music_ids": ["34567890-3456-7890-3456-7890abcdef12"]}
+                ]
+            }
+        }
+
+class PlaylistEntryResponse(BaseModel):
+    entry_id: UUID
+    playlist_id: UUID
+    music_id: UUID
+    position: float
+    added_at: datetime
+    music: Optional[MusicResponse] = None # None when the track has been deleted
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "entry_id": "d4e5f6a7-b8c9-0123-4567-890abcdef123",
+                "playlist_id": "b2c3d4e5-f6a7-8901-2345-67890abcdef1",
+                "music_id": "12345678-1234-5678-1234-567890abcdef",
+                "position": 1024.0,
+                "added_at": "2023-04-01T10:00:00Z",
+                "music": None
+            }
+        }
+
+# Bulk Schemas
+class BulkOperation(BaseModel):
+    """One operation of a bulk request; data is validated against the collection's create/update schema"""
+    op: Literal["create", "update", "delete"]
+    id: Optional[UUID] = None # Document to update or delete
+    data: dict = {}
+
+    @model_validator(mode="after")
+    def check_operation(self):
+        if self.op != "create" and self.id is None:
+            raise ValueError(f"{self.op} needs id")
+        return self
+
 # Artist Schemas
 class ArtistBase(BaseModel):
     name: str
@@ -279,3 +345,118 @@ class ArtistResponse(ArtistBase):
         }
 
 
+
+
+# Search Schemas
+class SearchResult(BaseModel):
+    type: str # "song", "album" or "artist"
+    score: float
+    song: Optional[MusicResponse] = None
+    album: Optional[AlbumResponse] = None
+    artist: Optional[ArtistResponse] = None
+
+class SearchResponse(BaseModel):
+    query: str
+    total: int
+    skip: int
+    limit: int
+    results: List[SearchResult]
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "query": "balerin",
+                "total": 1,
+                "skip": 0,
+                "limit": 20,
+                "results": [
+                    {
+                        "type": "artist",
+                        "score": 10.5,
+                        "artist": {
+                            "artist_id": "c3d4e5f6-a7b8-9012-3456-7890abcdef12",
+                            "name": "Balerin",
+                            "bio": None,
+                            "image_url": None,
+                            "created_at": "2023-05-01T10:00:00Z",
+                            "updated_at": "2023-05-01T10:00:00Z"
+                        }
+                    }
+                ]
+            }
+        }
+
+
+# Ingestion Job Schemas
+class JobResponse(BaseModel):
+    job_id: UUID
+    kind: str
+    status: str
+    original_filename: Optional[str] = None
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    music_id: Optional[UUID] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+        json_schema_extra = {
+            "example": {
+                "job_id": "d4e5f6a7-b8c9-0123-4567-890abcdef123",
+                "kind": "music_upload",
+                "status": "succeeded",
+                "original_filename": "sample_song.mp3",
+                "attempts": 1,
+                "max_attempts": 3,
+                "error": None,
+                "music_id": "12345678-1234-5678-1234-567890abcdef",
+                "created_at": "2023-06-01T10:00:00Z",
+                "updated_at": "2023-06-01T10:00:05Z",
+                "finished_at": "2023-06-01T10:00:05Z"
+            }
+        }
+
+# Sync Schemas
+class SyncMusicChanges(BaseModel):
+    created: List[MusicResponse] = []
+    updated: List[MusicResponse] = []
+    deleted: List[UUID] = []
+
+class SyncAlbumChanges(BaseModel):
+    created: List[AlbumResponse] = []
+    updated: List[AlbumResponse] = []
+    deleted: List[UUID] = []
+
+class SyncArtistChanges(BaseModel):
+    created: List[ArtistResponse] = []
+    updated: List[ArtistResponse] = []
+    deleted: List[UUID] = []
+
+class SyncPlaylistChanges(BaseModel):
+    created: List[PlaylistResponse] = []
+    updated: List[PlaylistResponse] = []
+    deleted: List[UUID] = [] # Also playlists that stopped being visible to the user
+
+class SyncResponse(BaseModel):
+    music: SyncMusicChanges = Field(default_factory=SyncMusicChanges)
+    albums: SyncAlbumChanges = Field(default_factory=SyncAlbumChanges)
+    artists: SyncArtistChanges = Field(default_factory=SyncArtistChanges)
+    playlists: SyncPlaylistChanges = Field(default_factory=SyncPlaylistChanges)
+    next_token: str # Pass as ?since= on the next call
+    has_more: bool = False # More changes are waiting; call again right away
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "music": {
+                    "created": [],
+                    "updated": [],
+                    "deleted": ["12345678-1234-5678-1234-567890abcdef"]
+                },
+                "albums": {"created": [], "updated": [], "deleted": []},
+                "artists": {"created": [], "updated": [], "deleted": []},
+                "playlists": {"created": [], "updated": [], "deleted": []},
+                "next_token": "MTI0MnwyMDIzLTA2LTAxVDEwOjAwOjA1",
+                "has_more": False
+            }
+        }
@@ -1,99 +1,206 @@
 from uuid import UUID, uuid4
+import asyncio
+import multiprocessing
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from mutagen import File as MutagenFile
 from datetime import datetime
 
-from vessapi import crud, schemas
+import aiofiles
+import aiofiles.os
+from pymongo.errors import DuplicateKeyError
+
+from vessapi import crud, metrics, schemas
+from vessapi.config import settings
+from vessapi.models import Music
 
 SYSTEM_USER_ID = UUID('00000000-0000-0000-0000-000000000001') # Sabit sistem kullanıcısı ID'si
 
 MUSIC_UPLOAD_DIRECTORY = "library/music"
 ALBUM_IMAGE_DIRECTORY = "library/images/album_image"
 
-async def process_music_upload_task(music_file_path: str, music_cover_image_url: str | None, current_user_id: UUID | None):
+# Mutagen file types mapped to the codec names stored on Music.codec
+MUTAGEN_CODECS = {
+    "MP3": "mp3",
+    "EasyMP3": "mp3",
+    "FLAC": "flac",
+    "OggFLAC": "flac",
+    "OggOpus": "opus",
+    "OggVorbis": "vorbis",
+    "WAVE": "wav",
+    "AIFF": "aiff",
+    "MP4": "aac",
+    "EasyMP4": "aac",
+    "AAC": "aac",
+}
+
+def detect_codec(audio) -> str | None:
+    codec = MUTAGEN_CODECS.get(type(audio).__name__)
+    if codec == "aac" and str(getattr(audio.info, "codec", "")).startswith("alac"):
+        return "alac"
+    return codec
+
+def read_audio_metadata(music_file_path: str, original_filename: str | None = None) -> dict:
+    """
+    Parse the tags of an audio file with mutagen. This is blocking, CPU-bound work and
+    runs in the tag parser process pool; it only returns plain, picklable values.
+    Untitled tracks are named after original_filename (stored files are named by hash).
+    """
+    audio = MutagenFile(music_file_path)
+    if audio is None:
+        raise ValueError(f"Unsupported or unreadable audio file: {original_filename or os.path.basename(music_file_path)}")
+
+    title = audio.get('title', [os.path.basename(original_filename or music_file_path).split('.')[0]])[0]
+    artist_names = [a.strip() for a in audio.get('artist', ['Unknown Artist'])[0].split(',')] if audio.get('artist') else ['Unknown Artist']
+    genre = audio.get('genre', ['Unknown'])[0]
+
+    publish_date_str = audio.get('date', [str(datetime.now().year)])[0]
     try:
-        audio = MutagenFile(music_file_path)
-        
-        title = audio.get('title', [os.path.basename(music_file_path).split('.')[0]])[0]
-        
-        artist_names = [a.strip() for a in audio.get('artist', ['Unknown Artist'])[0].split(',')] if audio.get('artist') else ['Unknown Artist']
-        artist_ids = []
-        for artist_name in artist_names:
-            artist = await crud.get_artist_by_name(artist_name)
-            if not artist:
-                artist_create = schemas.ArtistCreate(name=artist_name)
-                artist = await crud.create_artist(artist_create)
-            artist_ids.append(artist.artist_id)
-
-        duration = int(audio.info.length) if audio.info.length else 0
-        genre = audio.get('genre', ['Unknown'])[0]
-        
-        publish_date_str = audio.get('date', [str(datetime.now().year)])[0]
+        publish_date = datetime.strptime(publish_date_str, "%Y-%m-%d")
+    except ValueError:
         try:
-            publish_date = datetime.strptime(publish_date_str, "%Y-%m-%d")
+            publish_date = datetime.strptime(publish_date_str, "%Y")
         except ValueError:
-            try:
-                publish_date = datetime.strptime(publish_date_str, "%Y")
-            except ValueError:
-                publish_date = datetime.now()
-
-            album_title = audio.get('album', [None])[0]
-            album_artist_name = audio.get('albumartist', [artist_names[0]])[0] if artist_names else 'Unknown Artist'
-            album_artist_id = None
-            album_cover_image_url = None
-
-            if album_title and album_artist_name:
-                album_artist_obj = await crud.get_artist_by_name(album_artist_name)
-                if not album_artist_obj:
-                    album_artist_create = schemas.ArtistCreate(name=album_artist_name)
-                    album_artist_obj = await crud.create_artist(album_artist_create)
-                album_artist_id = album_artist_obj.artist_id
-
-                existing_album = await crud.get_album_by_title_and_artist_id(album_title, album_artist_id)
-                if existing_album:
-                    album_id = existing_album.album_id
-                    album_cover_image_url = existing_album.cover_image_url
-                else:
-                    album_image_data = None
-                    if hasattr(audio, 'pictures') and audio.pictures:
-                        album_image_data = audio.pictures[0].data
-                    elif hasattr(audio, 'tags') and 'APIC:' in audio.tags:
-                        album_image_data = audio.tags['APIC:'].data
-                    
-                    if album_image_data:
-                        album_cover_filename = f"{uuid4()}.png"
-                        album_cover_path = os.path.join(ALBUM_IMAGE_DIRECTORY, album_cover_filename)
-                        try:
-                            with open(album_cover_path, "wb") as img_buffer:
-                                img_buffer.write(album_image_data)
-                            album_cover_image_url = f"/library/images/album_image/{album_cover_filename}"
-                        except Exception as img_e:
-                            print(f"Error extracting and saving album cover for '{album_title}': {img_e}")
-
-                    new_album = schemas.AlbumCreate(
-                        title=album_title,
-                        artist_id=album_artist_id,
-                        release_date=publish_date.date(),
-                        cover_image_url=album_cover_image_url or music_cover_image_url or "",
-                        genre=genre,
-                        description=None
-                    )
-                    created_album = await crud.create_album(album=new_album, owner_id=current_user_id if current_user_id else SYSTEM_USER_ID)
-                    album_id = created_album.album_id
-
-        music_create = schemas.MusicCreate(
-            title=title, 
-            artist_ids=artist_ids, 
-            duration=duration, 
-            file_path=music_file_path, 
-            genre=genre, 
-            publish_date=publish_date,
-            lyrics=audio.get('lyrics', [None])[0], 
-            album_id=album_id, 
-            cover_image_url=music_cover_image_url or album_cover_image_url
+            publish_date = datetime.now()
+
+    album_image_data = None
+    if hasattr(audio, 'pictures') and audio.pictures:
+        album_image_data = audio.pictures[0].data
+    elif hasattr(audio, 'tags') and audio.tags is not None and 'APIC:' in audio.tags:
+        album_image_data = audio.tags['APIC:'].data
+
+    return {
+        "title": title,
+        "artist_names": artist_names,
+        "duration": int(audio.info.length) if audio.info.length else 0,
+        "codec": detect_codec(audio),
+        "genre": genre,
+        "publish_date": publish_date,
+        "lyrics": audio.get('lyrics', [None])[0],
+        "album_title": audio.get('album', [None])[0],
+        "album_artist_name": audio.get('albumartist', [artist_names[0]])[0] if artist_names else 'Unknown Artist',
+        "album_image_data": album_image_data,
+    }
+
+_tag_parser_pool: ProcessPoolExecutor | None = None
+
+def get_tag_parser_pool() -> ProcessPoolExecutor:
+    global _tag_parser_pool
+    if _tag_parser_pool is None:
+        # spawn: forking a process that already runs the event loop and driver threads is unsafe
+        _tag_parser_pool = ProcessPoolExecutor(
+            max_workers=settings.ingestion.parser_processes,
+            mp_context=multiprocessing.get_context("spawn"),
         )
-        owner_id = current_user_id if current_user_id else SYSTEM_USER_ID
-        await crud.create_music(music=music_create, owner_id=owner_id)
-        print(f"File '{os.path.basename(music_file_path)}' processed and registered successfully.")
-    except Exception as e:
-        print(f"Error processing file '{os.path.basename(music_file_path)}': {e}")
+    return _tag_parser_pool
+
+def shutdown_tag_parser_pool():
+    global _tag_parser_pool
+    if _tag_parser_pool is not None:
+        _tag_parser_pool.shutdown(wait=False, cancel_futures=True)
+        _tag_parser_pool = None
+
+async def parse_audio_metadata(music_file_path: str, original_filename: str | None = None) -> dict:
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        return await loop.run_in_executor(get_tag_parser_pool(), read_audio_metadata, music_file_path, original_filename)
+    finally:
+        metrics.TAG_PARSE_SECONDS.observe(time.perf_counter() - started)
+
+async def save_album_cover(album_image_data: bytes | None, album_title: str) -> str | None:
+    """Write embedded cover art to the album image directory and return its URL"""
+    if not album_image_data:
+        return None
+    album_cover_filename = f"{uuid4()}.png"
+    album_cover_path = os.path.join(ALBUM_IMAGE_DIRECTORY, album_cover_filename)
+    try:
+        async with aiofiles.open(album_cover_path, "wb") as img_buffer:
+            await img_buffer.write(album_image_data)
+        return f"/library/images/album_image/{album_cover_filename}"
+    except Exception as img_e:
+        print(f"Error extracting and saving album cover for '{album_title}': {img_e}")
+        return None
+
+async def remove_album_cover(cover_image_url: str):
+    path = os.path.join(ALBUM_IMAGE_DIRECTORY, os.path.basename(cover_image_url))
+    if await aiofiles.os.path.exists(path):
+        await aiofiles.os.remove(path)
+
+async def register_music(metadata: dict, music_file_path: str, music_cover_image_url: str | None, current_user_id: UUID | None, content_hash: str | None = None) -> Music:
+    """Resolve artists and album for parsed metadata and create the Music document"""
+    owner_id = current_user_id if current_user_id else SYSTEM_USER_ID
+
+    # Upserts backed by a process-local cache: an album's tracks resolve the same artist once
+    artist_ids = [await crud.get_or_create_artist_id(artist_name) for artist_name in metadata["artist_names"]]
+
+    album_title = metadata["album_title"]
+    album_artist_name = metadata["album_artist_name"]
+    album_id = None
+    album_cover_image_url = None
+
+    if album_title and album_artist_name:
+        album_artist_id = await crud.get_or_create_artist_id(album_artist_name)
+
+        extracted_cover_url = await save_album_cover(metadata["album_image_data"], album_title)
+        new_album = schemas.AlbumCreate(
+            title=album_title,
+            artist_id=album_artist_id,
+            release_date=metadata["publish_date"].date(),
+            cover_image_url=extracted_cover_url or music_cover_image_url or "",
+            genre=metadata["genre"],
+            description=None
+        )
+        album, created = await crud.get_or_create_album(album=new_album, owner_id=owner_id)
+        if not created and extracted_cover_url:
+            # The album already existed (or another upload created it first); its cover is kept
+            await remove_album_cover(extracted_cover_url)
+        album_id = album.album_id
+        album_cover_image_url = album.cover_image_url or None
+
+    music_create = schemas.MusicCreate(
+        title=metadata["title"], 
+        artist_ids=artist_ids, 
+        duration=metadata["duration"], 
+        file_path=music_file_path, 
+        codec=metadata["codec"],
+        content_hash=content_hash,
+        genre=metadata["genre"], 
+        publish_date=metadata["publish_date"],
+        lyrics=metadata["lyrics"], 
+        album_id=album_id, 
+        cover_image_url=music_cover_image_url or album_cover_image_url
+    )
+    try:
+        return await crud.create_music(music=music_create, owner_id=owner_id)
+    except DuplicateKeyError:
+        # The same bytes were registered concurrently; the unique content_hash index kept one
+        existing = await crud.get_music_by_content_hash(content_hash) if content_hash else None
+        if existing is None:
+            raise
+        return existing
+
+async def process_music_upload_task(
+    music_file_path: str,
+    music_cover_image_url: str | None,
+    current_user_id: UUID | None,
+    content_hash: str | None = None,
+    original_filename: str | None = None
+) -> Music:
+    """
+    Parse an uploaded file's tags in the process pool and register it in the catalog.
+    A file whose content_hash is already registered returns the existing track without
+    any parsing or writes. Errors propagate so the ingestion job that runs this can retry it.
+    """
+    display_name = original_filename or os.path.basename(music_file_path)
+    if content_hash:
+        existing = await crud.get_music_by_content_hash(content_hash)
+        if existing:
+            print(f"File '{display_name}' is already in the library.")
+            return existing
+
+    metadata = await parse_audio_metadata(music_file_path, original_filename)
+    music = await register_music(metadata, music_file_path, music_cover_image_url, current_user_id, content_hash)
+    print(f"File '{display_name}' processed and registered successfully.")
+    return music
@@ -0,0 +1,169 @@
+"""
+Audio streaming helpers.
+
+Range requests (single and multi-range), If-Range and ETag/Last-Modified
+headers are handled by Starlette's FileResponse, which also hands the file to
+the server zero-copy when it supports the ``http.response.pathsend`` extension.
+This module adds the pieces the stream endpoint needs around it: the MIME type
+derived from the stored codec, conditional GET (304) handling and a small
+in-process cache so seeking does not hit MongoDB every time. The file is stat'ed
+on every request, so a file replaced in place is never served with the size and
+validators of the old one.
+"""
+
+import mimetypes
+import os
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import NamedTuple, Optional
+from uuid import UUID
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+from vessapi import crud
+
+# Codec names stored on Music.codec
+CODEC_MEDIA_TYPES = {
+    "mp3": "audio/mpeg",
+    "flac": "audio/flac",
+    "opus": "audio/ogg",
+    "vorbis": "audio/ogg",
+    "wav": "audio/wav",
+    "aac": "audio/mp4",
+    "alac": "audio/mp4",
+    "aiff": "audio/aiff",
+}
+
+# Fallback for tracks ingested before the codec was recorded
+EXTENSION_MEDIA_TYPES = {
+    "mp3": "audio/mpeg",
+    "flac": "audio/flac",
+    "opus": "audio/ogg",
+    "ogg": "audio/ogg",
+    "oga": "audio/ogg",
+    "wav": "audio/wav",
+    "m4a": "audio/mp4",
+    "aac": "audio/aac",
+}
+
+STREAM_CACHE_SIZE = 1024
+STREAM_CACHE_TTL = 300  # seconds
+
+
+def media_type_for(codec: Optional[str], file_path: str) -> str:
+    if codec and codec in CODEC_MEDIA_TYPES:
+        return CODEC_MEDIA_TYPES[codec]
+    extension = os.path.splitext(file_path)[1].lstrip(".").lower()
+    if extension in EXTENSION_MEDIA_TYPES:
+        return EXTENSION_MEDIA_TYPES[extension]
+    return mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+
+
+class StreamInfo(NamedTuple):
+    path: str
+    media_type: str
+    filename: str
+    stat_result: os.stat_result
+
+
+class StreamCache:
+    """Bounded LRU of resolved stream targets, each valid for STREAM_CACHE_TTL seconds"""
+
+    def __init__(self, max_size: int = STREAM_CACHE_SIZE, ttl: float = STREAM_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[UUID, tuple[float, StreamInfo]]" = OrderedDict()
+
+    def get(self, music_id: UUID) -> Optional[StreamInfo]:
+        entry = self._entries.get(music_id)
+        if entry is None:
+            return None
+        expires_at, info = entry
+        if expires_at < time.monotonic():
+            del self._entries[music_id]
+            return None
+        self._entries.move_to_end(music_id)
+        return info
+
+    def set(self, music_id: UUID, info: StreamInfo) -> None:
+        self._entries[music_id] = (time.monotonic() + self.ttl, info)
+        self._entries.move_to_end(music_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, music_id: UUID) -> None:
+        self._entries.pop(music_id, None)
+
+
+stream_cache = StreamCache()
+
+
+class StreamNotFound(Exception):
+    """Raised when a track or its audio file does not exist"""
+
+
+async def resolve_stream(music_id: UUID) -> StreamInfo:
+    info = stream_cache.get(music_id)
+    if info is not None:
+        try:
+            stat_result = os.stat(info.path)
+        except OSError:
+            stream_cache.invalidate(music_id)
+        else:
+            if (stat_result.st_mtime_ns, stat_result.st_size) != (info.stat_result.st_mtime_ns, info.stat_result.st_size):
+                # Replaced in place (re-upload, or an import that did not copy the file)
+                info = info._replace(stat_result=stat_result)
+                stream_cache.set(music_id, info)
+            return info
+
+    db_music = await crud.get_music(music_id=music_id)
+    if db_music is None:
+        raise StreamNotFound("Music not found")
+    try:
+        stat_result = os.stat(db_music.file_path)
+    except OSError:
+        raise StreamNotFound("Music file not found")
+
+    extension = os.path.splitext(db_music.file_path)[1]
+    info = StreamInfo(
+        path=db_music.file_path,
+        media_type=media_type_for(db_music.codec, db_music.file_path),
+        filename=f"{db_music.title}{extension}",
+        stat_result=stat_result,
+    )
+    stream_cache.set(music_id, info)
+    return info
+
+
+def _is_not_modified(request: Request, response: Response) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = response.headers["etag"]
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            last_modified = parsedate_to_datetime(response.headers["last-modified"])
+        except (TypeError, ValueError):
+            return False
+        return last_modified <= since
+    return False
+
+
+def stream_response(request: Request, info: StreamInfo) -> Response:
+    response = FileResponse(
+        path=info.path,
+        media_type=info.media_type,
+        filename=info.filename,
+        stat_result=info.stat_result,
+        content_disposition_type="inline",
+    )
+    if _is_not_modified(request, response):
+        headers = {name: response.headers[name] for name in ("etag", "last-modified", "accept-ranges")}
+        return Response(status_code=304, headers=headers)
+    return response
@@ -0,0 +1,117 @@
+"""
+Non-blocking saving of uploaded files.
+
+Uploads are copied to disk in chunks through async file I/O so a large file never
+blocks the event loop, are checked against the configured format and size limits
+before and while they are written, and are hashed (SHA-256) as they stream.
+
+Audio is stored content-addressed: the file name is the hash of its bytes, so
+uploads with the same name never overwrite each other and identical uploads
+map to the same file.
+"""
+
+import hashlib
+import os
+from typing import List, NamedTuple, Optional
+from uuid import uuid4
+
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+
+class UploadRejected(Exception):
+    """Raised when an upload violates the configured size or format limits"""
+
+
+class StoredUpload(NamedTuple):
+    path: str
+    filename: str
+    size: int
+    sha256: str
+    already_stored: bool = False # Identical bytes were already in the store
+
+
+def file_extension(filename: str) -> str:
+    return os.path.splitext(filename)[1].lstrip(".").lower()
+
+
+def check_upload(upload: UploadFile, max_size_mb: int, allowed_formats: List[str]) -> None:
+    """Reject by extension and, when the client declared it, by size before reading any data"""
+    extension = file_extension(upload.filename or "")
+    if extension not in allowed_formats:
+        raise UploadRejected(f"'{upload.filename}' has an unsupported format. Supported formats: {', '.join(allowed_formats)}")
+    if upload.size is not None and upload.size > max_size_mb * 1024 * 1024:
+        raise UploadRejected(f"'{upload.filename}' is larger than the {max_size_mb} MB limit")
+
+
+def content_addressed_path(directory: str, sha256: str, extension: str) -> str:
+    """<directory>/<first two hex digits>/<sha256>.<extension>"""
+    return os.path.join(directory, sha256[:2], f"{sha256}.{extension}")
+
+
+async def _stream_to_temp(upload: UploadFile, directory: str, max_size_mb: int) -> tuple:
+    max_bytes = max_size_mb * 1024 * 1024
+    temp_path = os.path.join(directory, f".{uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(temp_path, "wb") as buffer:
+            while chunk := await upload.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(f"'{upload.filename}' is larger than the {max_size_mb} MB limit")
+                digest.update(chunk)
+                await buffer.write(chunk)
+    except BaseException:
+        await remove_if_exists(temp_path)
+        raise
+    return temp_path, size, digest.hexdigest()
+
+
+async def remove_if_exists(path: str) -> None:
+    if await aiofiles.os.path.exists(path):
+        await aiofiles.os.remove(path)
+
+
+async def save_upload(
+    upload: UploadFile,
+    directory: str,
+    max_size_mb: int,
+    allowed_formats: List[str],
+    filename: Optional[str] = None
+) -> StoredUpload:
+    """
+    Stream an upload into directory under its own name. The data goes to a temporary
+    file first and is only moved to its final name once it is complete and within limits.
+    """
+    check_upload(upload, max_size_mb, allowed_formats)
+    # Only keep the base name so a crafted filename cannot escape the directory
+    filename = os.path.basename(filename or upload.filename)
+    target_path = os.path.join(directory, filename)
+    temp_path, size, sha256 = await _stream_to_temp(upload, directory, max_size_mb)
+    await aiofiles.os.replace(temp_path, target_path)
+    return StoredUpload(path=target_path, filename=filename, size=size, sha256=sha256)
+
+
+async def save_upload_content_addressed(
+    upload: UploadFile,
+    directory: str,
+    max_size_mb: int,
+    allowed_formats: List[str]
+) -> StoredUpload:
+    """
+    Stream an upload into the content-addressed store under directory. When a file with
+    the same hash is already there the new copy is discarded and already_stored is set.
+    """
+    check_upload(upload, max_size_mb, allowed_formats)
+    temp_path, size, sha256 = await _stream_to_temp(upload, directory, max_size_mb)
+    target_path = content_addressed_path(directory, sha256, file_extension(upload.filename))
+    if await aiofiles.os.path.exists(target_path):
+        await remove_if_exists(temp_path)
+        return StoredUpload(path=target_path, filename=os.path.basename(target_path), size=size, sha256=sha256, already_stored=True)
+    await aiofiles.os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    await aiofiles.os.replace(temp_path, target_path)
+    return StoredUpload(path=target_path, filename=os.path.basename(target_path), size=size, sha256=sha256)